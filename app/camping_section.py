@@ -1,53 +1,91 @@
-from typing import Optional, Tuple, Iterable, List
+import math
+from typing import Iterable, List, Optional, Set, Tuple
+
 import folium
-from folium import plugins
+import pandas as pd
 import streamlit as st
-from geopy.geocoders import Nominatim
-from geopy.extra.rate_limiter import RateLimiter
-
-# st_folium vs folium_static handling
-from streamlit_folium import st_folium as _st_render_map
-_USES_ST_FOLIUM = True
-_RENDER_ARGS = dict(returned_objects=[], use_container_width=True, height=650)
 
-from data import locations_trip, winner_id, camping, bakery, supermarkt
+from data import winner_id
+from lib.geocode import LIVE_POLL_S, geocode_many, geocode_progressive
+from lib.map_cache import cached_layers, fingerprint
+from lib.map_utils import (
+    MAP_KEY,
+    NAME_POPUP_TEMPLATE,
+    MapLayers,
+    places_table,
+    point_layer,
+    render_layers,
+)
+from lib.session import map_slot, page_body
+from lib.site_export import Page, Table
+from lib.spatial_index import anchor_point, trip_index
+from lib.timing import span
+from lib.trip_build import compiled_coords
+from lib.trip_store import trip_store
 
-CAMP_ICON_URL = "https://cdn-icons-png.flaticon.com/512/9173/9173952.png"
-CAMP_ICON_SIZE = (40, 40)
-CAMP_ICON_ANCHOR = (20, 40)
 MAX_ZOOM = 15
-FA_BAKERY = "coffee"
-FA_SUPERMARKET = "shopping-basket"
-
-def _new_geocoder() -> Nominatim:
-    return Nominatim(user_agent="restaurant-mapper/1.0 (streamlit)", timeout=5)
-
-@st.cache_data(show_spinner=False, ttl=60 * 60 * 24)
-def geocode_one(address: str) -> Optional[Tuple[float, float]]:
-    safe = RateLimiter(_new_geocoder().geocode, min_delay_seconds=1, swallow_exceptions=True)
-    loc = safe(address)
-    if not loc:
-        return None
-    return float(loc.latitude), float(loc.longitude)
-
-def popup_html(name: str, desc: str, gmap_url: str) -> str:
-    return f"""
+
+POPUP_TEMPLATE = """
         <div style="max-width: 250px">
             <b>{name}</b><br>
-            <span style="font-size: 12px">{desc}</span><br>
-            <a href="{gmap_url}" target="_blank">📍 View on Google Maps</a>
+            <span style="font-size: 12px">{description}</span><br>
+            <a href="{url}" target="_blank">📍 View on Google Maps</a>
         </div>
     """
-
-def render_camping(selected_trip_id: Optional[int] = None, *, key: Optional[str] = None) -> None:
-    trip_id = selected_trip_id if selected_trip_id is not None else winner_id
-    trip_name, trip_center = locations_trip[trip_id]
-
-    # Filter to trip
-    trip_camps = [c for c in camping if c.get("trip_id") == trip_id]
-    trip_bakeries = [b for b in bakery if b.get("trip_id") == trip_id]
-    trip_supermarkets = [s for s in supermarkt if s.get("trip_id") == trip_id]
-
+KIND_LABELS = {"bakery": "🥐 Bakery", "supermarket": "🛒 Supermarket", "restaurant": "🍴 Restaurant"}
+
+def _locate_group(
+    places: Iterable[dict], kind: str, trip_id: int, *, background: bool = False
+) -> Tuple[List[dict], List[dict], Set[str]]:
+    """(copies of `places` with lat/lon filled in, the ones that could not be geocoded,
+    addresses still being resolved in the background)."""
+    places_list = [dict(r) for r in places]
+    resolved = dict(compiled_coords(kind, trip_id))  # prebuilt by lib.trip_build
+    todo = [r.get("address", "") for r in places_list if r.get("address", "") not in resolved]
+    pending: Set[str] = set()
+    if background:
+        found, pending = geocode_progressive(todo)
+    else:
+        found = geocode_many(todo)
+    resolved.update(found)
+    failures: List[dict] = []
+    for r in places_list:
+        coords = resolved.get(r.get("address", ""))
+        r["lat"], r["lon"] = coords if coords else (None, None)
+        if not coords and r.get("address", "") not in pending:
+            failures.append(r)
+    return places_list, failures, pending
+
+def _geocode_group(places: Iterable[dict], kind: str, trip_id: int, label: str) -> Tuple[List[dict], Set[str]]:
+    """Copies of `places` with cached lat/lon filled in (None otherwise), and the addresses
+    still being geocoded in the background."""
+    places_list, failures, pending = _locate_group(places, kind, trip_id, background=True)
+    if failures:
+        with st.expander(f"⚠️ {len(failures)} {label.lower()} could not be geocoded (click to view)"):
+            for r in failures:
+                st.write(f"- {r.get('name','')} — `{r.get('address','')}`")
+    return places_list, pending
+
+def _fill_resolved(rows: Iterable[dict]) -> Set[str]:
+    """Fill in coordinates resolved in the background since the last run; returns the addresses still pending."""
+    todo = [r for r in rows if r.get("lat") is None]
+    found, still = geocode_progressive(r.get("address", "") for r in todo)
+    for r in todo:
+        coords = found.get(r.get("address", ""))
+        if coords:
+            r["lat"], r["lon"] = coords
+    return still
+
+def _nearby_table(rows: List[dict], ids: Iterable[int], dists: Iterable[float]) -> pd.DataFrame:
+    return pd.DataFrame([
+        {"Type": KIND_LABELS.get(rows[i]["kind"], rows[i]["kind"]), "Name": rows[i].get("name", ""),
+         "Distance (km)": round(float(d), 2), "Google Maps": rows[i].get("gmap_url", "")}
+        for i, d in zip(ids, dists)
+    ])
+
+def _build_layers(
+    trip_center: Tuple[float, float], trip_camps: List[dict], trip_bakeries: List[dict], trip_supermarkets: List[dict]
+) -> Tuple[MapLayers, dict]:
     # Center on camping locations
     camp_points: List[Tuple[float, float]] = [
         (float(c["lat"]), float(c["lon"]))
@@ -57,78 +95,117 @@ def render_camping(selected_trip_id: Optional[int] = None, *, key: Optional[str]
         center_lat = sum(p[0] for p in camp_points) / len(camp_points)
         center_lon = sum(p[1] for p in camp_points) / len(camp_points)
         map_center = (center_lat, center_lon)
-        start_zoom = 12 if len(camp_points) == 1 else 11
     else:
         map_center = trip_center
-        start_zoom = 10
-
-    m = folium.Map(location=map_center, zoom_start=start_zoom, tiles="CartoDB Positron", control_scale=True)
     all_coords: List[List[float]] = [list(map_center)]
 
-    # Plugins
-    plugins.Fullscreen(position="topright").add_to(m)
-    plugins.LocateControl(auto_start=False).add_to(m)
-    plugins.MeasureControl(primary_length_unit="kilometers").add_to(m)
-    plugins.MiniMap(toggle_display=True).add_to(m)
-    plugins.MousePosition(separator=" | ", position="bottomleft").add_to(m)
-
     # Layers
-    fg_camps = folium.FeatureGroup(name="🏕️ Camping", show=True).add_to(m)
-    fg_bakeries = folium.FeatureGroup(name="🥐 Bakeries", show=True).add_to(m)
-    fg_supermarkets = folium.FeatureGroup(name="🛒 Supermarkets", show=True).add_to(m)
-
-    clu_bakeries = plugins.MarkerCluster(name="Bakeries cluster", show=True); clu_bakeries.add_to(fg_bakeries)
-    clu_supermarkets = plugins.MarkerCluster(name="Supermarkets cluster", show=True); clu_supermarkets.add_to(fg_supermarkets)
-
-    for c in trip_camps:
-        lat, lon = float(c["lat"]), float(c["lon"])
-        folium.Marker(
-            location=[lat, lon],
-            popup=folium.Popup(html=f"<b>{c['name']}</b>", max_width=250),
-            icon=folium.CustomIcon(CAMP_ICON_URL, icon_size=CAMP_ICON_SIZE, icon_anchor=CAMP_ICON_ANCHOR),
-        ).add_to(fg_camps)
-        all_coords.append([lat, lon])
-
-    def add_poi_group(places: Iterable[dict], fa_icon: str, color: str, cluster_layer: plugins.MarkerCluster, label: str) -> int:
-        added = 0
-        failures: List[dict] = []
-        progress = st.progress(0, text=f"Geocoding {label} …")
-        places_list = list(places)
-        n = len(places_list) or 1
-        for i, r in enumerate(places_list, start=1):
-            coords = geocode_one(r.get("address", ""))
-            progress.progress(i / n, text=f"Geocoding {label} ({i}/{len(places_list)})")
-            if not coords:
-                failures.append(r); continue
-            lat, lon = coords
-            folium.Marker(
-                location=[lat, lon],
-                popup=popup_html(r.get("name",""), r.get("description",""), r.get("gmap_url","#")),
-                icon=folium.Icon(icon=fa_icon, prefix="fa", color=color),
-            ).add_to(cluster_layer)
-            all_coords.append([lat, lon]); added += 1
-        progress.empty()
-        if failures:
-            with st.expander(f"⚠️ {len(failures)} {label.lower()} could not be geocoded (click to view)"):
-                for r in failures:
-                    st.write(f"- {r.get('name','')} — `{r.get('address','')}`")
-        return added
-
-    add_poi_group(trip_bakeries, FA_BAKERY, "orange", clu_bakeries, "Bakeries")
-    add_poi_group(trip_supermarkets, FA_SUPERMARKET, "blue", clu_supermarkets, "Supermarkets")
-
-    #folium.LayerControl(collapsed=False).add_to(m)
-
-    # Fit bounds
-    if all_coords:
-        m.fit_bounds(all_coords, max_zoom=MAX_ZOOM)
-
-    # --- IMPORTANT: make the key unique to data/state ------------------------
-    # include trip_id AND a small hash of bounds so the widget resets when points change
-    lats = [c[0] for c in all_coords]; lons = [c[1] for c in all_coords]
-    bounds_tuple = (round(min(lats), 4), round(min(lons), 4), round(max(lats), 4), round(max(lons), 4))
-    view_hash = abs(hash(bounds_tuple)) % 10_000_000  # short
-    map_key = key or f"camping_map_{trip_id}_{view_hash}"
-
-    _st_render_map(m, key="camping", **_RENDER_ARGS)
+    fg_camps = folium.FeatureGroup(name="🏕️ Camping", show=True)
+    fg_bakeries = folium.FeatureGroup(name="🥐 Bakeries", show=True)
+    fg_supermarkets = folium.FeatureGroup(name="🛒 Supermarkets", show=True)
+
+    point_layer(places_table(trip_camps, icon="camp"), popup_template=NAME_POPUP_TEMPLATE, max_width=250,
+                cluster=False).add_to(fg_camps)
+    all_coords.extend([float(c["lat"]), float(c["lon"])] for c in trip_camps)
+
+    def add_poi_group(places: List[dict], kind: str, layer: folium.FeatureGroup) -> int:
+        located = [r for r in places if r.get("lat") is not None]
+        point_layer(places_table(located, icon=kind), popup_template=POPUP_TEMPLATE, max_width=250).add_to(layer)
+        all_coords.extend([r["lat"], r["lon"]] for r in located)
+        return len(located)
+
+    add_poi_group(trip_bakeries, "bakery", fg_bakeries)
+    add_poi_group(trip_supermarkets, "supermarket", fg_supermarkets)
 
+    return MapLayers([fg_camps, fg_bakeries, fg_supermarkets], all_coords, max_zoom=MAX_ZOOM), {}
+
+def render_camping(selected_trip_id: Optional[int] = None, *, key: Optional[str] = None) -> None:
+    trip_id = selected_trip_id if selected_trip_id is not None else winner_id
+    trip_name, trip_center = trip_store().location(trip_id)
+
+    # Filter to trip
+    with span("data"):
+        store = trip_store()
+        trip_camps = store.records("camping", trip_id)
+    # Cached coordinates right away; the rest is geocoded in the background
+    trip_bakeries, pending_b = _geocode_group(store.records("bakery", trip_id), "bakery", trip_id, "Bakeries")
+    trip_supermarkets, pending_s = _geocode_group(
+        store.records("supermarket", trip_id), "supermarket", trip_id, "Supermarkets"
+    )
+    trip_restaurants, pending_r = _geocode_group(
+        store.records("restaurant", trip_id), "restaurant", trip_id, "Restaurants"
+    )
+    pending = pending_b | pending_s | pending_r
+
+    # Everything around the campsite, nearest first; the radius also filters the map.
+    with span("distances"):
+        camp_lat, camp_lon = anchor_point(trip_camps, trip_center)
+        index, rows = trip_index(
+            trip_id, {"bakery": trip_bakeries, "supermarket": trip_supermarkets, "restaurant": trip_restaurants}
+        )
+        ids, dists = index.within(camp_lat, camp_lon, math.inf)
+        max_km = math.ceil(float(dists[-1])) if len(ids) else 0
+        if max_km > 1:  # all within 1 km: nothing to filter, and the slider needs min < max
+            radius = st.slider("Radius around the campsite (km)", 1, max_km, max_km, key=f"camping_radius_{trip_id}")
+            ids, dists = index.within(camp_lat, camp_lon, radius)
+            keep = set(ids.tolist())  # rows are bakeries, then supermarkets, then restaurants
+            n_bakeries = len(trip_bakeries)
+            trip_bakeries = [r for j, r in enumerate(trip_bakeries) if j in keep]
+            trip_supermarkets = [r for j, r in enumerate(trip_supermarkets) if n_bakeries + j in keep]
+
+    @st.fragment(run_every=LIVE_POLL_S if pending else None)
+    def live_map() -> None:
+        # Reruns alone while lookups are pending and adds the places resolved meanwhile.
+        still = _fill_resolved(trip_bakeries + trip_supermarkets + trip_restaurants)
+
+        # The layers only depend on these rows; reuse them until they change.
+        with span("map"):
+            fp = fingerprint(trip_center, trip_camps, trip_bakeries, trip_supermarkets)
+            layers, _ = cached_layers(
+                trip_id, "camping", fp, lambda: _build_layers(trip_center, trip_camps, trip_bakeries, trip_supermarkets)
+            )
+
+        # Same map on every page and run: only the layers and the view are sent
+        render_layers(layers, key=key or MAP_KEY)
+        if still:
+            st.caption(f"⏳ Still geocoding {len(still)} places …")
+        elif pending:
+            st.rerun()  # all in: refresh distances and the nearby table
+
+    with map_slot():
+        live_map()
+
+    if len(ids):
+        with page_body(), span("table", rows=len(ids)):
+            st.subheader("Nearby")
+            df_near = _nearby_table(rows, ids, dists)
+            st.dataframe(
+                df_near,
+                use_container_width=True,
+                hide_index=True,
+                column_config={
+                    "Distance (km)": st.column_config.NumberColumn(format="%.1f km"),
+                    "Google Maps": st.column_config.LinkColumn("Google Maps", display_text="📍 Link"),
+                },
+            )
+
+
+def export_page(trip_id: int) -> Page:
+    """The section without Streamlit, for lib.site_export (everything, no radius filter)."""
+    store = trip_store()
+    _, trip_center = store.location(trip_id)
+    trip_camps = store.records("camping", trip_id)
+    groups, failures = {}, []
+    for kind in ("bakery", "supermarket", "restaurant"):
+        groups[kind], failed, _ = _locate_group(store.records(kind, trip_id), kind, trip_id)
+        failures += failed
+    camp_lat, camp_lon = anchor_point(trip_camps, trip_center)
+    index, rows = trip_index(trip_id, groups)
+    ids, dists = index.within(camp_lat, camp_lon, math.inf)
+    layers, _ = _build_layers(trip_center, trip_camps, groups["bakery"], groups["supermarket"])
+    return Page(
+        "Camping", layers.to_map(),
+        tables=[Table("Nearby", _nearby_table(rows, ids, dists), links={"Google Maps": "📍 Link"},
+                      formats={"Distance (km)": "{:.1f} km"})] if len(ids) else [],
+        notes=[f"Could not be geocoded: {r.get('name', '')}" for r in failures],
+    )
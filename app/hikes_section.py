@@ -1,187 +1,340 @@
 # app/poi_hikes_section.py
 from __future__ import annotations
 
+import math
 from itertools import cycle
-from typing import List, Optional
+from typing import Dict, List, Optional, Set, Tuple, Union
 
 import folium
-import geopandas as gpd
 import pandas as pd
 import streamlit as st
-from folium import plugins
-from shapely.geometry import LineString, MultiLineString
 
-from data import HIKES, POIs, camping, locations_trip, winner_id
-from lib.geocode import geocode_one
+from data import winner_id
+from lib.geocode import LIVE_POLL_S, geocode_many, geocode_progressive
+from lib.hike_stats import HikeStats, stats_for_files
+from lib.map_cache import cached_layers, fingerprint
 from lib.map_utils import (
-    add_default_plugins,
-    fit_bounds,
-    force_fit_on_mount,
-    new_map,
-    render_map,
+    NAME_POPUP_TEMPLATE,
+    MapLayers,
+    estimate_fit_zoom,
+    line_feature,
+    places_table,
+    point_layer,
+    points_to_bounds,
+    render_layers,
+    track_layer,
 )
-from lib.session import unique_map_key
+from lib.session import map_slot, page_body
+from lib.simplify import simplify_track
+from lib.site_export import Page, Table
+from lib.spatial_index import anchor_point
+from lib.timing import span
+from lib.track_catalog import tracks_near
+from lib.tracks import Track, default_store, load_tracks
+from lib.trip_build import compiled_coords, compiled_track
+from lib.trip_export import download_bundle
+from lib.trip_store import trip_store
 
-# --- Icons / constants --------------------------------------------------------
-CAMP_ICON_URL = "https://cdn-icons-png.flaticon.com/512/9173/9173952.png"
-CAMP_ICON_SIZE = (40, 40)
-CAMP_ICON_ANCHOR = (20, 40)
+# --- Constants ----------------------------------------------------------------
 MAX_ZOOM = 15
+TRACK_POINT_BUDGET = 4000        # vertices across all tracks on the map
+SIMPLIFY_ZOOM_HEADROOM = 2       # keep tracks accurate this many levels past the initial view
+NEARBY_DEFAULT_KM = 15           # "Weitere Touren in der Nähe": default and largest radius
+NEARBY_MAX_KM = 50
 
 PALETTE = ["#e41a1c", "#377eb8", "#4daf4a", "#984ea3", "#ff7f00",
            "#ffff33", "#a65628", "#f781bf", "#999999"]
 
 
-def popup_html(name: str, desc: str, gmap_url: str) -> str:
-    return (
-        "<div style='max-width:260px'>"
-        f"<b>{name}</b><br>"
-        f"<span style='font-size:12px'>{desc}</span><br>"
-        f"<a href='{gmap_url}' target='_blank'>📍 Auf Google Maps öffnen</a>"
-        "</div>"
-    )
+def _fmt_hours(hours: float) -> str:
+    if math.isnan(hours):
+        return ""
+    total_min = int(round(hours * 60))
+    h, m = divmod(total_min, 60)
+    return f"{h}h {m}min" if m else f"{h}h"
 
 
-def _extract_track_coords(gdf: gpd.GeoDataFrame) -> List[List[float]]:
-    coords: List[List[float]] = []
-    for geom in gdf.geometry:
-        if isinstance(geom, LineString):
-            coords.extend([[lat, lon] for lon, lat in list(geom.coords)])
-        elif isinstance(geom, MultiLineString):
-            for line in geom.geoms:
-                coords.extend([[lat, lon] for lon, lat in list(line.coords)])
-    return coords
+def _stats_columns(s: Optional[HikeStats]) -> dict:
+    if s is None:
+        return {"Länge (km)": None, "Aufstieg (m)": None, "Abstieg (m)": None,
+                "Min. Höhe (m)": None, "Max. Höhe (m)": None, "Gehzeit (berechnet)": "", "Bewegungszeit": ""}
+    def num(x: float, digits: int = 0) -> Optional[float]:
+        return None if math.isnan(x) else round(x, digits)
 
+    return {
+        "Länge (km)": num(s.length_km, 1),
+        "Aufstieg (m)": num(s.ascent_m),
+        "Abstieg (m)": num(s.descent_m),
+        "Min. Höhe (m)": num(s.ele_min_m),
+        "Max. Höhe (m)": num(s.ele_max_m),
+        "Gehzeit (berechnet)": _fmt_hours(s.walking_time_h),
+        "Bewegungszeit": _fmt_hours(s.moving_time_h),
+    }
 
-def render_poi_hikes(selected_trip_id: Optional[int] = None, *, page_id: str = "poi_hikes") -> None:
-    trip_id = selected_trip_id if selected_trip_id is not None else winner_id
-    trip_name, trip_center = locations_trip[trip_id]
-    trip_pois  = [p.copy() for p in POIs  if p.get("trip_id") == trip_id]
-    trip_hikes = [h.copy() for h in HIKES if h.get("trip_id") == trip_id]
-    trip_camps = [c.copy() for c in camping if c.get("trip_id") == trip_id]
 
-    m = new_map(trip_center, zoom=10)
-    add_default_plugins(m)
+def _simplified_caption(meta: dict) -> str:
+    return (
+        f"Tracks vereinfacht: {meta['kept_vertices']} von {meta['total_vertices']} Punkten "
+        f"({meta['total_vertices'] - meta['kept_vertices']} entfernt)"
+    )
 
-    fg_camps = folium.FeatureGroup(name="🏕️ Camping", show=True).add_to(m)
-    fg_pois  = folium.FeatureGroup(name="📌 POIs", show=True).add_to(m)
-    fg_hikes_master = folium.FeatureGroup(name="🥾 Wanderungen", show=True).add_to(m)
-    clu_pois = plugins.MarkerCluster(name="POIs Cluster", show=True); clu_pois.add_to(fg_pois)
 
-    points: List[List[float]] = [list(m.location)]
+def _build_layers(
+    trip_center: Tuple[float, float], trip_camps: List[dict], trip_pois: List[dict], tracks: List[Tuple[dict, Track]]
+) -> Tuple[MapLayers, dict]:
+    fg_camps = folium.FeatureGroup(name="🏕️ Camping", show=True)
+    fg_pois  = folium.FeatureGroup(name="📌 POIs", show=True)
+    fg_hikes_master = folium.FeatureGroup(name="🥾 Wanderungen", show=True)
+
+    points: List[List[float]] = [list(trip_center)]
 
     # Camps
-    for c in trip_camps:
-        lat, lon = float(c["lat"]), float(c["lon"])
-        folium.Marker(
-            [lat, lon],
-            popup=folium.Popup(f"<b>{c.get('name','')}</b>", max_width=250),
-            icon=folium.CustomIcon(CAMP_ICON_URL, icon_size=CAMP_ICON_SIZE, icon_anchor=CAMP_ICON_ANCHOR),
-        ).add_to(fg_camps)
-        points.append([lat, lon])
-
-    # POIs (geocode)
-    failed: List[str] = []
-    prog = st.progress(0, text="Geocoding POIs …")
-    N = max(len(trip_pois), 1)
-    for i, p in enumerate(trip_pois, start=1):
-        coords = geocode_one(p.get("address", "")) if p.get("address") else None
-        if not coords:
-            p["lat"], p["lon"] = None, None
-            failed.append(p.get("name", ""))
-            prog.progress(i / N, text=f"Geocoding POIs … ({i}/{len(trip_pois)})")
+    point_layer(places_table(trip_camps, icon="camp"), popup_template=NAME_POPUP_TEMPLATE, max_width=250,
+                cluster=False).add_to(fg_camps)
+    points += [[float(c["lat"]), float(c["lon"])] for c in trip_camps]
+
+    # POIs: one clustered GeoJSON layer instead of a Marker per row
+    point_layer(places_table(trip_pois)).add_to(fg_pois)
+    points += [[p["lat"], p["lon"]] for p in trip_pois if p.get("lat") is not None]
+
+    # Hikes
+    for _, track in tracks:
+        points += track.bounds
+
+    # Simplify for the zoom the map opens at (plus headroom), within the point budget
+    zoom = estimate_fit_zoom(points_to_bounds(points), max_zoom=MAX_ZOOM) + SIMPLIFY_ZOOM_HEADROOM
+    per_track_budget = TRACK_POINT_BUDGET // max(len(tracks), 1)
+    total_vertices = kept_vertices = 0
+    warnings: List[str] = []
+    colors = cycle(PALETTE)
+    features = []
+    for h, track in tracks:
+        line, offsets = simplify_track(track.coords, track.offsets, zoom=zoom, max_points=per_track_budget)
+        # one feature with several parts: segments stay separate, gaps are not bridged
+        parts = [line[a:b] for a, b in zip(offsets[:-1], offsets[1:]) if b - a >= 2]
+        if not parts:
+            warnings.append(f"Kein Linien-Geom in {h['name']}")
             continue
+        total_vertices += len(track)
+        kept_vertices += len(line)
+        features.append(line_feature(parts, {
+            "name": h["name"], "duration": h.get("duration", ""), "link": h.get("link", "#"), "color": next(colors),
+        }))
+    # all tracks in one GeoJSON asset, cached by the browser until a track changes
+    if features:
+        track_layer(features).add_to(fg_hikes_master)
 
-        lat, lon = coords
-        p["lat"], p["lon"] = lat, lon
+    layers = MapLayers([fg_camps, fg_pois, fg_hikes_master], points, max_zoom=MAX_ZOOM)
+    return layers, {"warnings": warnings, "total_vertices": total_vertices, "kept_vertices": kept_vertices}
 
-        folium.Marker(
-            [lat, lon],
-            popup=folium.Popup(popup_html(p.get("name",""), p.get("description",""), p.get("gmap_url","#")), max_width=300),
-            icon=folium.Icon(icon="info-sign", prefix="glyphicon", color="blue"),
-        ).add_to(clu_pois)
-        points.append([lat, lon])
-        prog.progress(i / N, text=f"Geocoding POIs … ({i}/{len(trip_pois)})")
-    prog.empty()
 
-    if failed:
-        with st.expander(f"⚠️ {len(failed)} POIs konnten nicht geocoded werden (anzeigen)"):
-            for n in failed:
-                st.write(f"- {n}")
+def _locate(trip_pois: List[dict], trip_id: int, *, background: bool = False) -> Tuple[List[str], Set[str]]:
+    """Fill in lat/lon of each POI; returns (names that could not be geocoded,
+    addresses still being resolved in the background)."""
+    resolved = dict(compiled_coords("poi", trip_id))  # prebuilt by lib.trip_build
+    todo = [p.get("address", "") for p in trip_pois if p.get("address", "") not in resolved]
+    pending: Set[str] = set()
+    if background:
+        found, pending = geocode_progressive(todo)
+    else:
+        found = geocode_many(todo)
+    resolved.update(found)
+    failed: List[str] = []
+    for p in trip_pois:
+        coords = resolved.get(p.get("address", ""))
+        p["lat"], p["lon"] = coords if coords else (None, None)
+        if not coords and p.get("address", "") not in pending:
+            failed.append(p.get("name", ""))
+    return failed, pending
 
-    # Hikes
-    loaded = 0
-    colors = cycle(PALETTE)
+
+def _load_tracks(trip_hikes: List[dict]) -> Tuple[List[Tuple[dict, Track]], List[str], List[str]]:
+    """(hikes with their track, track content keys, warnings) for the hikes that have track data."""
+    tracks: List[Tuple[dict, Track]] = []
+    track_keys: List[str] = []
+    warnings: List[str] = []
+    loaded: Dict[str, Union[Track, Exception]] = {}
     for h in trip_hikes:
         try:
-            gdf = gpd.read_file(h["file"], layer="tracks")
-            if gdf.empty:
-                st.warning(f"Keine Track-Daten in {h['name']}")
-                continue
-
-            coords = _extract_track_coords(gdf)
-            if not coords:
-                st.warning(f"Kein Linien-Geom in {h['name']}")
+            track = compiled_track(h["file"])
+        except Exception as e:
+            track = e
+        if track is not None:
+            loaded[h["file"]] = track
+    # parsed once (several files at a time), then memory-mapped
+    loaded.update(load_tracks([h["file"] for h in trip_hikes if h["file"] not in loaded]))
+    digests = default_store().digest_many([h["file"] for h in trip_hikes])  # under the store lock
+    for h in trip_hikes:
+        try:
+            track = loaded[h["file"]]
+            if isinstance(track, Exception):
+                raise track
+            if not len(track):
+                warnings.append(f"Keine Track-Daten in {h['name']}")
                 continue
-
-            xmin, ymin, xmax, ymax = gdf.total_bounds
-            points += [[ymin, xmin], [ymax, xmax]]
-
-            fg = folium.FeatureGroup(name=f"🥾 {h['name']}")
-            folium.PolyLine(
-                locations=coords,
-                color=next(colors),
-                weight=3,
-                popup=folium.Popup(
-                    f"<b>{h['name']}</b><br>{h.get('duration','')}<br>"
-                    f"<a href='{h.get('link','#')}' target='_blank'>🔗 Hike Info</a>",
-                    max_width=300,
-                ),
-            ).add_to(fg)
-            fg.add_to(fg_hikes_master)
-            loaded += 1
+            tracks.append((h, track))
+            digest = digests[str(h["file"])]
+            if isinstance(digest, OSError):
+                raise digest
+            track_keys.append(digest)
         except Exception as e:  # keep robust
-            st.warning(f"Fehler beim Laden von '{h.get('name','?')}': {e}")
-
-    #folium.LayerControl(collapsed=False).add_to(m)
-    fit_bounds(m, points, max_zoom=MAX_ZOOM)
-    force_fit_on_mount(m, points, max_zoom=MAX_ZOOM)
+            warnings.append(f"Fehler beim Laden von '{h.get('name','?')}': {e}")
+    return tracks, track_keys, warnings
 
-    # Unique key per visit + bounds signature
-    lats = [p[0] for p in points]; lons = [p[1] for p in points]
-    sig = (round(min(lats),4), round(min(lons),4), round(max(lats),4), round(max(lons),4))
-    render_map(m, key=unique_map_key(page_id, trip_id, sig))
 
-    st.subheader("POI Liste")
+def _poi_table(trip_pois: List[dict]) -> pd.DataFrame:
     # Note: address intentionally omitted (per your earlier requirement)
-    df_pois = pd.DataFrame([
+    return pd.DataFrame([
         {"Name": p.get("name",""), "Beschreibung": p.get("description",""),
         "Google Maps": p.get("gmap_url","")}
         for p in trip_pois
     ])
+
+
+def _hike_table(trip_hikes: List[dict], tracks: List[Tuple[dict, Track]]) -> pd.DataFrame:
+    stats = stats_for_files({h["file"]: track for h, track in tracks})
+    return pd.DataFrame([
+        {"Name": h.get("name",""), "Dauer": h.get("duration",""), **_stats_columns(stats.get(h["file"])),
+         "Link": h.get("link","")}
+        for h in trip_hikes
+    ])
+
+
+def _nearby_tracks(trip_id: int, trip_center: Tuple[float, float], trip_camps: List[dict], trip_hikes: List[dict]) -> None:
+    """GPX files from gpx/ that this trip does not link yet, around the destination or the campsite."""
+    origins = {"Ausflugsziel": trip_center}
+    if any(c.get("lat") is not None for c in trip_camps):
+        origins["Campingplatz"] = anchor_point(trip_camps, trip_center)
+    left, right = st.columns(2)
+    origin = left.radio("Ausgangspunkt", list(origins), horizontal=True, key=f"nearby_origin_{trip_id}")
+    radius = right.slider("Umkreis (km)", 1, NEARBY_MAX_KM, NEARBY_DEFAULT_KM, key=f"nearby_radius_{trip_id}")
+    with span("nearby_tracks"):
+        hits = tracks_near(*origins[origin], radius, exclude=[h["file"] for h in trip_hikes])
+    if not hits:
+        st.caption(f"Keine weiteren Tracks im Umkreis von {radius} km.")
+        return
     st.dataframe(
-        df_pois,
+        pd.DataFrame([
+            {"Track": e.name, "Entfernung (km)": round(d, 1), "Länge (km)": round(e.length_km, 1), "Datei": e.file}
+            for e, d in hits
+        ]),
         use_container_width=True,
         column_config={
-            "Google Maps": st.column_config.LinkColumn("Google Maps", display_text="📍 Link"),
-            "Latitude": st.column_config.NumberColumn(format="%.6f"),
-            "Longitude": st.column_config.NumberColumn(format="%.6f"),
+            "Entfernung (km)": st.column_config.NumberColumn(format="%.1f"),
+            "Länge (km)": st.column_config.NumberColumn(format="%.1f"),
         },
     )
-    st.download_button("POIs als CSV herunterladen",
-                       df_pois.to_csv(index=False).encode("utf-8"),
-                       file_name="pois.csv", mime="text/csv")
 
-    st.subheader("Wanderungen")
-    df_hikes = pd.DataFrame([
-        {"Name": h.get("name",""), "Dauer": h.get("duration",""), "Link": h.get("link","")}
-        for h in trip_hikes
-    ])
-    st.dataframe(
-        df_hikes,
-        use_container_width=True,
-        column_config={"Link": st.column_config.LinkColumn("Link", display_text="🔗 Hike Info")},
+
+def render_poi_hikes(selected_trip_id: Optional[int] = None, *, page_id: str = "poi_hikes") -> None:
+    trip_id = selected_trip_id if selected_trip_id is not None else winner_id
+    trip_name, trip_center = trip_store().location(trip_id)
+    with span("data"):
+        store = trip_store()
+        trip_pois  = store.records("poi", trip_id)
+        trip_hikes = store.records("hike", trip_id)
+        trip_camps = store.records("camping", trip_id)
+
+    # POIs: cached coordinates right away, the rest is geocoded in the background
+    failed, pending = _locate(trip_pois, trip_id, background=True)
+
+    if failed:
+        with st.expander(f"⚠️ {len(failed)} POIs konnten nicht geocoded werden (anzeigen)"):
+            for n in failed:
+                st.write(f"- {n}")
+
+    # Hikes
+    with span("tracks", hikes=len(trip_hikes)):
+        tracks, track_keys, track_warnings = _load_tracks(trip_hikes)
+    for w in track_warnings:
+        st.warning(w)
+
+    @st.fragment(run_every=LIVE_POLL_S if pending else None)
+    def live_map() -> None:
+        # Reruns alone while lookups are pending and adds the POIs resolved meanwhile.
+        _, still = _locate([p for p in trip_pois if p["lat"] is None], trip_id, background=True)
+
+        # The layers only depend on these rows and track contents; reuse them until they change.
+        with span("map", tracks=len(tracks)):
+            fp = fingerprint(trip_center, trip_camps, trip_pois, [h for h, _ in tracks], track_keys)
+            layers, meta = cached_layers(trip_id, page_id, fp, lambda: _build_layers(trip_center, trip_camps, trip_pois, tracks))
+
+        # Same map on every page and run: only the layers and the view are sent
+        render_layers(layers)
+        for w in meta["warnings"]:
+            st.warning(w)
+        if meta["total_vertices"]:
+            st.caption(_simplified_caption(meta))
+        if still:
+            st.caption(f"⏳ {len(still)} POIs werden noch geocoded …")
+        elif pending:
+            st.rerun()  # all in: refresh the failure list
+
+    with map_slot():
+        live_map()
+
+    with page_body():
+        st.subheader("POI Liste")
+        with span("poi_table", rows=len(trip_pois)):
+            df_pois = _poi_table(trip_pois)
+            st.dataframe(
+                df_pois,
+                use_container_width=True,
+                column_config={
+                    "Google Maps": st.column_config.LinkColumn("Google Maps", display_text="📍 Link"),
+                    "Latitude": st.column_config.NumberColumn(format="%.6f"),
+                    "Longitude": st.column_config.NumberColumn(format="%.6f"),
+                },
+            )
+            st.download_button("POIs als CSV herunterladen",
+                               df_pois.to_csv(index=False).encode("utf-8"),
+                               file_name="pois.csv", mime="text/csv")
+
+        st.subheader("Wanderungen")
+        with span("hike_table", rows=len(trip_hikes)):
+            df_hikes = _hike_table(trip_hikes, tracks)
+            st.dataframe(
+                df_hikes,
+                use_container_width=True,
+                column_config={
+                    "Link": st.column_config.LinkColumn("Link", display_text="🔗 Hike Info"),
+                    "Länge (km)": st.column_config.NumberColumn(format="%.1f"),
+                    "Aufstieg (m)": st.column_config.NumberColumn(format="%d"),
+                    "Abstieg (m)": st.column_config.NumberColumn(format="%d"),
+                    "Min. Höhe (m)": st.column_config.NumberColumn(format="%d"),
+                    "Max. Höhe (m)": st.column_config.NumberColumn(format="%d"),
+                },
+            )
+            st.download_button("Wanderungen als CSV herunterladen",
+                               df_hikes.to_csv(index=False).encode("utf-8"),
+                               file_name="hikes.csv", mime="text/csv")
+
+        st.subheader("Weitere Touren in der Nähe")
+        _nearby_tracks(trip_id, trip_center, trip_camps, trip_hikes)
+
+        st.subheader("Export")
+        st.caption("Alle Orte und Wanderungen des Ausflugs als GeoJSON, Parquet und GPX (zip).")
+        download_bundle(trip_id)
+
+
+def export_page(trip_id: int) -> Page:
+    """The section without Streamlit, for lib.site_export."""
+    store = trip_store()
+    _, trip_center = store.location(trip_id)
+    trip_pois = store.records("poi", trip_id)
+    trip_hikes = store.records("hike", trip_id)
+    trip_camps = store.records("camping", trip_id)
+    failed, _ = _locate(trip_pois, trip_id)
+    tracks, _, warnings = _load_tracks(trip_hikes)
+    layers, meta = _build_layers(trip_center, trip_camps, trip_pois, tracks)
+    return Page(
+        "POIs & Wanderungen", layers.to_map(),
+        tables=[
+            Table("POI Liste", _poi_table(trip_pois), links={"Google Maps": "📍 Link"}),
+            Table("Wanderungen", _hike_table(trip_hikes, tracks), links={"Link": "🔗 Hike Info"},
+                  formats={"Länge (km)": "{:.1f}", **dict.fromkeys(
+                      ("Aufstieg (m)", "Abstieg (m)", "Min. Höhe (m)", "Max. Höhe (m)"), "{:.0f}")}),
+        ],
+        notes=[f"Nicht geocoded: {n}" for n in failed] + warnings + meta["warnings"]
+              + ([_simplified_caption(meta)] if meta["total_vertices"] else []),
     )
-    st.download_button("Wanderungen als CSV herunterladen",
-                       df_hikes.to_csv(index=False).encode("utf-8"),
-                       file_name="hikes.csv", mime="text/csv")
@@ -1,17 +1,88 @@
 # app/overview_section.py
 from __future__ import annotations
 
-from typing import List
+from typing import TYPE_CHECKING, Dict, List, Tuple
 
 import folium
 import streamlit as st
 
-from data import locations_home, locations_trip, winner_id
-from lib.map_utils import add_default_plugins, fit_bounds, force_fit_on_mount, new_map, render_map
+from data import locations_home, winner_id
+from lib.destination_score import rank_destinations, road_graph
+from lib.map_cache import cached_layers, fingerprint
+from lib.map_utils import NAME_POPUP_TEMPLATE, MapLayers, point_layer, render_layers
+from lib.session import map_slot, page_body
+from lib.site_export import Page, Table
+from lib.timing import span
+from lib.trip_store import trip_store
 
+if TYPE_CHECKING:
+    import pandas as pd
 
-def render_startpage() -> None:
-    st.markdown("""
+
+def _build_layers(trip_name: str, trip_center: Tuple[float, float], homes: Dict[str, Tuple[float, float]]) -> Tuple[MapLayers, dict]:
+    fg_homes = folium.FeatureGroup(name="🏠 Startorte", show=True)
+    fg_dest  = folium.FeatureGroup(name="📍 Ziel", show=True)
+
+    all_coords: List[List[float]] = [[lat, lon] for lat, lon in homes.values()]
+    point_layer(
+        {"name": list(homes), "lat": [c[0] for c in all_coords], "lon": [c[1] for c in all_coords],
+         "icon": ["home"] * len(homes)},
+        popup_template=NAME_POPUP_TEMPLATE, cluster=False,
+    ).add_to(fg_homes)
+
+    lat, lon = trip_center
+    folium.Marker(
+        [lat, lon],
+        icon=folium.DivIcon(html=f'<div style="width:160px;margin-top:-30px;margin-left:26px;font-weight:600">{trip_name}</div>')
+    ).add_to(fg_dest)
+    point_layer(
+        {"name": [trip_name], "lat": [lat], "lon": [lon], "icon": ["destination"]},
+        popup_template=NAME_POPUP_TEMPLATE, cluster=False,
+    ).add_to(fg_dest)
+    all_coords.append([lat, lon])
+
+    return MapLayers([fg_homes, fg_dest], all_coords, max_zoom=12, padding_px=32), {}
+
+
+RANK_LABELS = {"total": "Gesamtstrecke", "max": "Längste Anreise", "std": "Fairness"}
+
+
+def _ranking_table(ranking: "pd.DataFrame", unit: str) -> "pd.DataFrame":
+    import pandas as pd
+
+    homes = [c for c in ranking.columns if c not in ("trip_id", "name", "rank", "total", "max", "mean", "std")]
+    return pd.DataFrame({
+        "Rang": ranking["rank"],
+        "Ziel": [f"⭐ {n}" if t == winner_id else n for t, n in zip(ranking["trip_id"], ranking["name"])],
+        f"Summe ({unit})": ranking["total"],
+        f"Maximum ({unit})": ranking["max"],
+        f"Streuung ({unit})": ranking["std"],
+        **{f"{h} ({unit})": ranking[h] for h in homes},
+    })
+
+
+def _render_ranking() -> None:
+    st.subheader("Ranking der Ziele")
+    graph = road_graph()
+    left, right = st.columns([2, 1])
+    by = left.segmented_control(
+        "Sortieren nach", options=list(RANK_LABELS), format_func=RANK_LABELS.get, default="total", key="rank_by"
+    ) or "total"
+    use_roads = graph is not None and right.toggle("Fahrzeit statt Luftlinie", key="rank_roads")
+    with span("ranking", roads=use_roads):
+        ranking = rank_destinations(locations_home, trip_store().locations(), by=by, graph=graph if use_roads else None)
+    unit = "min" if use_roads else "km"
+    table = _ranking_table(ranking, unit)
+    st.dataframe(
+        table,
+        hide_index=True,
+        use_container_width=True,
+        column_config={c: st.column_config.NumberColumn(format="%.0f") for c in table.columns if c.endswith(f"({unit})")},
+    )
+    st.caption("Streuung: Standardabweichung der Anreisen, je kleiner desto fairer. ⭐ = aktuelles Ziel.")
+
+
+INTRO = """
     Willkommen zur Planung unseres kleinen Ausflugs zwischen **Wiesloch** und **Reutte**!  
     Jede*r kann Vorschläge einbringen: Städte, Wanderungen, Restaurants, Sehenswürdigkeiten.
 
@@ -19,42 +90,32 @@ def render_startpage() -> None:
 
     **Plappermaulpaul** hat sich bereits freiwillig als unser ehrenwerter gruppenguide gemeldet.  
     Er verspricht, uns mit viel Fachwissen (und mindestens genauso viel halbwissen) sicher durchs Tagesprogramm zu führen – auch fernab der römischen Geschichte.
-    """)
-
-    trip_name, trip_center = locations_trip[winner_id]
-    m = new_map(trip_center, zoom=7)
-    add_default_plugins(m)
+"""
 
-    fg_homes = folium.FeatureGroup(name="🏠 Startorte", show=True).add_to(m)
-    fg_dest  = folium.FeatureGroup(name="📍 Ziel", show=True).add_to(m)
 
-    HOME_ICON = "https://cdn-icons-png.flaticon.com/512/25/25694.png"
-    DEST_ICON = "https://cdn-icons-png.flaticon.com/512/684/684908.png"
+@st.fragment
+def _render_map() -> None:
+    # A fragment like the other pages' live maps, so the map sits at the same place in the tree
+    with span("map"):
+        trip_name, trip_center = trip_store().location(winner_id)
+        fp = fingerprint(trip_name, trip_center, locations_home)
+        layers, _ = cached_layers(winner_id, "overview", fp, lambda: _build_layers(trip_name, trip_center, locations_home))
+    render_layers(layers)
 
-    all_coords: List[List[float]] = []
-    for city, (lat, lon) in locations_home.items():
-        folium.Marker(
-            [lat, lon],
-            popup=city,
-            icon=folium.CustomIcon(HOME_ICON, icon_size=(40,40), icon_anchor=(20,40))
-        ).add_to(fg_homes)
-        all_coords.append([lat, lon])
 
-    lat, lon = trip_center
-    folium.Marker(
-        [lat, lon],
-        icon=folium.DivIcon(html=f'<div style="width:160px;margin-top:-30px;margin-left:26px;font-weight:600">{trip_name}</div>')
-    ).add_to(m)
-    folium.Marker(
-        [lat, lon],
-        popup=trip_name,
-        icon=folium.CustomIcon(DEST_ICON, icon_size=(40,40), icon_anchor=(20,40))
-    ).add_to(fg_dest)
-    all_coords.append([lat, lon])
+def render_startpage() -> None:
+    st.markdown(INTRO)
+    with map_slot():
+        _render_map()
+    with page_body():
+        _render_ranking()
 
-    # folium.LayerControl(collapsed=False).add_to(m)
-    fit_bounds(m, all_coords, max_zoom=7)
-    # Ensure bounds are re-applied after the map iframe mounts (fixes "not all markers visible")
-    force_fit_on_mount(m, all_coords, max_zoom=12, padding_px=32)
 
-    render_map(m, key="overview_start")
+def export_page(trip_id: int) -> Page:
+    """The start page for one trip, without Streamlit (lib.site_export)."""
+    trip_name, trip_center = trip_store().location(trip_id)
+    layers, _ = _build_layers(trip_name, trip_center, locations_home)
+    ranking = _ranking_table(rank_destinations(locations_home, trip_store().locations()), "km")
+    return Page("Info", layers.to_map(), intro=INTRO, tables=[
+        Table("Ranking der Ziele", ranking, formats={c: "{:.0f}" for c in ranking.columns if c.endswith("(km)")}),
+    ])
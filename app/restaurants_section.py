@@ -1,134 +1,181 @@
 # app/restaurants_section.py
 from __future__ import annotations
 
-from typing import List, Optional, Tuple
+import math
+from typing import List, Optional, Set, Tuple
 
 import folium
 import pandas as pd
 import streamlit as st
-from folium import plugins
 
-from data import camping, locations_trip, restaurants, winner_id
-from lib.geocode import geocode_one
+from data import winner_id
+from lib.geocode import LIVE_POLL_S, geocode_many, geocode_progressive
+from lib.map_cache import cached_layers, fingerprint
 from lib.map_utils import (
-    add_default_plugins,
-    fit_bounds,
-    force_fit_on_mount,
-    new_map,
-    render_map,
+    NAME_POPUP_TEMPLATE,
+    MapLayers,
+    places_table,
+    point_layer,
+    render_layers,
 )
-from lib.session import unique_map_key
-
-# --- Icons / constants --------------------------------------------------------
-CAMP_ICON_URL = "https://cdn-icons-png.flaticon.com/512/9173/9173952.png"
-CAMP_ICON_SIZE = (40, 40)
-CAMP_ICON_ANCHOR = (20, 40)
+from lib.session import map_slot, page_body
+from lib.site_export import Page, Table
+from lib.spatial_index import PlaceIndex, anchor_point, trip_index
+from lib.timing import span
+from lib.trip_build import compiled_coords
+from lib.trip_store import trip_store
+
+# --- Constants ----------------------------------------------------------------
 MAX_ZOOM = 15
 
 
-def popup_html(name: str, desc: str, gmap_url: str) -> str:
-    return (
-        "<div style='max-width:250px'>"
-        f"<b>{name}</b><br>"
-        f"<span style='font-size:12px'>{desc}</span><br>"
-        f"<a href='{gmap_url}' target='_blank'>📍 Auf Google Maps öffnen</a>"
-        "</div>"
-    )
-
-
-def render_restaurants(selected_trip_id: Optional[int] = None, *, page_id: str = "restaurants") -> None:
-    trip_id = selected_trip_id if selected_trip_id is not None else winner_id
-    trip_name, trip_center = locations_trip[trip_id]
-    trip_rests = [r.copy() for r in restaurants if r.get("trip_id") == trip_id]
-    trip_camps = [c.copy() for c in camping    if c.get("trip_id") == trip_id]
-
-    # Center: mean of camp coords if present, else trip center
+def _build_layers(trip_center: Tuple[float, float], trip_camps: List[dict], trip_rests: List[dict]) -> Tuple[MapLayers, dict]:
+    # The view opens around the camps (their mean) if present, else the trip center
     camp_points: List[Tuple[float, float]] = [
         (float(c["lat"]), float(c["lon"]))
         for c in trip_camps if c.get("lat") and c.get("lon")
     ]
     if camp_points:
-        clat = sum(p[0] for p in camp_points) / len(camp_points)
-        clon = sum(p[1] for p in camp_points) / len(camp_points)
-        m = new_map((clat, clon), zoom=12 if len(camp_points) == 1 else 11)
+        center = (sum(p[0] for p in camp_points) / len(camp_points), sum(p[1] for p in camp_points) / len(camp_points))
     else:
-        m = new_map(trip_center, zoom=10)
-
-    add_default_plugins(m)
+        center = trip_center
 
     # Layers
-    fg_camps = folium.FeatureGroup(name="🏕️ Camping", show=True).add_to(m)
-    fg_rest  = folium.FeatureGroup(name="🍴 Restaurants", show=True).add_to(m)
-    clu_rest = plugins.MarkerCluster(name="Restaurants Cluster", show=True)
-    clu_rest.add_to(fg_rest)
+    fg_camps = folium.FeatureGroup(name="🏕️ Camping", show=True)
+    fg_rest  = folium.FeatureGroup(name="🍴 Restaurants", show=True)
 
     # Collect bounds
-    points: List[List[float]] = [list(m.location)]
+    points: List[List[float]] = [list(center)]
 
     # Camps
-    for c in trip_camps:
-        lat, lon = float(c["lat"]), float(c["lon"])
-        folium.Marker(
-            [lat, lon],
-            popup=folium.Popup(f"<b>{c.get('name','')}</b>", max_width=250),
-            icon=folium.CustomIcon(CAMP_ICON_URL, icon_size=CAMP_ICON_SIZE, icon_anchor=CAMP_ICON_ANCHOR),
-        ).add_to(fg_camps)
-        points.append([lat, lon])
-
-    # Restaurants (geocode)
-    failed: List[str] = []
-    prog = st.progress(0, text="Geocoding Restaurants …")
-    N = max(len(trip_rests), 1)
+    point_layer(places_table(trip_camps, icon="camp"), popup_template=NAME_POPUP_TEMPLATE, max_width=250,
+                cluster=False).add_to(fg_camps)
+    points += [[float(c["lat"]), float(c["lon"])] for c in trip_camps]
+
+    # Restaurants: one clustered GeoJSON layer instead of a Marker per row
+    point_layer(places_table(trip_rests, icon="restaurant")).add_to(fg_rest)
+    points += [[r["lat"], r["lon"]] for r in trip_rests if r.get("lat") is not None]
+
+    return MapLayers([fg_camps, fg_rest], points, max_zoom=MAX_ZOOM), {}
 
-    for i, r in enumerate(trip_rests, start=1):
-        coords = geocode_one(r.get("address", "")) if r.get("address") else None
-        if not coords:
-            r["lat"], r["lon"] = None, None
+
+def _locate(trip_rests: List[dict], trip_id: int, *, background: bool = False) -> Tuple[List[str], Set[str]]:
+    """Fill in lat/lon of each restaurant; returns (names that could not be geocoded,
+    addresses still being resolved in the background)."""
+    resolved = dict(compiled_coords("restaurant", trip_id))  # prebuilt by lib.trip_build
+    todo = [r.get("address", "") for r in trip_rests if r.get("address", "") not in resolved]
+    pending: Set[str] = set()
+    if background:
+        found, pending = geocode_progressive(todo)
+    else:
+        found = geocode_many(todo)
+    resolved.update(found)
+    failed: List[str] = []
+    for r in trip_rests:
+        coords = resolved.get(r.get("address", ""))
+        r["lat"], r["lon"] = coords if coords else (None, None)
+        if not coords and r.get("address", "") not in pending:
             failed.append(r.get("name", ""))
-            prog.progress(i / N, text=f"Geocoding Restaurants … ({i}/{len(trip_rests)})")
-            continue
+    return failed, pending
 
-        lat, lon = coords
-        r["lat"], r["lon"] = lat, lon
 
-        folium.Marker(
-            [lat, lon],
-            popup=folium.Popup(popup_html(r.get("name",""), r.get("description",""), r.get("gmap_url","#")), max_width=300),
-            icon=folium.Icon(icon="cutlery", prefix="fa", color="red"),
-        ).add_to(clu_rest)
-        points.append([lat, lon])
-        prog.progress(i / N, text=f"Geocoding Restaurants … ({i}/{len(trip_rests)})")
-    prog.empty()
+def _add_distances(
+    trip_id: int, trip_rests: List[dict], trip_camps: List[dict], trip_center: Tuple[float, float]
+) -> Tuple[PlaceIndex, Tuple[float, float]]:
+    """Set `distance_km` (to the campsite) on each restaurant; returns (index, camp point)."""
+    camp_lat, camp_lon = anchor_point(trip_camps, trip_center)
+    index, _ = trip_index(trip_id, {"restaurant": trip_rests})
+    for r, d in zip(trip_rests, index.distances(camp_lat, camp_lon)):
+        r["distance_km"] = None if math.isnan(d) else round(float(d), 2)
+    return index, (camp_lat, camp_lon)
+
+
+def _table(shown: List[dict]) -> pd.DataFrame:
+    return pd.DataFrame([
+        {"Name": r.get("name",""), "Beschreibung": r.get("description",""),
+        "Entfernung (km)": r.get("distance_km"), "Google Maps": r.get("gmap_url","")}
+        for r in sorted(shown, key=lambda r: (r["distance_km"] is None, r["distance_km"] or 0.0))
+    ])
+
+
+def render_restaurants(selected_trip_id: Optional[int] = None, *, page_id: str = "restaurants") -> None:
+    trip_id = selected_trip_id if selected_trip_id is not None else winner_id
+    trip_name, trip_center = trip_store().location(trip_id)
+    with span("data"):
+        store = trip_store()
+        trip_rests = store.records("restaurant", trip_id)
+        trip_camps = store.records("camping", trip_id)
+
+    # Restaurants: cached coordinates right away, the rest is geocoded in the background
+    failed, pending = _locate(trip_rests, trip_id, background=True)
 
     if failed:
         with st.expander(f"⚠️ {len(failed)} Restaurants konnten nicht geocoded werden (anzeigen)"):
             for n in failed:
                 st.write(f"- {n}")
 
-    #folium.LayerControl(collapsed=False).add_to(m)
-    fit_bounds(m, points, max_zoom=MAX_ZOOM)
-    force_fit_on_mount(m, points, max_zoom=MAX_ZOOM)
-
-    # Unique key per visit + bounds signature
-    lats = [p[0] for p in points]; lons = [p[1] for p in points]
-    sig = (round(min(lats),4), round(min(lons),4), round(max(lats),4), round(max(lons),4))
-    render_map(m, key=unique_map_key(page_id, trip_id, sig))
-
-    st.subheader("Restaurant-Liste")
-    df_rests = pd.DataFrame([
-        {"Name": r.get("name",""), "Beschreibung": r.get("description",""),
-        "Google Maps": r.get("gmap_url","")}
-        for r in trip_rests
-    ])
-    st.dataframe(
-        df_rests,
-        use_container_width=True,
-        column_config={
-            "Google Maps": st.column_config.LinkColumn("Google Maps", display_text="📍 Link"),
-            "Latitude": st.column_config.NumberColumn(format="%.6f"),
-            "Longitude": st.column_config.NumberColumn(format="%.6f"),
-        },
+    # Distance to the campsite; the radius filter narrows map and table alike.
+    with span("distances"):
+        index, (camp_lat, camp_lon) = _add_distances(trip_id, trip_rests, trip_camps, trip_center)
+        shown = trip_rests
+        max_km = math.ceil(max((r["distance_km"] for r in trip_rests if r["distance_km"] is not None), default=0))
+        if len(index) and max_km > 1:  # all within 1 km: nothing to filter, and the slider needs min < max
+            radius = st.slider("Umkreis um den Campingplatz (km)", 1, max_km, max_km, key=f"{page_id}_radius_{trip_id}")
+            if radius < max_km:
+                ids, _ = index.within(camp_lat, camp_lon, radius)
+                shown = [trip_rests[i] for i in ids]
+
+    @st.fragment(run_every=LIVE_POLL_S if pending else None)
+    def live_map() -> None:
+        # Reruns alone while lookups are pending and adds the restaurants resolved meanwhile.
+        _, still = _locate([r for r in trip_rests if r["lat"] is None], trip_id, background=True)
+
+        # The layers only depend on these rows; reuse them until they change.
+        with span("map", rows=len(shown)):
+            fp = fingerprint(trip_center, trip_camps, shown)
+            layers, _ = cached_layers(trip_id, page_id, fp, lambda: _build_layers(trip_center, trip_camps, shown))
+
+        # Same map on every page and run: only the layers and the view are sent
+        render_layers(layers)
+        if still:
+            st.caption(f"⏳ {len(still)} Restaurants werden noch geocoded …")
+        elif pending:
+            st.rerun()  # all in: refresh distances, table and the failure list
+
+    with map_slot():
+        live_map()
+
+    with page_body():
+        st.subheader("Restaurant-Liste")
+        with span("table", rows=len(shown)):
+            df_rests = _table(shown)
+            st.dataframe(
+                df_rests,
+                use_container_width=True,
+                column_config={
+                    "Google Maps": st.column_config.LinkColumn("Google Maps", display_text="📍 Link"),
+                    "Entfernung (km)": st.column_config.NumberColumn(format="%.1f km"),
+                    "Latitude": st.column_config.NumberColumn(format="%.6f"),
+                    "Longitude": st.column_config.NumberColumn(format="%.6f"),
+                },
+            )
+            st.download_button("Restaurants als CSV herunterladen",
+                               df_rests.to_csv(index=False).encode("utf-8"),
+                               file_name="restaurants.csv", mime="text/csv")
+
+
+def export_page(trip_id: int) -> Page:
+    """The section without Streamlit, for lib.site_export (all restaurants, no radius filter)."""
+    store = trip_store()
+    _, trip_center = store.location(trip_id)
+    trip_rests = store.records("restaurant", trip_id)
+    trip_camps = store.records("camping", trip_id)
+    failed, _ = _locate(trip_rests, trip_id)
+    _add_distances(trip_id, trip_rests, trip_camps, trip_center)
+    layers, _ = _build_layers(trip_center, trip_camps, trip_rests)
+    return Page(
+        "Restaurants", layers.to_map(),
+        tables=[Table("Restaurant-Liste", _table(trip_rests), links={"Google Maps": "📍 Link"},
+                      formats={"Entfernung (km)": "{:.1f} km"})],
+        notes=[f"Nicht geocoded: {n}" for n in failed],
     )
-    st.download_button("Restaurants als CSV herunterladen",
-                       df_rests.to_csv(index=False).encode("utf-8"),
-                       file_name="restaurants.csv", mime="text/csv")
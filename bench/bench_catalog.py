@@ -0,0 +1,81 @@
+# bench/bench_catalog.py
+"""Track catalog: full and incremental scans of N GPX files, and nearby-track queries.
+
+    python -m bench.bench_catalog [--files N] [--repeat N]
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, List
+
+from lib.paths import ROOT
+from lib.track_catalog import TrackCatalog
+from lib.tracks import TrackStore, parse_gpx
+
+
+def _timeit(fn: Callable[[], object], repeat: int) -> float:
+    samples: List[float] = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples)
+
+
+def _fmt(seconds: float) -> str:
+    return f"{seconds * 1e3:9.3f} ms" if seconds >= 1e-3 else f"{seconds * 1e6:9.1f} µs"
+
+
+def _write_gpx(path: Path, coords) -> None:
+    pts = "".join(f'<trkpt lat="{lat:.6f}" lon="{lon:.6f}"/>' for lat, lon in coords)
+    path.write_text(f'<gpx version="1.1"><trk><trkseg>{pts}</trkseg></trk></gpx>')
+
+
+def main(argv: List[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    # The bundled tracks, shifted to random places across southern Germany.
+    shapes = [parse_gpx(f).coords for f in sorted((ROOT / "gpx").glob("*.gpx"))]
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        gpx_dir = Path(tmp) / "gpx"
+        gpx_dir.mkdir()
+        for i in range(args.files):
+            shape = shapes[i % len(shapes)]
+            shift = (rng.uniform(47.5, 50.0) - shape[0, 0], rng.uniform(7.5, 13.0) - shape[0, 1])
+            _write_gpx(gpx_dir / f"track{i:05d}.gpx", shape + shift)
+
+        def catalog() -> TrackCatalog:
+            return TrackCatalog(gpx_dir, Path(tmp) / "catalog.json", store=TrackStore(Path(tmp) / "tracks"))
+
+        t0 = time.perf_counter()
+        catalog().scan()
+        print(f"full scan, {args.files} files:  {_fmt(time.perf_counter() - t0)}")
+        t0 = time.perf_counter()
+        cat = catalog()
+        cat.scan()
+        print(f"rescan, nothing changed:       {_fmt(time.perf_counter() - t0)}")
+        _write_gpx(gpx_dir / "new.gpx", shapes[0])
+        t0 = time.perf_counter()
+        r = cat.scan()
+        print(f"rescan, one file added:        {_fmt(time.perf_counter() - t0)}  ({r['added']} parsed)")
+
+        points = [(rng.uniform(47.5, 50.0), rng.uniform(7.5, 13.0)) for _ in range(args.repeat)]
+        cat.near(*points[0], 1.0)  # builds the spatial index
+        for km in (5, 20, 50):
+            it = iter(points * 2)
+            hits = len(cat.near(*points[0], km))
+            print(f"near, {km:3d} km:                 {_fmt(_timeit(lambda it=it, km=km: cat.near(*next(it), km), args.repeat))}"
+                  f"  (~{hits} tracks)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+# bench/bench_render.py
+"""Render cost of each section on synthetic trips of growing size.
+
+    python -m bench.bench_render [--places 10,1000,10000] [--tracks 1,20,100] [--track-points 2000]
+                                 [--json OUT] [--baseline JSON] [--tolerance 0.25]
+
+Each case runs main.py through AppTest in a fresh interpreter, against a
+generated data dir (trips/ files, see lib.trip_loader), generated GPX tracks,
+an empty cache dir and a stubbed geocoder (deterministic, no network, no rate
+limit). Per case it records the first run and the rerun wall time, peak RSS,
+rendered map HTML bytes, static GeoJSON asset bytes (lib.static_assets; fetched
+once per browser), markers, and track vertices (in the GPX / drawn).
+The full range from the backlog is `--places 10,1000,100000 --tracks 1,50,500`.
+With --baseline, exits 1 if a case got slower or bigger by more than --tolerance.
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from lib.paths import ROOT
+
+CENTER = (47.80, 9.00)
+PLACE_KINDS = ("restaurant", "poi", "bakery", "supermarket")
+METRICS = ("first_run_s", "rerun_s", "peak_rss_mb", "html_bytes")
+
+_CASE_SCRIPT = """
+import json, resource, sys, time, zlib
+import folium
+import lib.geocode
+from streamlit.testing.v1 import AppTest
+from lib.map_cache import map_cache
+from lib.map_utils import PointLayer
+from lib.static_assets import encode
+
+def _stub(address):
+    h = zlib.crc32(address.encode("utf-8"))
+    return ({lat!r} + ((h & 0xFFFF) / 0xFFFF - 0.5) * 0.3, {lon!r} + ((h >> 16) / 0xFFFF - 0.5) * 0.4)
+lib.geocode._lookup = _stub
+
+def _leaves(locations):
+    return sum(_leaves(x) for x in locations) if locations and isinstance(locations[0], (list, tuple)) and \\
+        isinstance(locations[0][0], (list, tuple)) else len(locations)
+
+def _count(element, out):
+    if isinstance(element, PointLayer):
+        if element.url:
+            out["asset_bytes"] += len(encode(element.data))
+        for f in element.data["features"]:
+            if f["geometry"]["type"] == "Point":
+                out["markers"] += 1
+            else:
+                out["vertices_drawn"] += _leaves(f["geometry"]["coordinates"])
+    elif isinstance(element, folium.Marker):
+        out["markers"] += 1
+    elif isinstance(element, folium.PolyLine):
+        out["vertices_drawn"] += _leaves(element.locations)
+    for child in element._children.values():
+        _count(child, out)
+
+at = AppTest.from_file({main!r}, default_timeout=3600)
+at.session_state["section"] = {section!r}
+t0 = time.perf_counter()
+at.run()
+t1 = time.perf_counter()
+at.run()
+t2 = time.perf_counter()
+if at.exception:
+    sys.exit("section raised: " + str(at.exception[0].value))
+
+out = {{"first_run_s": t1 - t0, "rerun_s": t2 - t1, "html_bytes": 0, "asset_bytes": 0, "markers": 0,
+        "vertices_total": 0, "vertices_drawn": 0}}
+for _key, layers, meta, size in map_cache().items():
+    out["html_bytes"] += size
+    out["vertices_total"] += meta.get("total_vertices", 0)
+    for group in layers.groups:
+        _count(group, out)
+out["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+print(json.dumps(out))
+"""
+
+
+# --- Synthetic data -----------------------------------------------------------
+def write_gpx(path: Path, n_points: int, rng: np.random.Generator) -> None:
+    """A random-walk track of n_points with elevation and timestamps."""
+    start = np.array(CENTER) + rng.uniform(-0.1, 0.1, 2)
+    steps = rng.normal(0, 1.5e-4, (n_points, 2)).cumsum(axis=0)
+    ele = 400 + rng.normal(0, 2, n_points).cumsum()
+    t0 = 1_700_000_000
+    pts = "".join(
+        f'<trkpt lat="{lat:.6f}" lon="{lon:.6f}"><ele>{e:.1f}</ele>'
+        f"<time>{time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(t0 + 5 * i))}</time></trkpt>"
+        for i, ((lat, lon), e) in enumerate(zip(start + steps, ele))
+    )
+    path.write_text(
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<gpx version="1.1" creator="bench" xmlns="http://www.topografix.com/GPX/1/1">'
+        f"<trk><name>{path.stem}</name><trkseg>{pts}</trkseg></trk></gpx>",
+        encoding="utf-8",
+    )
+
+
+def _write_csv(path: Path, columns: List[str], rows: List[Dict[str, object]]) -> None:
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=columns)
+        w.writeheader()
+        w.writerows(rows)
+
+
+def write_dataset(data_dir: Path, places: int, gpx_files: List[Path]) -> None:
+    """trips/ files for one synthetic trip (id 1) with `places` rows per place table."""
+    data_dir.mkdir(parents=True, exist_ok=True)
+    _write_csv(data_dir / "trip.csv", ["trip_id", "name", "lat", "lon"],
+               [{"trip_id": 1, "name": "Synthetisch", "lat": CENTER[0], "lon": CENTER[1]}])
+    _write_csv(data_dir / "camping.csv", ["trip_id", "name", "lat", "lon"],
+               [{"trip_id": 1, "name": "Camping Synth", "lat": CENTER[0] + 0.01, "lon": CENTER[1] + 0.01}])
+    cols = ["trip_id", "name", "address", "description", "gmap_url"]
+    for kind in PLACE_KINDS:
+        _write_csv(data_dir / f"{kind}.csv", cols, [
+            {"trip_id": 1, "name": f"{kind} {i}", "address": f"Synthweg {i}, {kind}",
+             "description": f"Beschreibung {i}", "gmap_url": f"https://example.org/{kind}/{i}"}
+            for i in range(places)
+        ])
+    _write_csv(data_dir / "hike.csv", ["trip_id", "name", "file", "duration", "link"], [
+        {"trip_id": 1, "name": f"Tour {i}", "file": str(f), "duration": "3h", "link": "https://example.org"}
+        for i, f in enumerate(gpx_files)
+    ])
+    _write_csv(data_dir / "airbnb.csv", ["trip_id"], [])
+
+
+# --- Running ------------------------------------------------------------------
+def run_case(section: str, data_dir: Path) -> Dict[str, float]:
+    script = _CASE_SCRIPT.format(lat=CENTER[0], lon=CENTER[1], main=str(ROOT / "main.py"), section=section)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        env = dict(os.environ, PYTHONPATH=str(ROOT), AUSFLUG_DATA_DIR=str(data_dir), AUSFLUG_CACHE_DIR=cache_dir)
+        proc = subprocess.run([sys.executable, "-c", script], cwd=ROOT, env=env, capture_output=True, text=True)
+    if proc.returncode:
+        raise RuntimeError(f"{section}: {proc.stderr[-2000:]}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def cases(places: List[int], tracks: List[int]) -> List[Tuple[str, int, int]]:
+    """(section, places, tracks); each section scales along the tables it renders."""
+    p0, t0 = places[0], tracks[0]
+    out = [("Info", p0, t0)]
+    out += [(s, p, t0) for s in ("Restaurants", "Camping") for p in places]
+    out += [("POIs", p, t0) for p in places] + [("POIs", p0, t) for t in tracks[1:]]
+    return out
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]], tolerance: float) -> List[str]:
+    out = []
+    for case, now in results.items():
+        before = baseline.get(case)
+        if not before:
+            continue
+        for metric in METRICS:
+            old, new = float(before.get(metric, 0)), float(now[metric])
+            if old > 0 and new > old * (1 + tolerance):
+                out.append(f"{case}: {metric} {old:.3g} -> {new:.3g} (+{(new / old - 1) * 100:.0f}%)")
+    return out
+
+
+def _ints(s: str) -> List[int]:
+    return sorted(int(x) for x in s.split(",") if x)
+
+
+def main(argv: List[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--places", type=_ints, default=[10, 1000, 10000], help="rows per place table")
+    parser.add_argument("--tracks", type=_ints, default=[1, 20, 100], help="GPX tracks in the POI section")
+    parser.add_argument("--track-points", type=int, default=2000)
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--baseline", help="compare against a previous --json file")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed growth (0.25 = 25%%)")
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(42)
+    results: Dict[str, Dict[str, float]] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        gpx_dir = Path(tmp) / "gpx"
+        gpx_dir.mkdir()
+        gpx_files = [gpx_dir / f"track_{i:04d}.gpx" for i in range(max(args.tracks))]
+        for f in gpx_files:
+            write_gpx(f, args.track_points, rng)
+
+        print(f"{'case':34} {'1st run':>9} {'rerun':>8} {'RSS MB':>7} {'HTML KB':>9} {'asset KB':>9} {'markers':>8} {'vertices':>17}")
+        for section, n_places, n_tracks in cases(args.places, args.tracks):
+            data_dir = Path(tmp) / f"data_p{n_places}_t{n_tracks}"
+            if not data_dir.exists():
+                write_dataset(data_dir, n_places, gpx_files[:n_tracks])
+            case = f"{section}/places={n_places}/tracks={n_tracks}"
+            r = results[case] = run_case(section, data_dir)
+            print(f"{case:34} {r['first_run_s']:8.2f}s {r['rerun_s']:7.2f}s {r['peak_rss_mb']:7.0f} "
+                  f"{r['html_bytes'] / 1024:9.0f} {r['asset_bytes'] / 1024:9.0f} {r['markers']:8d} {r['vertices_drawn']:8d}/{r['vertices_total']:<8d}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"created": time.time(), "track_points": args.track_points, "cases": results}, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f)["cases"], args.tolerance)
+        for line in regressions:
+            print("REGRESSION", line)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+# bench/bench_startup.py
+"""Cold-start cost per section: import time and time to first render.
+
+    python -m bench.bench_startup [--repeat N] [--json OUT] [--baseline JSON] [--tolerance 0.25] [--offline]
+
+Every sample runs in a fresh interpreter, so module imports are cold:
+  * `python -X importtime -c "import <section module>"`: total import time and
+    the slowest packages it pulled in;
+  * an AppTest run of main.py with that section selected: wall time of the
+    first script run (imports, data loading, map build and render).
+With --baseline, exits 1 if any metric got slower by more than --tolerance.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Tuple
+
+from lib.paths import ROOT
+
+SECTIONS = {
+    "Info": "app.overview_section",
+    "Camping": "app.camping_section",
+    "POIs": "app.hikes_section",
+    "Restaurants": "app.restaurants_section",
+}
+HEAVY = ("geopandas", "shapely", "pyogrio", "geopy", "pyarrow", "pandas", "folium")
+
+_RENDER_SCRIPT = """
+import sys, time
+t0 = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+if {offline!r}:
+    import lib.geocode
+    from lib.geocoders import GeocodeUnavailable
+    def _offline(address):
+        raise GeocodeUnavailable("offline benchmark")  # transient: never cached
+    lib.geocode._lookup = _offline
+at = AppTest.from_file({main!r}, default_timeout=600)
+at.session_state["section"] = {section!r}
+t1 = time.perf_counter()
+at.run()
+t2 = time.perf_counter()
+if at.exception:
+    sys.exit("section raised: " + str(at.exception[0].value))
+print(t2 - t1, t2 - t0)
+"""
+
+
+def _python(*args: str) -> subprocess.CompletedProcess:
+    env = dict(os.environ, PYTHONPATH=str(ROOT))
+    return subprocess.run([sys.executable, *args], cwd=ROOT, env=env, capture_output=True, text=True)
+
+
+def import_profile(module: str, top: int = 5) -> Tuple[float, List[Tuple[str, float]], List[str]]:
+    """(total seconds, slowest top-level packages [(name, seconds)], heavy packages loaded)."""
+    proc = _python("-X", "importtime", "-c", f"import {module}")
+    if proc.returncode:
+        raise RuntimeError(proc.stderr)
+    cumulative: Dict[str, float] = {}
+    total = 0.0
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line or "cumulative" in line:
+            continue
+        _, cum_us, name = line.split("|")  # "import time: self | cumulative | <indent>name"
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        name = name.strip()
+        if depth == 0:  # top-level imports; their cumulative times add up to the total
+            total += int(cum_us) / 1e6
+        pkg = name.split(".")[0]
+        cumulative[pkg] = max(cumulative.get(pkg, 0.0), int(cum_us) / 1e6)
+    own = module.split(".")[0]
+    slowest = sorted(((n, s) for n, s in cumulative.items() if n != own), key=lambda kv: -kv[1])[:top]
+    heavy = [h for h in HEAVY if h in cumulative]
+    return total, slowest, heavy
+
+
+def first_render(section: str, offline: bool) -> Tuple[float, float]:
+    """(seconds for the first script run, seconds including the AppTest import)."""
+    script = _RENDER_SCRIPT.format(offline=offline, main=str(ROOT / "main.py"), section=section)
+    proc = _python("-c", script)
+    if proc.returncode:
+        raise RuntimeError(proc.stderr[-2000:])
+    run, total = proc.stdout.split()[-2:]
+    return float(run), float(total)
+
+
+def measure(repeat: int, offline: bool) -> Dict[str, Dict[str, object]]:
+    results: Dict[str, Dict[str, object]] = {}
+    for section, module in SECTIONS.items():
+        imports = [import_profile(module) for _ in range(repeat)]
+        renders = [first_render(section, offline) for _ in range(repeat)]
+        results[section] = {
+            "module": module,
+            "import_s": statistics.median(i[0] for i in imports),
+            "first_render_s": statistics.median(r[0] for r in renders),
+            "slowest_imports": imports[-1][1],
+            "heavy_modules": imports[-1][2],
+        }
+    return results
+
+
+def compare(results: Dict[str, Dict[str, object]], baseline: Dict[str, Dict[str, object]], tolerance: float) -> List[str]:
+    """Human-readable regressions of `results` against `baseline`."""
+    out = []
+    for section, now in results.items():
+        before = baseline.get(section)
+        if not before:
+            continue
+        for metric in ("import_s", "first_render_s"):
+            old, new = float(before[metric]), float(now[metric])
+            if old > 0 and new > old * (1 + tolerance):
+                out.append(f"{section}: {metric} {old:.3f}s -> {new:.3f}s (+{(new / old - 1) * 100:.0f}%)")
+        added = sorted(set(now["heavy_modules"]) - set(before.get("heavy_modules", [])))
+        if added:
+            out.append(f"{section}: now imports {', '.join(added)}")
+    return out
+
+
+def main(argv: List[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--baseline", help="compare against a previous --json file")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown (0.25 = 25%%)")
+    parser.add_argument("--offline", action="store_true", help="never call Nominatim (cache/artifact only)")
+    args = parser.parse_args(argv)
+
+    started = time.time()
+    results = measure(args.repeat, args.offline)
+
+    print(f"{'section':12} {'import':>9} {'1st render':>11}  heavy modules / slowest imports")
+    for section, r in results.items():
+        slow = ", ".join(f"{n} {s * 1e3:.0f}ms" for n, s in r["slowest_imports"])
+        print(f"{section:12} {r['import_s']:8.3f}s {r['first_render_s']:10.3f}s  "
+              f"[{' '.join(r['heavy_modules']) or '-'}] {slow}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"created": started, "python": sys.version.split()[0], "sections": results}, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["sections"]
+        regressions = compare(results, baseline, args.tolerance)
+        for line in regressions:
+            print("REGRESSION", line)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+# bench/bench_tracks.py
+"""Per-hike track load time: gpd.read_file vs. the memory-mapped TrackStore.
+
+    python -m bench.bench_tracks [--repeat N]
+"""
+from __future__ import annotations
+
+import argparse
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, List
+
+import geopandas as gpd
+
+from lib.paths import ROOT
+from lib.tracks import TrackStore, extract_track_coords
+
+
+def _timeit(fn: Callable[[], object], repeat: int) -> float:
+    samples: List[float] = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples)
+
+
+def _fmt(seconds: float) -> str:
+    return f"{seconds * 1e3:9.3f} ms" if seconds >= 1e-3 else f"{seconds * 1e6:9.1f} µs"
+
+
+def main(argv: List[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    files = sorted((ROOT / "gpx").glob("*.gpx"))
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'file':45} {'points':>7} {'read_file':>12} {'cold store':>12} {'warm store':>12} {'speedup':>8}")
+        for f in files:
+            baseline = _timeit(
+                lambda f=f: extract_track_coords(gpd.read_file(f, layer="tracks").geometry), args.repeat
+            )
+
+            def cold_load(f: Path = f) -> None:
+                cold_store = TrackStore(Path(tmp) / "cold")
+                cold_store.clear()
+                cold_store.load(f)
+
+            cold = _timeit(cold_load, 3)
+            store = TrackStore(Path(tmp) / "warm")
+            n = len(store.load(f))
+            warm = _timeit(lambda store=store, f=f: store.load(f), args.repeat * 50)
+            print(f"{f.name[:45]:45} {n:7d} {_fmt(baseline):>12} {_fmt(cold):>12} {_fmt(warm):>12} {baseline / warm:7.0f}x")
+
+
+if __name__ == "__main__":
+    main()
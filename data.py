@@ -1,161 +1,13 @@
-locations_trip = {
-    1: ("Radolfzell am Bodensee", (47.7452, 8.9669)),
-    2: ("Blaubeuren", (48.41215, 9.78417)),
-    3: ("Tübingen", (48.521637, 9.057645)),
-}
-
-winner_id = 1
-
-camping = [
-    {
-        "trip_id": 1,
-        "name": "Camping Schachenhorn",
-        "lat": 47.817797,
-        "lon": 9.038906,
-    }
-]
-
-bakery = [
-    {
-        "trip_id": 1,
-        "name": "Backhaus Mahl",
-        "address": "Hauptstraße 21, 78351 Bodman-Ludwigshafen",
-        "description": "ganz guter Bäcker",
-        "gmap_url": "https://maps.app.goo.gl/42UTs2h79aiMRnt28",
-    },
-]
-
-supermarkt = [
-    {
-        "trip_id": 1,
-        "name": "EDEKA Schreiber",
-        "address": "Überlinger Straße 11, 78351 Bodman-Ludwigshafen",
-        "description": "Edeka eben",
-        "gmap_url": "https://maps.app.goo.gl/1W2jrhjYNNN1GHkF7",
-    },
-]
+"""Trip data.
 
-restaurants = [
-    {
-        "trip_id": 1,
-        "name": "Levante Restaurant",
-        "address": "Löwengasse 30, 78315 Radolfzell, Germany",
-        "description": "Arabische Küche",
-        "gmap_url": "https://maps.app.goo.gl/fU6LNySwc2DGJUJHA",
-    },
-    {
-        "trip_id": 1,
-        "name": "Camping Schachenhorn",
-        "address": "Unnamed Road, 78351, Radolfzeller Str. 23, 78351 Bodman-Ludwigshafen",
-        "description": "gut und nah",
-        "gmap_url": "https://maps.app.goo.gl/fWfKsJYtDz9RFyyYA",
-    },
-    {
-        "trip_id": 1,
-        "name": "MERAKI Modern Greek Taverna",
-        "address": "Höristraße 2, 78315 Radolfzell am Bodensee",
-        "description": "Griechische Küche",
-        "gmap_url": "https://maps.app.goo.gl/Y9YrNnowydxTvBCH9",
-    },
-    {
-        "trip_id": 1,
-        "name": "Safran - BioBistro",
-        "address": "Löwengasse 22, 78315 Radolfzell am Bodensee",
-        "description": "Vegane Küche",
-        "gmap_url": "https://maps.app.goo.gl/eimF6ooZwK7DrM3z5",
-    },
-    {
-        "trip_id": 2,
-        "name": "Gaststuben im Zunfthaus der Schiffleute",
-        "address": "Fischergasse 31, 89073 Ulm",
-        "description": "Klassische schwäbische Küche und lokale Biere in rustikalem Zunfthaus im Fachwerkstil mit Straßenterrasse",
-        "gmap_url": "https://maps.app.goo.gl/D6XwKj7fegYWrkB2A",
-    },
-]
+Trips, places and hikes live in trips/ as CSV, GeoJSON or Parquet files (see
+lib.trip_loader) and are read lazily per trip. The module-level names below
+keep working: `locations_trip`, `HIKES`, `POIs`, ... are built from those
+files on access, so they always reflect the current files.
+"""
+from typing import Any
 
-
-POIs = [
-    {
-        "trip_id": 1,
-        "name": "Pfahlbauten",
-        "address": "Strandpromenade 6, 88690 Uhldingen-Mühlhofen",
-        "description": "Die Pfahlbauten verkörpern eine ungewohnte Welt mit ihren Holz- und Schilfkonstruktionen – natürlich, vertraut, faszinierend.",
-        "gmap_url": "https://maps.app.goo.gl/hu1dv5QsqTDTb5756",
-    },
-    {
-        "trip_id": 1,
-        "name": "Insel Reichenau",
-        "address": "Seestraße 2, 78479 Reichenau",
-        "description": "malerisches, kulturhistorisch sehr bedeutendes Eiland im westlichen Bodensee.",
-        "gmap_url": "https://maps.app.goo.gl/ftLmC3DZGVP2hNUE6",
-    },
-    {
-        "trip_id": 1,
-        "name": "Insel Mainau",
-        "address": "Insel Mainau, 78465 Konstanz",
-        "description": " Echt schön mit vielen Blumen und die haben eine Baumsammlung!",
-        "gmap_url": "https://maps.app.goo.gl/ftLmC3DZGVP2hNUE6",
-    },
-    {
-        "trip_id": 1,
-        "name": "Burgruine Hohentwiel (Singen)",
-        "address": "Hohentwiel, 78224 Singen",
-        "description": "Ruine der größten Burganlage Deutschlands hoch über Singen, mit herrlichem Blick auf Hegau und Bodensee.",
-        "gmap_url": "https://www.google.com/maps/place/Festungsruine+Hohentwiel/@47.7642744,8.8153976,17z/data=!3m1!4b1!4m6!3m5!1s0x479a7d095a75609b:0xb69ff7b6572dd424!8m2!3d47.7642708!4d8.8179779!16s%2Fg%2F11clkr7lgt?entry=ttu&g_ep=EgoyMDI1MDcyMi4wIKXMDSoASAFQAw%3D%3D"
-    },
-    {
-        "trip_id": 2,
-        "name": "Blautopf",
-        "address": "89143 Blaubeuren",
-        "description": "Karstquelle mit tiefblauem Wasser, ca. 21 m tief – Quelle der Blau, streng geschützt, spektakulär im Farbenspiel.",
-        "gmap_url": "https://www.google.com/maps/place/Blautopf/@48.4175138,9.7601061,13.68z/data=!4m6!3m5!1s0x47997bd6f92dc16b:0x76eaab2c9bd3eb22!8m2!3d48.4161816!4d9.7842089!16s%2Fm%2F0266y52?entry=ttu&g_ep=EgoyMDI1MDcyMi4wIKXMDSoASAFQAw%3D%3D"
-    },
-    {
-        "trip_id": 2,
-        "name": "Brillenhöhle",
-        "address": "Weilerhalde 69, 89143 Blaubeuren",
-        "description": "Archäologische Höhle mit Fundschichten des Magdalenien – wichtige Beiträge zur Frühgeschichte Europas.",
-        "gmap_url": "https://maps.app.goo.gl/aEXgtbFdZ9nrtojf7"
-    },
-    {
-        "trip_id": 2,
-        "name": "Rusenschloss Ruine",
-        "address": "Riedweg, 89143 Blaubeuren",
-        "description": "Waldruine hoch über dem Blautal – kurzer Wanderweg mit Aussicht auf Tal, Schloss und Landschaft.",
-        "gmap_url": "https://maps.app.goo.gl/X2918RBqrn88PuqB8"
-    },
-]
-
-HIKES = [
-    {
-        "trip_id": 1,
-        "name": "Rehmhof-Weg",
-        "file": "gpx/rehmhof-weg.gpx",
-        "duration": "4h",
-        "link": "https://www.bodman-ludwigshafen.de/de/Urlaub-am-See/Natur-und-aktiv/Wandern#/article/5d6a106a-fb31-462d-b126-b44ffc65021e"
-    },
-    {
-        "trip_id": 1,
-        "name": "Rundweg Markelfingen - Wildpark - Mindelseee",
-        "file": "gpx/t111836355_rundweg markelfingen-wild.gpx",
-        "duration": "2h 40min",
-        "link": "https://www.outdooractive.com/de/route/wanderung/bodensee-bw-/rundweg-markelfingen-wildpark-mindelsee/111836355/?utm_source=unknown&utm_medium=social&utm_campaign=user-shared-social-content#dmdtab=oax-tab1"
-    },
-    {
-        "trip_id": 2,
-        "name": "Von Herrlingen zum romantischen Lauterursprung und zurück",
-        "file": "gpx/t112700554_von herrlingen zum.gpx",
-        "duration": "3h 45min",
-        "link": "https://www.outdooractive.com/en/route/hiking-trail/swabian-alb/von-herrlingen-zum-romantischen-lauterursprung-und-zurueck/112700554/"
-    },
-    {
-        "trip_id": 2,
-        "name": "Felsen, Höhlen und Ruinen rund um Blaubeuren",
-        "file": "gpx/t110499303_felsen- hoehlen und ruinen.gpx",
-        "duration": "5h 5min",
-        "link": "https://www.outdooractive.com/en/route/hiking-trail/swabian-alb/felsen-hoehlen-und-ruinen-rund-um-blaubeuren/110499303/"
-    },
-]
+winner_id = 1
 
 locations_home = {
     "Base MM": (49.2951, 8.6989), 
@@ -165,11 +17,13 @@ locations_home = {
     "Base ST": (49.0069, 8.4037)
 }
 
-airbnb = [
-    {
-        "trip_id": 1,
-        "airbnb_link": "https://www.airbnb.de/rooms/1160886114369166070?adults=7&check_in=2025-09-05&check_out=2025-09-07&location=Radolfzell%20am%20Bodensee&search_mode=regular_search&source_impression_id=p3_1753470378_P3Tr5_1I41G2u3wQ&previous_page_section_name=1001&federated_search_id=ab246df5-fb1f-437c-92ff-db833fc299c1&guests=7",
-        "price_per_night": 241,
-        "number_persons": 7,
-    }
-]
+
+def __getattr__(name: str) -> Any:
+    from lib.trip_store import TABLES, frame_records, trip_store
+
+    if name == "locations_trip":
+        return trip_store().locations()
+    for kind, attr in TABLES.items():
+        if attr == name:
+            return frame_records(trip_store().frame(kind))
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,229 @@
+# lib/destination_score.py
+"""Rank candidate trips by how far they are from all home bases.
+
+The home x candidate distance matrix is computed in one broadcast haversine
+pass, so thousands of candidates rank in milliseconds. Candidates are scored
+by total, maximum and spread (standard deviation, i.e. fairness) of the
+per-home distances.
+
+With a road graph in the data dir (road_graph.csv / .parquet: one edge per
+row with from_lat, from_lon, to_lat, to_lon, minutes and optionally oneway),
+the matrix can hold travel times instead: one Dijkstra run per home base,
+plus the beeline to and from the nearest graph node at ACCESS_KMH.
+"""
+from __future__ import annotations
+
+import hashlib
+import heapq
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Mapping, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from lib.geo import haversine_m
+from lib.spatial_index import PlaceIndex
+from lib.trip_loader import DATA_DIR
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+Coords = Tuple[float, float]
+
+GRAPH_NAMES = ("road_graph.parquet", "road_graph.csv")
+ACCESS_KMH = 30.0  # speed on the beeline between a place and its nearest graph node
+_MATRIX_CACHE = 8
+
+# what a ranking can be ordered by (std: the fairness of the distances)
+METRICS = ("total", "max", "std")
+
+
+def distance_matrix_km(homes: np.ndarray, candidates: np.ndarray) -> np.ndarray:
+    """(H, 2) x (C, 2) [lat, lon] arrays -> (H, C) great-circle distances in km."""
+    homes = np.asarray(homes, dtype=np.float64).reshape(-1, 2)
+    candidates = np.asarray(candidates, dtype=np.float64).reshape(-1, 2)
+    return haversine_m(homes[:, None, :], candidates[None, :, :]) / 1000
+
+
+# --- Road graph ---------------------------------------------------------------
+_ONEWAY_FORWARD = {"yes", "true", "1"}
+
+
+def _oneway(values: "pd.Series") -> np.ndarray:
+    """Per edge 1 (from -> to only), -1 (to -> from only) or 0 (both ways), OSM style; anything unknown is 0."""
+    tags = values.astype(str).str.strip().str.lower().str.replace(r"\.0$", "", regex=True)  # 1.0 from float columns
+    return np.where(tags.isin(_ONEWAY_FORWARD), 1, np.where(tags == "-1", -1, 0)).astype(np.int8)
+
+
+@dataclass
+class RoadGraph:
+    """Directed road graph in CSR form; edge weights are travel minutes."""
+
+    lat: np.ndarray
+    lon: np.ndarray
+    indptr: np.ndarray
+    indices: np.ndarray
+    minutes: np.ndarray
+    _from_node: Dict[int, np.ndarray] = field(default_factory=dict, repr=False)
+    _matrices: "OrderedDict[str, np.ndarray]" = field(default_factory=OrderedDict, repr=False)
+    _snap: Optional[PlaceIndex] = field(default=None, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    @classmethod
+    def from_edges(cls, edges: "pd.DataFrame") -> "RoadGraph":
+        a = edges[["from_lat", "from_lon"]].to_numpy(np.float64).round(6)
+        b = edges[["to_lat", "to_lon"]].to_numpy(np.float64).round(6)
+        w = edges["minutes"].to_numpy(np.float64)
+        nodes, inverse = np.unique(np.vstack([a, b]), axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        src, dst = inverse[: len(a)], inverse[len(a):]
+        direction = _oneway(edges["oneway"]) if "oneway" in edges else np.zeros(len(a), np.int8)
+        both = direction == 0
+        src, dst = np.where(direction < 0, dst, src), np.where(direction < 0, src, dst)  # "-1": drawn against traffic
+        src, dst, w = (np.concatenate([src, dst[both]]), np.concatenate([dst, src[both]]),
+                       np.concatenate([w, w[both]]))
+        order = np.argsort(src, kind="stable")
+        indptr = np.zeros(len(nodes) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=len(nodes)), out=indptr[1:])
+        return cls(nodes[:, 0].copy(), nodes[:, 1].copy(), indptr, dst[order], w[order])
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "RoadGraph":
+        import pandas as pd
+
+        path = Path(path)
+        edges = pd.read_parquet(path) if path.suffix == ".parquet" else pd.read_csv(path)
+        return cls.from_edges(edges)
+
+    def __len__(self) -> int:
+        return len(self.lat)
+
+    def snap(self, points: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(nearest node per [lat, lon] row, beeline km to it)."""
+        with self._lock:
+            if self._snap is None:
+                self._snap = PlaceIndex(self.lat, self.lon)
+        nodes = np.empty(len(points), dtype=np.int64)
+        km = np.empty(len(points))
+        for i, (lat, lon) in enumerate(points):
+            ids, dist = self._snap.nearest(float(lat), float(lon), 1)
+            nodes[i], km[i] = ids[0], dist[0]
+        return nodes, km
+
+    def minutes_from(self, source: int) -> np.ndarray:
+        """Shortest travel minutes from node `source` to every node (inf if unreachable)."""
+        with self._lock:
+            cached = self._from_node.get(source)
+        if cached is not None:
+            return cached
+        indptr, indices, weights = self.indptr.tolist(), self.indices.tolist(), self.minutes.tolist()
+        dist = [float("inf")] * len(self)
+        dist[source] = 0.0
+        heap = [(0.0, source)]
+        while heap:
+            d, u = heapq.heappop(heap)
+            if d > dist[u]:
+                continue
+            for k in range(indptr[u], indptr[u + 1]):
+                v, nd = indices[k], d + weights[k]
+                if nd < dist[v]:
+                    dist[v] = nd
+                    heapq.heappush(heap, (nd, v))
+        out = np.array(dist)
+        with self._lock:
+            self._from_node[source] = out
+        return out
+
+    def travel_matrix(self, homes: np.ndarray, candidates: np.ndarray, access_kmh: float = ACCESS_KMH) -> np.ndarray:
+        """(H, C) travel minutes, including the beeline legs to and from the network.
+
+        The last few matrices are kept, so re-ranking the same candidates is free.
+        """
+        homes = np.ascontiguousarray(homes, dtype=np.float64).reshape(-1, 2)
+        candidates = np.ascontiguousarray(candidates, dtype=np.float64).reshape(-1, 2)
+        key = hashlib.sha1(homes.tobytes() + b"|" + candidates.tobytes() + str(access_kmh).encode()).hexdigest()
+        with self._lock:
+            if key in self._matrices:
+                self._matrices.move_to_end(key)
+                return self._matrices[key]
+        home_nodes, home_km = self.snap(homes)
+        cand_nodes, cand_km = self.snap(candidates)
+        via_roads = np.vstack([self.minutes_from(int(n))[cand_nodes] for n in home_nodes])
+        matrix = via_roads + (home_km[:, None] + cand_km[None, :]) * 60 / access_kmh
+        with self._lock:
+            self._matrices[key] = matrix
+            while len(self._matrices) > _MATRIX_CACHE:
+                self._matrices.popitem(last=False)
+        return matrix
+
+
+_graphs: Dict[Path, Tuple[Tuple[int, int], RoadGraph]] = {}
+_graphs_lock = threading.Lock()
+
+
+def road_graph(data_dir: Union[str, Path] = DATA_DIR) -> Optional[RoadGraph]:
+    """The data dir's road graph (reloaded when the file changes), or None if there is none."""
+    for name in GRAPH_NAMES:
+        path = Path(data_dir) / name
+        if path.exists():
+            break
+    else:
+        return None
+    stat = path.stat()
+    sig = (stat.st_mtime_ns, stat.st_size)
+    with _graphs_lock:
+        hit = _graphs.get(path)
+        if hit and hit[0] == sig:
+            return hit[1]
+    graph = RoadGraph.load(path)
+    with _graphs_lock:
+        _graphs[path] = (sig, graph)
+    return graph
+
+
+# --- Ranking ------------------------------------------------------------------
+def score_matrix(matrix: np.ndarray) -> Dict[str, np.ndarray]:
+    """Per-candidate total, max, mean and std over the home axis of an (H, C) matrix."""
+    return {
+        "total": matrix.sum(axis=0),
+        "max": matrix.max(axis=0),
+        "mean": matrix.mean(axis=0),
+        "std": matrix.std(axis=0),
+    }
+
+
+def rank_order(scores: Mapping[str, np.ndarray], by: str = "total") -> np.ndarray:
+    """Candidate indices, best first: by the chosen metric, ties by total."""
+    if by not in METRICS:
+        raise ValueError(f"unknown metric {by!r}, expected one of {METRICS}")
+    return np.lexsort((scores["total"], scores[by]))
+
+
+def rank_destinations(
+    homes: Mapping[str, Coords],
+    candidates: Mapping[int, Tuple[str, Coords]],
+    *,
+    by: str = "total",
+    graph: Optional[RoadGraph] = None,
+) -> "pd.DataFrame":
+    """One row per candidate, best first: trip_id, name, rank, total/max/mean/std and one
+    column per home. Values are km, or minutes when a road graph is given."""
+    import pandas as pd
+
+    home_names: Sequence[str] = list(homes)
+    trip_ids = list(candidates)
+    home_xy = np.array([homes[h] for h in home_names], dtype=np.float64).reshape(-1, 2)
+    cand_xy = np.array([candidates[t][1] for t in trip_ids], dtype=np.float64).reshape(-1, 2)
+    matrix = graph.travel_matrix(home_xy, cand_xy) if graph is not None else distance_matrix_km(home_xy, cand_xy)
+
+    scores = score_matrix(matrix)
+    order = rank_order(scores, by)
+    return pd.DataFrame({
+        "trip_id": np.asarray(trip_ids)[order],
+        "name": [candidates[trip_ids[i]][0] for i in order],
+        "rank": np.arange(1, len(order) + 1),
+        **{k: v[order] for k, v in scores.items()},
+        **{h: matrix[j, order] for j, h in enumerate(home_names)},
+    })
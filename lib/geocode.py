@@ -1,18 +1,207 @@
 # lib/geocode.py
 from __future__ import annotations
 
-from typing import Optional, Tuple
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
 
-import streamlit as st
-from geopy.extra.rate_limiter import RateLimiter
-from geopy.geocoders import Nominatim
+from lib.geocode_cache import MISS, default_cache, normalize_address
+from lib.geocoders import Backend, GeocodeUnavailable, from_config
+from lib.timing import count, span
 
+Coords = Tuple[float, float]
+ProgressFn = Callable[[int, int], None]
 
-def _new_geocoder() -> Nominatim:
-    return Nominatim(user_agent="ausflug/1.0 (streamlit)", timeout=5)
 
-@st.cache_data(show_spinner=False, ttl=60 * 60 * 24)
-def geocode_one(address: str) -> Optional[Tuple[float, float]]:
-    safe = RateLimiter(_new_geocoder().geocode, min_delay_seconds=1, swallow_exceptions=True)
-    loc = safe(address)
-    return (float(loc.latitude), float(loc.longitude)) if loc else None
+_backend: Optional[Backend] = None
+_backend_lock = threading.Lock()
+_inflight: Dict[str, Future] = {}
+_inflight_lock = threading.Lock()
+
+
+def backend() -> Backend:
+    """The configured backend (see lib.geocoders), built on first use."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = from_config()
+        return _backend
+
+
+def set_backend(b: Optional[Backend]) -> None:
+    """Replace the backend; None goes back to the configured one."""
+    global _backend
+    with _backend_lock:
+        _backend = b
+
+
+def _lookup(address: str) -> Optional[Coords]:
+    """Ask the backend; raises GeocodeUnavailable on transient problems (not cached)."""
+    return backend().lookup(address)
+
+
+def _resolve(address: str) -> Optional[Coords]:
+    """Cache miss path; concurrent callers for the same address share one request."""
+    key = normalize_address(address)
+    with _inflight_lock:
+        fut = _inflight.get(key)
+        owner = fut is None
+        if owner:
+            fut = _inflight[key] = Future()
+    if not owner:
+        return fut.result()
+
+    cache = default_cache()
+    try:
+        coords = cache.get(address)  # another process may have filled it meanwhile
+        if coords is MISS:
+            try:
+                coords = _lookup(address)
+            except GeocodeUnavailable:
+                coords = None  # transient; try again next time instead of storing a negative entry
+            else:
+                cache.put(address, coords)
+        fut.set_result(coords)
+    except BaseException as e:
+        fut.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+    return coords
+
+
+def geocode_one(address: str) -> Optional[Coords]:
+    if not address:
+        return None
+    cached = default_cache().get(address)
+    return _resolve(address) if cached is MISS else cached
+
+
+def geocode_many(
+    addresses: Iterable[str],
+    *,
+    on_progress: Optional[ProgressFn] = None,
+    max_workers: int = 1,
+) -> Dict[str, Optional[Coords]]:
+    """Geocode a batch: duplicates collapse, cache hits return at once, misses go
+    through the shared rate limiter. Returns {address: coords or None}.
+
+    on_progress(done, total) is called from the calling thread, so it may touch
+    Streamlit elements. max_workers > 1 overlaps request latency between misses;
+    the rate limit still applies.
+    """
+    with span("geocode") as s:
+        results = _geocode_many(addresses, on_progress, max_workers)
+        s.set(addresses=len(results))
+        return results
+
+
+def _geocode_many(
+    addresses: Iterable[str], on_progress: Optional[ProgressFn], max_workers: int
+) -> Dict[str, Optional[Coords]]:
+    groups: Dict[str, List[str]] = {}
+    results: Dict[str, Optional[Coords]] = {}
+    for a in addresses:
+        if a:
+            groups.setdefault(normalize_address(a), []).append(a)
+        else:
+            results[a] = None
+
+    cache = default_cache()
+    pending: List[List[str]] = []
+    for same in groups.values():
+        cached = cache.get(same[0])
+        if cached is MISS:
+            pending.append(same)
+        else:
+            results.update(dict.fromkeys(same, cached))
+
+    total = len(groups)
+    done = total - len(pending)
+    count("geocode.hit", done)
+    count("geocode.miss", len(pending))
+    if on_progress:
+        on_progress(done, total)
+    if max_workers > 1 and len(pending) > 1:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = {pool.submit(_resolve, same[0]): same for same in pending}
+            for fut in as_completed(futures):
+                results.update(dict.fromkeys(futures[fut], fut.result()))
+                done += 1
+                if on_progress:
+                    on_progress(done, total)
+        return results
+
+    for same in pending:
+        results.update(dict.fromkeys(same, _resolve(same[0])))
+        done += 1
+        if on_progress:
+            on_progress(done, total)
+    return results
+
+
+# --- Background resolution ------------------------------------------------------
+BACKGROUND_WORKERS = 2
+LIVE_POLL_S = 1.0     # how often a page with pending lookups checks for new results
+RETRY_AFTER_S = 60.0  # an address that failed transiently is not queued again before this
+
+_background: Optional[ThreadPoolExecutor] = None
+_queued: Dict[str, Future] = {}
+_retry_at: Dict[str, float] = {}
+_queue_lock = threading.Lock()
+
+
+def _resolve_queued(key: str, address: str) -> Optional[Coords]:
+    try:
+        coords = _resolve(address)
+        if coords is None and default_cache().get(address) is MISS:  # transient: not stored
+            with _queue_lock:
+                _retry_at[key] = time.monotonic() + RETRY_AFTER_S
+        return coords
+    finally:
+        with _queue_lock:
+            _queued.pop(key, None)
+
+
+def geocode_progressive(addresses: Iterable[str]) -> Tuple[Dict[str, Optional[Coords]], Set[str]]:
+    """Cached results now, the rest later: ({address: coords or None} for what is known,
+    addresses still being resolved on a background thread).
+
+    Never blocks on a lookup. Call again (e.g. from a polling st.fragment) to
+    pick up what has been resolved meanwhile; an address is only queued once
+    at a time, and not again for RETRY_AFTER_S after a transient failure.
+    """
+    global _background
+    results: Dict[str, Optional[Coords]] = {}
+    pending: Set[str] = set()
+    cache = default_cache()
+    now = time.monotonic()
+    for a in set(addresses):
+        cached = cache.get(a) if a else None
+        if cached is not MISS:
+            results[a] = cached
+            continue
+        key = normalize_address(a)
+        with _queue_lock:
+            if key not in _queued:
+                if _retry_at.get(key, 0.0) > now:
+                    continue  # failed a moment ago; reported as unknown until the next retry
+                if _background is None:
+                    _background = ThreadPoolExecutor(BACKGROUND_WORKERS, thread_name_prefix="geocode")
+                _queued[key] = _background.submit(_resolve_queued, key, a)
+        pending.add(a)
+    count("geocode.hit", len(results))
+    count("geocode.miss", len(pending))
+    return results, pending
+
+
+def warm_cache(addresses: Iterable[str]) -> int:
+    """Resolve all uncached addresses up front; returns how many are now known."""
+    return sum(c is not None for c in geocode_many(addresses).values())
+
+
+def invalidate(address: Optional[str] = None) -> int:
+    """Forget one cached address, or the whole cache when called without arguments."""
+    return default_cache().invalidate(address)
@@ -0,0 +1,179 @@
+# lib/geocode_cache.py
+from __future__ import annotations
+
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Optional, Tuple, Union
+
+from lib.paths import CACHE_DIR
+
+Coords = Tuple[float, float]
+
+DEFAULT_PATH = CACHE_DIR / "geocode.sqlite"
+POSITIVE_TTL = 60 * 60 * 24 * 180   # addresses rarely move
+NEGATIVE_TTL = 60 * 60 * 24         # retry failed lookups once a day
+
+# Returned by GeocodeCache.get() when nothing (valid) is stored for an address.
+# A stored negative entry is returned as None instead.
+MISS = object()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS geocode (
+    key     TEXT PRIMARY KEY,
+    address TEXT NOT NULL,
+    lat     REAL,
+    lon     REAL,
+    created REAL NOT NULL
+)
+"""
+
+
+def normalize_address(address: str) -> str:
+    """Cache key for an address: NFKC, casefolded, single spaces, tidy commas."""
+    s = unicodedata.normalize("NFKC", address or "").casefold()
+    s = re.sub(r"\s*,\s*", ", ", s)
+    s = re.sub(r"\s+", " ", s)
+    return s.strip(" ,")
+
+
+class GeocodeCache:
+    """Durable address -> (lat, lon) cache in SQLite.
+
+    WAL mode lets several processes read while one writes. Failed lookups are
+    stored as negative entries (lat/lon NULL) with their own, shorter TTL.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path] = DEFAULT_PATH,
+        *,
+        ttl: Optional[float] = POSITIVE_TTL,
+        negative_ttl: Optional[float] = NEGATIVE_TTL,
+    ) -> None:
+        self.path = Path(path)
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._conn() as con:
+            con.execute(_SCHEMA)
+
+    # sqlite3 connections must not be shared between threads; Streamlit runs
+    # every session in its own thread, so keep one connection per thread.
+    def _conn(self) -> sqlite3.Connection:
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = sqlite3.connect(self.path, timeout=30)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            self._local.con = con
+        return con
+
+    def _expired(self, created: float, negative: bool, now: float) -> bool:
+        ttl = self.negative_ttl if negative else self.ttl
+        return ttl is not None and now - created > ttl
+
+    def _count(self, attr: str) -> None:
+        with self._lock:
+            setattr(self, attr, getattr(self, attr) + 1)
+
+    def get(self, address: str) -> Union[Coords, None, object]:
+        """Cached coords, None for a negative entry, or MISS."""
+        row = self._conn().execute(
+            "SELECT lat, lon, created FROM geocode WHERE key = ?", (normalize_address(address),)
+        ).fetchone()
+        if row is None:
+            self._count("misses")
+            return MISS
+        lat, lon, created = row
+        negative = lat is None or lon is None
+        if self._expired(created, negative, time.time()):
+            self._count("misses")
+            return MISS
+        if negative:
+            self._count("negative_hits")
+            return None
+        self._count("hits")
+        return (float(lat), float(lon))
+
+    def put(self, address: str, coords: Optional[Coords]) -> None:
+        """Store a result; None records a failed lookup."""
+        lat, lon = coords if coords else (None, None)
+        with self._conn() as con:
+            con.execute(
+                "INSERT OR REPLACE INTO geocode (key, address, lat, lon, created) VALUES (?, ?, ?, ?, ?)",
+                (normalize_address(address), address, lat, lon, time.time()),
+            )
+
+    def invalidate(self, address: Optional[str] = None, *, negative_only: bool = False) -> int:
+        """Drop one address (or everything); returns the number of removed rows."""
+        where, args = [], []
+        if address is not None:
+            where.append("key = ?")
+            args.append(normalize_address(address))
+        if negative_only:
+            where.append("lat IS NULL")
+        sql = "DELETE FROM geocode" + (" WHERE " + " AND ".join(where) if where else "")
+        with self._conn() as con:
+            return con.execute(sql, args).rowcount
+
+    def purge_expired(self) -> int:
+        now = time.time()
+        removed = 0
+        with self._conn() as con:
+            if self.ttl is not None:
+                removed += con.execute(
+                    "DELETE FROM geocode WHERE lat IS NOT NULL AND created < ?", (now - self.ttl,)
+                ).rowcount
+            if self.negative_ttl is not None:
+                removed += con.execute(
+                    "DELETE FROM geocode WHERE lat IS NULL AND created < ?", (now - self.negative_ttl,)
+                ).rowcount
+        return removed
+
+    def warm(
+        self, addresses: Iterable[str], resolve: Callable[[str], Optional[Coords]]
+    ) -> Dict[str, Optional[Coords]]:
+        """Resolve every address not yet cached with `resolve` and store the result."""
+        out: Dict[str, Optional[Coords]] = {}
+        for address in addresses:
+            if not address:
+                continue
+            cached = self.get(address)
+            if cached is MISS:
+                cached = resolve(address)
+                self.put(address, cached)
+            out[address] = cached
+        return out
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.negative_hits + self.misses
+        (entries,) = self._conn().execute("SELECT COUNT(*) FROM geocode").fetchone()
+        return {
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.negative_hits) / lookups if lookups else 0.0,
+            "entries": entries,
+        }
+
+
+_default: Optional[GeocodeCache] = None
+_default_lock = threading.Lock()
+
+
+def default_cache() -> GeocodeCache:
+    """Process-wide cache instance at DEFAULT_PATH."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = GeocodeCache()
+        return _default
@@ -0,0 +1,336 @@
+# lib/geocoders.py
+"""Geocoder backends: public Nominatim, an offline gazetteer, and chains of both.
+
+lib.geocode caches whatever the configured backend answers. The backend is
+picked by AUSFLUG_GEOCODER, a comma-separated list tried in order:
+
+    AUSFLUG_GEOCODER=gazetteer,nominatim   # default when a gazetteer file exists
+    AUSFLUG_GEOCODER=gazetteer             # air-gapped: never leaves the process
+    AUSFLUG_GEOCODER=nominatim             # default otherwise
+
+The gazetteer is a local address/POI extract (AUSFLUG_GAZETTEER, default
+trips/gazetteer.csv or .parquet) with lat/lon and either an `address` column
+or OSM-style parts (name, addr:street, addr:housenumber, addr:postcode,
+addr:city; the `addr:` prefix is optional). It is matched exactly after
+normalization (case, umlauts, "str." -> "strasse", country names), then
+fuzzily by character trigrams.
+"""
+from __future__ import annotations
+
+import abc
+import math
+import os
+import re
+import threading
+import time
+import unicodedata
+from pathlib import Path
+from typing import (
+    TYPE_CHECKING,
+    Dict,
+    FrozenSet,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+import numpy as np
+from geopy.exc import GeopyError
+from geopy.geocoders import Nominatim
+
+from lib.trip_loader import DATA_DIR
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+Coords = Tuple[float, float]
+
+GAZETTEER_NAMES = ("gazetteer.parquet", "gazetteer.csv")
+MIN_SCORE = 0.72       # trigram Dice coefficient a fuzzy match needs
+FUZZY_PROBES = 12      # rarest query trigrams whose postings make up the candidates
+FUZZY_CANDIDATES = 64  # candidates sharing the most probes that get scored
+
+
+class GeocodeUnavailable(Exception):
+    """A backend could not answer right now (network, service); the result must not be cached."""
+
+
+class Backend(abc.ABC):
+    """Resolves one address to (lat, lon), or None if it does not know it."""
+
+    name = "backend"
+
+    @abc.abstractmethod
+    def lookup(self, address: str) -> Optional[Coords]:
+        ...
+
+
+# --- Nominatim ----------------------------------------------------------------
+class TokenBucket:
+    """Thread-safe token bucket; acquire() blocks until a token is available."""
+
+    def __init__(self, rate: float, capacity: float = 1.0) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._stamp) * self.rate)
+                self._stamp = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+# One bucket per process: Nominatim's usage policy allows 1 request/second in
+# total, no matter how many Streamlit sessions are geocoding at the same time.
+_BUCKET = TokenBucket(rate=1.0)
+
+
+class NominatimBackend(Backend):
+    """Public Nominatim, rate limited to 1 request/second per process."""
+
+    name = "nominatim"
+
+    def __init__(self, user_agent: str = "ausflug/1.0 (streamlit)", timeout: float = 5, bucket: TokenBucket = _BUCKET):
+        self.user_agent = user_agent
+        self.timeout = timeout
+        self.bucket = bucket
+        self._geocoder: Optional[Nominatim] = None
+
+    def lookup(self, address: str) -> Optional[Coords]:
+        if self._geocoder is None:
+            self._geocoder = Nominatim(user_agent=self.user_agent, timeout=self.timeout)
+        self.bucket.acquire()
+        try:
+            loc = self._geocoder.geocode(address)
+        except GeopyError as e:
+            raise GeocodeUnavailable(str(e)) from e
+        return (float(loc.latitude), float(loc.longitude)) if loc else None
+
+
+# --- Offline gazetteer --------------------------------------------------------
+_UMLAUTS = str.maketrans({"ä": "ae", "ö": "oe", "ü": "ue"})
+_ABBREVIATIONS = [
+    (re.compile(r"\b(\w*?)str(\.|\b)"), r"\1strasse"),  # "str.", "hauptstr." but not "strand"
+    (re.compile(r"\bpl\."), "platz"),
+    (re.compile(r"\bst\.\s"), "sankt "),
+]
+_DROP = re.compile(r"\b(germany|deutschland|austria|oesterreich|schweiz|switzerland)\b")
+
+
+def match_key(address: str) -> str:
+    """Normalization for matching: casefolded, umlauts spelled out, abbreviations expanded,
+    country names and punctuation removed."""
+    s = unicodedata.normalize("NFKC", address or "").casefold().translate(_UMLAUTS)
+    s = "".join(c for c in unicodedata.normalize("NFKD", s) if not unicodedata.combining(c))
+    for pattern, repl in _ABBREVIATIONS:
+        s = pattern.sub(repl, s)
+    s = re.sub(r"[^\w]+", " ", s)
+    s = _DROP.sub(" ", s)
+    return " ".join(s.split())
+
+
+def trigrams(key: str) -> FrozenSet[str]:
+    padded = f"  {key} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def _column(frame: "pd.DataFrame", name: str) -> List[str]:
+    for col in (name, f"addr:{name}"):
+        if col in frame:
+            return ["" if v is None or (isinstance(v, float) and math.isnan(v)) else str(v) for v in frame[col]]
+    return [""] * len(frame)
+
+
+def gazetteer_entries(frame: "pd.DataFrame") -> Tuple[List[str], np.ndarray]:
+    """(address variants, [lat, lon] per variant) for the rows of an extract."""
+    address, name = _column(frame, "address"), _column(frame, "name")
+    street, number = _column(frame, "street"), _column(frame, "housenumber")
+    postcode, city = _column(frame, "postcode"), _column(frame, "city")
+    coords = frame[["lat", "lon"]].to_numpy(np.float64)
+    texts: List[str] = []
+    rows: List[int] = []
+    for i in range(len(frame)):
+        if coords[i, 0] != coords[i, 0] or coords[i, 1] != coords[i, 1]:
+            continue
+        place = f"{postcode[i]} {city[i]}".strip()
+        variants = {address[i]}
+        if street[i]:
+            variants.add(f"{street[i]} {number[i]}, {place}")
+        if name[i]:
+            variants.update({f"{name[i]}, {place}", name[i]})
+        for v in variants:
+            if v.strip(" ,"):
+                texts.append(v)
+                rows.append(i)
+    return texts, coords[rows] if rows else np.empty((0, 2))
+
+
+def _postings(items: Iterable[Iterable[str]]) -> Dict[str, np.ndarray]:
+    out: Dict[str, List[int]] = {}
+    for i, tokens in enumerate(items):
+        for t in set(tokens):
+            out.setdefault(t, []).append(i)
+    return {t: np.array(ids, dtype=np.int64) for t, ids in out.items()}
+
+
+class GazetteerBackend(Backend):
+    """In-memory address/POI index: exact on the match key, then fuzzy by trigram Dice score."""
+
+    name = "gazetteer"
+
+    def __init__(self, texts: Sequence[str], coords: np.ndarray, *, min_score: float = MIN_SCORE) -> None:
+        self.min_score = min_score
+        self.texts = list(texts)
+        self.coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        keys = [match_key(t) for t in self.texts]
+        self._exact: Dict[str, int] = {}
+        for i, k in enumerate(keys):
+            self._exact.setdefault(k, i)
+        self._grams = [trigrams(k) for k in keys]
+        # entry ids per word and per trigram, ascending
+        self._words = _postings(k.split() for k in keys)
+        self._postings = _postings(self._grams)
+
+    @classmethod
+    def from_frame(cls, frame: "pd.DataFrame", **kwargs) -> "GazetteerBackend":
+        texts, coords = gazetteer_entries(frame)
+        return cls(texts, coords, **kwargs)
+
+    @classmethod
+    def load(cls, path: Union[str, Path], **kwargs) -> "GazetteerBackend":
+        import pandas as pd
+
+        path = Path(path)
+        frame = pd.read_parquet(path) if path.suffix == ".parquet" else pd.read_csv(path, dtype=str, keep_default_na=False)
+        frame[["lat", "lon"]] = frame[["lat", "lon"]].apply(pd.to_numeric, errors="coerce")
+        return cls.from_frame(frame, **kwargs)
+
+    def __len__(self) -> int:
+        return len(self._grams)
+
+    def match(self, address: str) -> Optional[Tuple[int, float]]:
+        """(entry, score) of the best match for `address`, 1.0 for an exact one."""
+        key = match_key(address)
+        if not key:
+            return None
+        hit = self._exact.get(key)
+        if hit is not None:
+            return hit, 1.0
+        grams = trigrams(key)
+        best = self._best(grams, self._word_candidates(key))
+        if best[1] < self.min_score:
+            best = max(best, self._best(grams, self._gram_candidates(grams)), key=lambda b: b[1])
+        return best if best[1] >= self.min_score else None
+
+    def _word_candidates(self, key: str) -> np.ndarray:
+        """Entries sharing the query's words, rarest first; words that are unknown (typos)
+        or would leave nothing over are skipped."""
+        lists = sorted((self._words[w] for w in set(key.split()) if w in self._words), key=len)
+        if not lists:
+            return np.empty(0, dtype=np.int64)
+        ids = lists[0]
+        for other in lists[1:]:
+            if len(ids) <= FUZZY_CANDIDATES:
+                break
+            pos = np.minimum(np.searchsorted(other, ids), len(other) - 1)
+            keep = other[pos] == ids
+            if keep.any():
+                ids = ids[keep]
+        return ids[:FUZZY_CANDIDATES]
+
+    def _gram_candidates(self, grams: FrozenSet[str]) -> np.ndarray:
+        """Entries sharing the most of the query's rarest trigrams (slower, but survives
+        typos in every word)."""
+        probes = sorted((g for g in grams if g in self._postings), key=lambda g: len(self._postings[g]))
+        if not probes:
+            return np.empty(0, dtype=np.int64)
+        ids, shared = np.unique(
+            np.concatenate([self._postings[g] for g in probes[:FUZZY_PROBES]]), return_counts=True
+        )
+        if len(ids) > FUZZY_CANDIDATES:
+            ids = ids[np.argpartition(-shared, FUZZY_CANDIDATES)[:FUZZY_CANDIDATES]]
+        return ids
+
+    def _best(self, grams: FrozenSet[str], ids: np.ndarray) -> Tuple[int, float]:
+        """(entry, trigram Dice score) of the best candidate; (-1, 0.0) if there is none."""
+        best, best_score = -1, 0.0
+        for i in ids.tolist():
+            other = self._grams[i]
+            score = 2 * len(grams & other) / (len(grams) + len(other))
+            if score > best_score:
+                best, best_score = i, score
+        return best, best_score
+
+    def lookup(self, address: str) -> Optional[Coords]:
+        m = self.match(address)
+        if m is None:
+            return None
+        lat, lon = self.coords[m[0]]
+        return float(lat), float(lon)
+
+
+# --- Chains and configuration -------------------------------------------------
+class ChainBackend(Backend):
+    """Tries backends in order; the first one that knows the address wins.
+
+    If none knows it but one was unavailable, the whole lookup is unavailable
+    (so the miss is not cached as a negative entry).
+    """
+
+    name = "chain"
+
+    def __init__(self, backends: Iterable[Backend]) -> None:
+        self.backends = list(backends)
+
+    def lookup(self, address: str) -> Optional[Coords]:
+        unavailable: Optional[GeocodeUnavailable] = None
+        for b in self.backends:
+            try:
+                coords = b.lookup(address)
+            except GeocodeUnavailable as e:
+                unavailable = e
+                continue
+            if coords is not None:
+                return coords
+        if unavailable is not None:
+            raise unavailable
+        return None
+
+
+def gazetteer_path() -> Optional[Path]:
+    env = os.environ.get("AUSFLUG_GAZETTEER")
+    if env:
+        return Path(env)
+    for name in GAZETTEER_NAMES:
+        if (DATA_DIR / name).exists():
+            return DATA_DIR / name
+    return None
+
+
+def from_config(spec: Optional[str] = None) -> Backend:
+    """Backend (or chain) for a spec like "gazetteer,nominatim" (default: AUSFLUG_GEOCODER)."""
+    spec = spec or os.environ.get("AUSFLUG_GEOCODER") or ("gazetteer,nominatim" if gazetteer_path() else "nominatim")
+    backends: List[Backend] = []
+    for name in (n.strip() for n in spec.split(",") if n.strip()):
+        if name == "nominatim":
+            backends.append(NominatimBackend())
+        elif name == "gazetteer":
+            path = gazetteer_path()
+            if path is None or not path.exists():
+                raise FileNotFoundError(f"gazetteer backend configured, but no gazetteer file found ({path})")
+            backends.append(GazetteerBackend.load(path))
+        else:
+            raise ValueError(f"unknown geocoder backend {name!r}")
+    return backends[0] if len(backends) == 1 else ChainBackend(backends)
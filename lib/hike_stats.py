@@ -0,0 +1,128 @@
+# lib/hike_stats.py
+from __future__ import annotations
+
+import math
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Mapping, Sequence
+
+import numpy as np
+
+from lib.geo import haversine_m
+from lib.tracks import Track, default_store
+
+ELE_SMOOTHING = 2          # moving average over ±2 points against GPS/DEM jitter
+MOVING_MIN_SPEED = 0.15    # m/s (~0.5 km/h); slower segments count as breaks
+MOVING_MAX_GAP = 600       # s; longer gaps between fixes count as breaks
+
+
+@dataclass(frozen=True)
+class HikeStats:
+    length_km: float
+    ascent_m: float
+    descent_m: float
+    ele_min_m: float
+    ele_max_m: float
+    walking_time_h: float   # DIN 33466 estimate from length and climb
+    moving_time_h: float    # from timestamps; NaN when the GPX has none
+
+
+def walking_time_h(length_km: float, ascent_m: float, descent_m: float) -> float:
+    """DIN 33466: 4 km/h on the flat, 300 m/h up, 500 m/h down; the smaller part counts half."""
+    horizontal = length_km / 4.0
+    vertical = ascent_m / 300.0 + descent_m / 500.0
+    return max(horizontal, vertical) + min(horizontal, vertical) / 2
+
+
+def _smooth(values: np.ndarray, part_lo: np.ndarray, part_hi: np.ndarray, k: int) -> np.ndarray:
+    """NaN-aware moving average that never reaches across a part boundary."""
+    idx = np.arange(len(values))
+    lo = np.maximum(idx - k, part_lo)
+    hi = np.minimum(idx + k + 1, part_hi)
+    valid = ~np.isnan(values)
+    sums = np.concatenate([[0.0], np.cumsum(np.where(valid, values, 0.0))])
+    counts = np.concatenate([[0], np.cumsum(valid)])
+    n = counts[hi] - counts[lo]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(n > 0, (sums[hi] - sums[lo]) / n, np.nan)
+
+
+def compute_stats(tracks: Sequence[Track]) -> List[HikeStats]:
+    """Statistics for many tracks in one vectorized pass over their concatenated vertices."""
+    if not tracks:
+        return []
+    sizes = np.array([len(t) for t in tracks])
+    bases = np.concatenate([[0], np.cumsum(sizes)])
+    n_tracks, n_points = len(tracks), int(bases[-1])
+    coords = np.concatenate([np.asarray(t.coords, dtype=np.float64).reshape(-1, 2) for t in tracks])
+    ele = np.concatenate([np.asarray(t.ele, dtype=np.float64) for t in tracks])
+    times = np.concatenate([np.asarray(t.time, dtype=np.float64) for t in tracks])
+    owner = np.repeat(np.arange(n_tracks), sizes)
+
+    # Global part boundaries; a segment is only real if both ends share a part.
+    starts = np.concatenate([np.asarray(t.offsets[:-1]) + base for t, base in zip(tracks, bases)])
+    ends = np.concatenate([np.asarray(t.offsets[1:]) + base for t, base in zip(tracks, bases)])
+    part_of = np.repeat(np.arange(len(starts)), ends - starts)
+    same_part = part_of[1:] == part_of[:-1] if n_points > 1 else np.zeros(0, dtype=bool)
+    seg_owner = owner[1:]
+
+    def per_track(weights: np.ndarray) -> np.ndarray:
+        return np.bincount(seg_owner, weights=np.where(same_part, weights, 0.0), minlength=n_tracks)
+
+    dist = haversine_m(coords[:-1], coords[1:]) if n_points > 1 else np.zeros(0)
+    length_m = per_track(dist)
+
+    smoothed = _smooth(ele, starts[part_of], ends[part_of], ELE_SMOOTHING)
+    dh = np.nan_to_num(np.diff(smoothed))
+    ascent = per_track(np.clip(dh, 0.0, None))
+    descent = per_track(-np.clip(dh, None, 0.0))
+
+    has_ele = np.bincount(owner, weights=~np.isnan(ele), minlength=n_tracks) > 0
+    ele_min = np.full(n_tracks, np.nan)
+    ele_max = np.full(n_tracks, np.nan)
+    nonempty = sizes > 0
+    if nonempty.any():
+        with np.errstate(invalid="ignore"):
+            ele_min[nonempty] = np.fmin.reduceat(ele, bases[:-1][nonempty])
+            ele_max[nonempty] = np.fmax.reduceat(ele, bases[:-1][nonempty])
+
+    dt = np.diff(times)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        moving = (dt > 0) & (dt <= MOVING_MAX_GAP) & (dist / dt >= MOVING_MIN_SPEED)
+    moving_s = per_track(np.where(moving, dt, 0.0))
+    has_time = np.bincount(owner, weights=~np.isnan(times), minlength=n_tracks) > 1
+
+    out: List[HikeStats] = []
+    for i in range(n_tracks):
+        km = float(length_m[i]) / 1000
+        up = float(ascent[i]) if has_ele[i] else math.nan
+        down = float(descent[i]) if has_ele[i] else math.nan
+        out.append(HikeStats(
+            length_km=km,
+            ascent_m=up,
+            descent_m=down,
+            ele_min_m=float(ele_min[i]),
+            ele_max_m=float(ele_max[i]),
+            walking_time_h=walking_time_h(km, up if has_ele[i] else 0.0, down if has_ele[i] else 0.0),
+            moving_time_h=float(moving_s[i]) / 3600 if has_time[i] else math.nan,
+        ))
+    return out
+
+
+_cache: Dict[str, HikeStats] = {}
+_cache_lock = threading.Lock()
+
+
+def stats_for_files(tracks: Mapping[str, Track]) -> Dict[str, HikeStats]:
+    """{gpx path: stats}; cached per file content, uncached files computed in one batch."""
+    digests = default_store().digest_many(tracks)  # under the store lock
+    keys = {f: d for f, d in digests.items() if isinstance(d, str)}  # unreadable now: computed, not cached
+    with _cache_lock:
+        out = {f: _cache[k] for f, k in keys.items() if k in _cache}
+    todo = [f for f in tracks if f not in out]
+    for f, stats in zip(todo, compute_stats([tracks[f] for f in todo])):
+        out[f] = stats
+        if f in keys:
+            with _cache_lock:
+                _cache[keys[f]] = stats
+    return out
@@ -0,0 +1,83 @@
+# lib/icons.py
+"""Marker icons, referenced by key.
+
+Image icons are drawn here as small SVGs, so no marker depends on a
+third-party CDN. With static serving they are bundled into one sprite,
+published under static/ by content hash (lib.static_assets), and each icon is
+a view of it (`<sprite>.svg#camp`): the browser fetches and caches it once.
+Without static serving (site export, AUSFLUG_INLINE_ASSETS=1) each icon is a
+data: URI instead. Font icons ("awesome") come with the map's own CSS.
+"""
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, Optional
+from urllib.parse import quote
+
+from lib.static_assets import publish_bytes, static_serving
+
+ICON_SIZE = (40, 40)
+ICON_ANCHOR = (20, 40)  # the pin's tip
+
+# pin outline with a white disc for the glyph, 40 x 40, tip at the bottom center
+_PIN = (
+    '<path d="M20 39C20 39 6 24 6 15a14 14 0 0 1 28 0c0 9-14 24-14 24z" fill="{color}" '
+    'stroke="#fff" stroke-width="1.5"/><circle cx="20" cy="15" r="9.5" fill="#fff"/>'
+)
+_GLYPHS = {
+    "camp": ("#2e7d32", '<path d="M12.5 21.5h15L20 8.5z" fill="#2e7d32"/><path d="M18 21.5l2-5 2 5z" fill="#fff"/>'),
+    "home": ("#1565c0", '<path d="M11.5 16L20 8.5l8.5 7.5z" fill="#1565c0"/><path d="M13.5 16h13v6.5h-13z" '
+                        'fill="#1565c0"/><path d="M18.5 18.5h3v4h-3z" fill="#fff"/>'),
+    "destination": ("#c62828", '<path d="M15 8h1.6v15H15z" fill="#c62828"/><path d="M16.6 8.5l10 3.6-10 3.6z" '
+                               'fill="#c62828"/>'),
+}
+
+# key -> PointLayer spec for font icons (folium.Icon's awesome markers)
+AWESOME: Dict[str, Dict[str, Any]] = {
+    "default": {"type": "awesome", "icon": "info-sign", "prefix": "glyphicon", "color": "blue"},
+    "restaurant": {"type": "awesome", "icon": "cutlery", "prefix": "fa", "color": "red"},
+    "bakery": {"type": "awesome", "icon": "coffee", "prefix": "fa", "color": "orange"},
+    "supermarket": {"type": "awesome", "icon": "shopping-basket", "prefix": "fa", "color": "blue"},
+}
+IMAGE_KEYS = tuple(_GLYPHS)
+
+
+def svg(key: str) -> str:
+    """The standalone SVG document of an image icon."""
+    color, glyph = _GLYPHS[key]
+    w, h = ICON_SIZE
+    return (f'<svg xmlns="http://www.w3.org/2000/svg" width="{w}" height="{h}" viewBox="0 0 {w} {h}">'
+            f"{_PIN.format(color=color)}{glyph}</svg>")
+
+
+def sprite_svg() -> str:
+    """All image icons side by side, each addressable as a <view> (sprite.svg#key)."""
+    w, h = ICON_SIZE
+    parts = []
+    for i, key in enumerate(IMAGE_KEYS):
+        color, glyph = _GLYPHS[key]
+        parts.append(f'<view id="{key}" viewBox="{i * w} 0 {w} {h}"/>'
+                     f'<svg x="{i * w}" width="{w}" height="{h}" viewBox="0 0 {w} {h}">{_PIN.format(color=color)}{glyph}</svg>')
+    return (f'<svg xmlns="http://www.w3.org/2000/svg" width="{w * len(IMAGE_KEYS)}" height="{h}" '
+            f'viewBox="0 0 {w * len(IMAGE_KEYS)} {h}">{"".join(parts)}</svg>')
+
+
+def icon_url(key: str, *, inline: Optional[bool] = None) -> str:
+    """URL of an image icon: a view of the published sprite, or a data: URI when inlining."""
+    if inline is None:
+        inline = not static_serving()
+    if inline:
+        return "data:image/svg+xml;charset=utf-8," + quote(svg(key))
+    return f"{publish_bytes(sprite_svg().encode('utf-8'), '.svg')}#{key}"
+
+
+def icon_spec(key: str) -> Dict[str, Any]:
+    """PointLayer spec for `key`; unknown keys get the default icon."""
+    if key in _GLYPHS:
+        return {"type": "custom", "url": icon_url(key), "size": list(ICON_SIZE), "anchor": list(ICON_ANCHOR),
+                "popup_anchor": [0, -ICON_ANCHOR[1]]}
+    return dict(AWESOME.get(key, AWESOME["default"]))
+
+
+def icon_specs(keys: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    """Specs for `keys` plus the default, as PointLayer's `icons`."""
+    return {k: icon_spec(k) for k in {"default", *keys}}
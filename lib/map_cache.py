@@ -0,0 +1,105 @@
+# lib/map_cache.py
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Hashable, List, Tuple
+
+from lib.map_utils import MapLayers
+from lib.timing import count, span
+
+MAX_ENTRIES = 32
+MAX_BYTES = 64 * 1024 * 1024  # map payload across all entries (MapLayers.payload_bytes)
+
+BuildFn = Callable[[], Tuple[MapLayers, Dict[str, Any]]]
+
+
+def fingerprint(*parts: Any) -> str:
+    """Content hash of the rows/coords map layers are built from."""
+    blob = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha1(blob.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class _Entry:
+    layers: MapLayers
+    meta: Dict[str, Any]
+    size: int
+
+
+@dataclass
+class MapCache:
+    """LRU of built map layers, bounded by count and the size of the payload they send to the map.
+
+    Layers are pure functions of their data, so entries are shared by all
+    sessions; lib.map_utils.render_layers sends them to the persistent map.
+    """
+
+    max_entries: int = MAX_ENTRIES
+    max_bytes: int = MAX_BYTES
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    _entries: "OrderedDict[Hashable, _Entry]" = field(default_factory=OrderedDict)
+    _bytes: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def get_or_build(self, key: Hashable, build: BuildFn) -> Tuple[MapLayers, Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                count("map_cache.hit")
+                count("html_bytes", entry.size)
+                return entry.layers, entry.meta
+            self.misses += 1
+        count("map_cache.miss")
+
+        with span("map.build"):
+            layers, meta = build()
+        size = layers.payload_bytes()
+        count("html_bytes", size)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old.size
+            self._entries[key] = _Entry(layers, meta, size)
+            self._bytes += size
+            while len(self._entries) > 1 and (
+                len(self._entries) > self.max_entries or self._bytes > self.max_bytes
+            ):
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.size
+                self.evictions += 1
+        return layers, meta
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def items(self) -> List[Tuple[Hashable, MapLayers, Dict[str, Any], int]]:
+        """(key, layers, meta, payload bytes) of every entry, least recently used first."""
+        with self._lock:
+            return [(k, e.layers, e.meta, e.size) for k, e in self._entries.items()]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes, "hits": self.hits,
+                    "misses": self.misses, "evictions": self.evictions}
+
+
+_default = MapCache()
+
+
+def cached_layers(trip_id: int, section: str, data_fp: str, build: BuildFn) -> Tuple[MapLayers, Dict[str, Any]]:
+    """Prebuilt map layers for (trip, section, data fingerprint), building them on first use."""
+    return _default.get_or_build((trip_id, section, data_fp), build)
+
+
+def map_cache() -> MapCache:
+    return _default
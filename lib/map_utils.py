@@ -1,10 +1,23 @@
 # lib/map_utils.py
 from __future__ import annotations
 
-import json
+import copy
+import math
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
 
 import folium
+import numpy as np
+import streamlit as st
+from branca.element import MacroElement
 from folium import plugins
+from folium.elements import JSCSSMixin
+from jinja2 import Template
+
+from lib.icons import AWESOME, icon_specs
+from lib.static_assets import asset_url, encode
+from lib.timing import span
 
 # Prefer st_folium; fall back to folium_static
 try:
@@ -40,39 +53,322 @@ def points_to_bounds(points: list[list[float]]) -> list[list[float]]:
     return [[min(lats), min(lons)], [max(lats), max(lons)]]
 
 
+def estimate_fit_zoom(
+    bounds: list[list[float]], *, width_px: int = 900, height_px: int = 520, max_zoom: int = 18
+) -> int:
+    """Zoom level Leaflet's fitBounds will settle on for [[south, west], [north, east]]."""
+    (south, west), (north, east) = bounds
+
+    def merc_y(lat: float) -> float:
+        lat = max(min(lat, 85.0), -85.0)
+        return math.log(math.tan(math.pi / 4 + math.radians(lat) / 2))
+
+    lon_span = max(east - west, 1e-9)
+    y_span = max(merc_y(north) - merc_y(south), 1e-9)
+    zoom_x = math.log2(width_px * 360.0 / (256 * lon_span))
+    zoom_y = math.log2(height_px * 2 * math.pi / (256 * y_span))
+    return max(0, min(max_zoom, int(math.floor(min(zoom_x, zoom_y)))))
+
+
 def fit_bounds(m: folium.Map, points: list[list[float]], max_zoom: int = 15) -> None:
     if not points:
         return
     m.fit_bounds(points, max_zoom=max_zoom)
 
 
-def force_fit_on_mount(
-    m: folium.Map, points: list[list[float]], max_zoom: int = 15, padding_px: int = 24
-) -> None:
-    """Fix Leaflet rendering when container was hidden: invalidateSize + fitBounds after mount."""
-    if not points:
-        return
-    sw_ne = points_to_bounds(points)
-    js = f"""
-    <script>(function(){{
-      function fit(){{
-        try {{
-          var map = {m.get_name()};
-          map.invalidateSize();
-          map.fitBounds({json.dumps(sw_ne)}, {{maxZoom:{max_zoom}, padding:[{padding_px},{padding_px}]}});
-        }} catch(e) {{}}
-      }}
-      setTimeout(fit,0); setTimeout(fit,200); setTimeout(fit,600);
-    }})();</script>
+# --- Bulk point layer ---------------------------------------------------------
+POPUP_TEMPLATE = (
+    "<div style='max-width:250px'>"
+    "<b>{name}</b><br>"
+    "<span style='font-size:12px'>{description}</span><br>"
+    "<a href='{url}' target='_blank'>📍 Auf Google Maps öffnen</a>"
+    "</div>"
+)
+NAME_POPUP_TEMPLATE = "<b>{name}</b>"
+
+
+class PointLayer(JSCSSMixin, MacroElement):
+    """Many markers (or track lines) as one GeoJSON FeatureCollection, clustered in the browser.
+
+    Popups are rendered lazily on click from one shared template, so each
+    point only costs its properties in the page instead of a Marker, an Icon
+    and a Popup element with their own JS statements. With `url`, the
+    collection is fetched from a static asset (see lib.static_assets) instead
+    of being inlined; `data` is then only kept for counting.
+    """
+
+    _template = Template(r"""
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = (function() {
+            var icons = {{ this.icons|tojson }}, made = {};
+            var tpl = {{ this.popup_template|tojson }};
+            var lineStyle = {{ this.line_style|tojson }};
+            function esc(v) {
+                return String(v == null ? "" : v).replace(/[&<>"']/g, function(c) {
+                    return {"&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;", "'": "&#39;"}[c];
+                });
+            }
+            function icon(key) {
+                key = icons[key] ? key : "default";
+                if (!made[key]) {
+                    var s = icons[key];
+                    made[key] = s.type === "custom"
+                        ? L.icon({iconUrl: s.url, iconSize: s.size, iconAnchor: s.anchor, popupAnchor: s.popup_anchor})
+                        : L.AwesomeMarkers.icon({icon: s.icon, prefix: s.prefix, markerColor: s.color, iconColor: "white"});
+                }
+                return made[key];
+            }
+            {% if this.cluster %}
+            var group = L.markerClusterGroup({{ this.cluster_options|tojson }});
+            {% else %}
+            var group = L.featureGroup();
+            {% endif %}
+            function add(data) {
+                group.addLayer(L.geoJSON(data, {
+                    pointToLayer: function(f, latlng) { return L.marker(latlng, {icon: icon(f.properties.icon)}); },
+                    style: function(f) { return Object.assign({color: f.properties.color}, lineStyle); },
+                    onEachFeature: function(f, l) {
+                        l.bindPopup(function() {
+                            return tpl.replace(/\{(\w+)\}/g, function(_, k) { return esc(f.properties[k]); });
+                        }, {maxWidth: {{ this.max_width }}});
+                    }
+                }));
+            }
+            {% if this.url %}
+            fetch({{ this.url|tojson }}).then(function(r) { return r.json(); }).then(add);
+            {% else %}
+            add({{ this.data|tojson }});
+            {% endif %}
+            return group.addTo({{ this._parent.get_name() }});
+        })();
+        {% endmacro %}
+    """)
+
+    default_js = plugins.MarkerCluster.default_js
+    default_css = plugins.MarkerCluster.default_css
+
+    def __init__(
+        self,
+        data: Dict[str, Any],
+        *,
+        url: Optional[str] = None,
+        icons: Optional[Mapping[str, Mapping[str, Any]]] = None,
+        popup_template: str = POPUP_TEMPLATE,
+        max_width: int = 300,
+        cluster: bool = True,
+        cluster_options: Optional[Dict[str, Any]] = None,
+        line_style: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        super().__init__()
+        self._name = "PointLayer"
+        self.data = data
+        self.url = url
+        self.icons = {"default": AWESOME["default"], **(icons or {})}
+        self.popup_template = popup_template
+        self.max_width = max_width
+        self.cluster = cluster
+        self.cluster_options = cluster_options or {}
+        self.line_style = {"weight": 3, **(line_style or {})}
+
+    def __len__(self) -> int:
+        return len(self.data["features"])
+
+
+def points_geojson(table: Any, columns: Sequence[str] = ("name", "description", "url", "icon")) -> Dict[str, Any]:
+    """Columnar table (DataFrame or {column: sequence}) -> compact FeatureCollection.
+
+    Needs `lat`/`lon` columns; rows without coordinates are skipped. Only the
+    listed property columns that exist are copied into the features.
+    """
+    cols = {k: list(table[k]) for k in table.keys()}
+    props = [c for c in columns if c in cols]
+    features = []
+    for i, (lat, lon) in enumerate(zip(cols["lat"], cols["lon"])):
+        if lat is None or lon is None or lat != lat or lon != lon:  # None / NaN
+            continue
+        features.append({
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [round(float(lon), 6), round(float(lat), 6)]},
+            "properties": {c: cols[c][i] for c in props},
+        })
+    return {"type": "FeatureCollection", "features": features}
+
+
+def places_table(rows: Sequence[Mapping[str, Any]], icon: str = "default") -> Dict[str, list]:
+    """Place dicts from data.py (with lat/lon filled in) -> point_layer columns."""
+    return {
+        "name": [r.get("name", "") for r in rows],
+        "description": [r.get("description", "") for r in rows],
+        "url": [r.get("gmap_url", "#") for r in rows],
+        "lat": [r.get("lat") for r in rows],
+        "lon": [r.get("lon") for r in rows],
+        "icon": [icon] * len(rows),
+    }
+
+
+def point_layer(table: Any, **kwargs: Any) -> PointLayer:
+    """Bulk marker layer for a columnar table with name, description, url, lat, lon, icon.
+
+    The icon column holds lib.icons keys; their specs are looked up unless `icons` is given.
+    """
+    data = points_geojson(table)
+    kwargs.setdefault("icons", icon_specs(f["properties"].get("icon", "default") for f in data["features"]))
+    return PointLayer(data, url=asset_url(data), **kwargs)
+
+
+# --- Track layer --------------------------------------------------------------
+TRACK_POPUP_TEMPLATE = (
+    "<b>{name}</b><br>{duration}<br>"
+    "<a href='{link}' target='_blank'>🔗 Hike Info</a>"
+)
+
+
+def line_feature(parts: Sequence[np.ndarray], properties: Mapping[str, Any]) -> Dict[str, Any]:
+    """[lat, lon] vertex arrays (one per segment) -> (Multi)LineString feature in [lon, lat]."""
+    coords = [np.round(p[:, ::-1], 6).tolist() for p in parts]
+    geometry = (
+        {"type": "LineString", "coordinates": coords[0]} if len(coords) == 1
+        else {"type": "MultiLineString", "coordinates": coords}
+    )
+    return {"type": "Feature", "geometry": geometry, "properties": dict(properties)}
+
+
+def track_layer(features: Sequence[Dict[str, Any]], **kwargs: Any) -> PointLayer:
+    """All tracks as one (unclustered) line layer, styled by each feature's `color`."""
+    data = {"type": "FeatureCollection", "features": list(features)}
+    kwargs.setdefault("popup_template", TRACK_POPUP_TEMPLATE)
+    return PointLayer(data, url=asset_url(data), cluster=False, **kwargs)
+
+
+# --- Persistent map -----------------------------------------------------------
+MAP_KEY = "trip_map"
+POINT_LAYER_SCRIPT_BYTES = 2500  # PointLayer's JS without data, for MapLayers.payload_bytes()
+ELEMENT_SCRIPT_BYTES = 512       # any other element (a folium Marker with its icon, a group)
+BASE_CENTER = (48.5, 9.0)  # only shown until the first view arrives
+BASE_ZOOM = 7
+
+
+class LayerAssets(JSCSSMixin, MacroElement):
+    """Loads the scripts data layers need together with the base map.
+
+    The component only loads scripts when it mounts, so layers sent later
+    (e.g. a clustered PointLayer after switching from a page without one)
+    cannot bring their own.
     """
-    m.get_root().html.add_child(folium.Element(js))
 
+    _template = Template("{% macro script(this, kwargs) %}{% endmacro %}")
+    default_js = PointLayer.default_js
+    default_css = PointLayer.default_css
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._name = "LayerAssets"
+
+
+@dataclass
+class MapLayers:
+    """A section's data for the map: feature groups, plus the points the view has to show."""
+
+    groups: List[folium.FeatureGroup]
+    points: List[List[float]]
+    max_zoom: int = 15
+    padding_px: int = 24
+
+    def view(self) -> Tuple[Tuple[float, float], int]:
+        """(center, zoom) that fits all points, like fitBounds with padding would."""
+        if not self.points:
+            return BASE_CENTER, BASE_ZOOM
+        (south, west), (north, east) = points_to_bounds(self.points)
+        height = DEFAULT_RENDER_ARGS.get("height", 520)
+        zoom = estimate_fit_zoom(
+            [[south, west], [north, east]], width_px=900 - 2 * self.padding_px,
+            height_px=height - 2 * self.padding_px, max_zoom=self.max_zoom,
+        )
+        return (round((south + north) / 2, 6), round((west + east) / 2, 6)), zoom
+
+    def payload_bytes(self) -> int:
+        """About what the map receives for these layers, estimated from their data without rendering.
+
+        A PointLayer costs its script, icon specs and inlined GeoJSON (or just
+        its URL when published as an asset); any other element a fixed amount.
+        """
+        total = 0
+        for g in self.groups:
+            for e in _walk(g):
+                if isinstance(e, PointLayer):
+                    total += POINT_LAYER_SCRIPT_BYTES + len(encode(e.icons)) + len(e.popup_template)
+                    total += len(e.url) if e.url else len(encode(e.data))
+                else:
+                    total += ELEMENT_SCRIPT_BYTES
+        return total
 
-def render_map(m: folium.Map, *, key: str, **kwargs) -> None:
-    """Render regardless of backend; only pass key/extras when supported."""
-    if _USES_ST:
+    def to_map(self) -> folium.Map:
+        """Standalone map with the layers on it (site export, benchmarks)."""
+        center, zoom = self.view()
+        m = new_map(center, zoom=zoom)
+        add_default_plugins(m)
+        for g in self.groups:
+            g.add_to(m)
+        fit_bounds(m, self.points, max_zoom=self.max_zoom)
+        return m
+
+
+BASE_MAP_STATE = "_base_map"
+
+
+def base_map() -> folium.Map:
+    """Tiles, plugins and layer scripts, no data; built and rendered once per session.
+
+    Every page of a session mounts this same map, so its script, and with it
+    the identity st_folium derives for the component, never changes.
+    """
+    m = st.session_state.get(BASE_MAP_STATE)
+    if m is None:
+        m = new_map(BASE_CENTER, zoom=BASE_ZOOM)
+        add_default_plugins(m)
+        LayerAssets().add_to(m)
+        m.get_root().render()
+        st.session_state[BASE_MAP_STATE] = m
+    return m
+
+
+def render_layers(layers: MapLayers, *, key: str = MAP_KEY, **kwargs: Any) -> None:
+    """Show `layers` on the persistent map.
+
+    Only the feature groups and the view are sent; the frontend swaps the
+    groups and keeps tiles, plugins and the Leaflet instance. The view is
+    applied whenever it differs from the one sent last (other data, another
+    page), so panning survives reruns but each page opens fitted to its data.
+    """
+    center, zoom = layers.view()
+    with span("st_folium", key=key, layers=len(layers.groups)):
+        if not _USES_ST:
+            _ST_RENDER(layers.to_map(), height=kwargs.get("height", DEFAULT_RENDER_ARGS.get("height", 520)))
+            return
         args = dict(DEFAULT_RENDER_ARGS)
         args.update(kwargs)
-        _ST_RENDER(m, key=key, **args)
-    else:
-        _ST_RENDER(m, height=kwargs.get("height", DEFAULT_RENDER_ARGS.get("height", 520)))
+        m = base_map()
+        # st_folium attaches the groups to the map and renders them, which adds children
+        # (folium's Marker one more SetIcon each time): hand it copies, the cached groups are shared.
+        groups = [_detached(g) for g in layers.groups]
+        try:
+            _ST_RENDER(m, key=key, feature_group_to_add=groups, center=center, zoom=zoom, render=False, **args)
+        finally:
+            for g in groups:  # left on the map they would end up in its script on the next rerun
+                m._children.pop(g.get_name(), None)
+
+
+def _detached(element: Any) -> Any:
+    """Copy of an element tree; the copies share everything but their children and parent."""
+    clone = copy.copy(element)
+    clone._children = OrderedDict()
+    for name, child in element._children.items():
+        clone._children[name] = c = _detached(child)
+        c._parent = clone
+    return clone
+
+
+def _walk(element: Any) -> Iterator[Any]:
+    yield element
+    for child in list(element._children.values()):
+        yield from _walk(child)
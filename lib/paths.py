@@ -0,0 +1,10 @@
+# lib/paths.py
+from __future__ import annotations
+
+import os
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# All derived on-disk state (geocode cache, track cache, ...) lives below here.
+CACHE_DIR = Path(os.environ.get("AUSFLUG_CACHE_DIR", ROOT / ".cache"))
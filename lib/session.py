@@ -1,20 +1,42 @@
 # lib/session.py
 from __future__ import annotations
 
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional, Tuple
+
 import streamlit as st
+from streamlit.delta_generator import DeltaGenerator
+
+# (map container, body container) of the page being rendered
+_slots: ContextVar[Optional[Tuple[DeltaGenerator, DeltaGenerator]]] = ContextVar("page_slots", default=None)
+
+
+@contextmanager
+def page_layout() -> Iterator[None]:
+    """Lay a section out as head / map / body containers, at the same place on every page.
+
+    Whatever the section writes goes into the head until it enters map_slot()
+    or page_body(). Because the map container sits at the same position in
+    the element tree whichever section is shown, the map component in it is
+    not remounted on a tab switch (see lib.map_utils.render_layers).
+    """
+    head, map_area, body = st.container(), st.container(), st.container()
+    token = _slots.set((map_area, body))
+    try:
+        with head:
+            yield
+    finally:
+        _slots.reset(token)
 
 
-def visit_token(page_id: str) -> int:
-    """Bumps once when (re)entering a page/section during this app run."""
-    last = st.session_state.get("__last_page")
-    if last != page_id:
-        st.session_state["__last_page"] = page_id
-        st.session_state[f"__visit_{page_id}"] = st.session_state.get(f"__visit_{page_id}", 0) + 1
-    return st.session_state.get(f"__visit_{page_id}", 0)
+def map_slot() -> DeltaGenerator:
+    """Container for the section's map; a new one when there is no page_layout()."""
+    slots = _slots.get()
+    return slots[0] if slots else st.container()
 
 
-def unique_map_key(page_id: str, trip_id: int, bounds_sig: tuple[float, float, float, float]) -> str:
-    """Stable, unique key per page visit and data state (prevents stale viewport restore)."""
-    visit = visit_token(page_id)
-    short = abs(hash(bounds_sig)) % 1_000_000
-    return f"{page_id}_map_{trip_id}_{visit}_{short}"
+def page_body() -> DeltaGenerator:
+    """Container for everything below the map."""
+    slots = _slots.get()
+    return slots[1] if slots else st.container()
@@ -0,0 +1,141 @@
+# lib/simplify.py
+from __future__ import annotations
+
+import hashlib
+import math
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+# Precomputed levels of detail: Douglas-Peucker tolerances in meters.
+LEVELS_M = (0.0, 1.0, 3.0, 8.0, 20.0, 50.0, 120.0)
+
+_EARTH_CIRCUMFERENCE_M = 40_075_016.686
+
+
+def _project(coords: np.ndarray) -> np.ndarray:
+    """[lat, lon] degrees -> local equirectangular [x, y] meters (fine for a hike)."""
+    lat0 = math.radians(float(coords[:, 0].mean()))
+    x = coords[:, 1] * (111_320.0 * math.cos(lat0))
+    y = coords[:, 0] * 110_574.0
+    return np.column_stack([x, y])
+
+
+def dp_importance(coords: np.ndarray) -> np.ndarray:
+    """Douglas-Peucker significance of every vertex, in meters.
+
+    Vertex i survives a simplification with tolerance t iff importance[i] > t,
+    so a single pass yields every level. A vertex's value is capped by its
+    parent's, which makes the result identical to running DP per tolerance.
+    """
+    n = len(coords)
+    imp = np.zeros(n)
+    if n < 3:
+        imp[:] = np.inf
+        return imp
+    imp[0] = imp[-1] = np.inf
+    xy = _project(np.asarray(coords, dtype=np.float64))
+    stack = [(0, n - 1, np.inf)]
+    while stack:
+        i, j, cap = stack.pop()
+        if j - i < 2:
+            continue
+        a, d = xy[i], xy[j] - xy[i]
+        rel = xy[i + 1:j] - a
+        length2 = float(d @ d)
+        if length2 > 0:
+            t = np.clip(rel @ d / length2, 0.0, 1.0)
+            rel = rel - t[:, None] * d
+        dist = np.hypot(rel[:, 0], rel[:, 1])
+        k = int(dist.argmax())
+        m = i + 1 + k
+        imp[m] = min(float(dist[k]), cap)
+        stack.append((i, m, imp[m]))
+        stack.append((m, j, imp[m]))
+    return imp
+
+
+def _whole(coords: np.ndarray) -> np.ndarray:
+    return np.array([0, len(coords)], dtype=np.int64)
+
+
+@dataclass(frozen=True)
+class TrackLevels:
+    """All levels of detail of one track."""
+
+    coords: np.ndarray
+    offsets: np.ndarray       # part boundaries, see lib.tracks.Track
+    importance: np.ndarray
+    counts: Dict[float, int]  # tolerance -> kept vertices
+
+    def at(self, tolerance_m: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Kept vertices and their part offsets at this tolerance."""
+        keep = self.importance > tolerance_m
+        kept_before = np.concatenate([[0], np.cumsum(keep)])
+        return self.coords[keep], kept_before[self.offsets]
+
+    def tolerance_for_budget(self, max_points: int) -> float:
+        """Smallest precomputed tolerance that keeps at most max_points vertices."""
+        for tol in LEVELS_M:
+            if self.counts[tol] <= max_points:
+                return tol
+        return LEVELS_M[-1]
+
+
+_cache: "OrderedDict[str, TrackLevels]" = OrderedDict()
+_cache_lock = threading.Lock()
+_CACHE_SIZE = 256
+
+
+def levels_for(coords: np.ndarray, offsets: Optional[np.ndarray] = None) -> TrackLevels:
+    """Levels of detail for a track (each part simplified on its own), cached by content."""
+    coords = np.ascontiguousarray(coords, dtype=np.float64).reshape(-1, 2)
+    offsets = np.ascontiguousarray(_whole(coords) if offsets is None else offsets, dtype=np.int64)
+    key = hashlib.sha1(coords.tobytes() + offsets.tobytes()).hexdigest()
+    with _cache_lock:
+        hit = _cache.get(key)
+        if hit is not None:
+            _cache.move_to_end(key)
+            return hit
+    imp = np.empty(len(coords))
+    for a, b in zip(offsets[:-1], offsets[1:]):
+        imp[a:b] = dp_importance(coords[a:b])
+    levels = TrackLevels(coords, offsets, imp, {tol: int((imp > tol).sum()) for tol in LEVELS_M})
+    with _cache_lock:
+        _cache[key] = levels
+        while len(_cache) > _CACHE_SIZE:
+            _cache.popitem(last=False)
+    return levels
+
+
+def meters_per_pixel(zoom: float, lat: float) -> float:
+    """Ground resolution of a 256px Web-Mercator tile at this zoom and latitude."""
+    return _EARTH_CIRCUMFERENCE_M * math.cos(math.radians(lat)) / (256 * 2 ** zoom)
+
+
+def tolerance_for_zoom(zoom: float, lat: float) -> float:
+    """Largest precomputed tolerance below one screen pixel at `zoom`."""
+    mpp = meters_per_pixel(zoom, lat)
+    return max((tol for tol in LEVELS_M if tol <= mpp), default=0.0)
+
+
+def simplify_track(
+    coords: np.ndarray,
+    offsets: Optional[np.ndarray] = None,
+    *,
+    zoom: Optional[float] = None,
+    max_points: Optional[int] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Pick a level by zoom and/or point budget (the coarser wins); returns (coords, offsets)."""
+    levels = levels_for(coords, offsets)
+    if not len(levels.coords):
+        return levels.coords, levels.offsets
+    tol = 0.0
+    if zoom is not None:
+        tol = tolerance_for_zoom(zoom, float(levels.coords[:, 0].mean()))
+    if max_points is not None:
+        tol = max(tol, levels.tolerance_for_budget(max_points))
+    return levels.at(tol)
@@ -0,0 +1,357 @@
+# lib/site_export.py
+"""Export every trip and section as a static site.
+
+    python -m lib.site_export [--out DIR] [--workers N] [--trips 1,2] [--sections Info,POIs] [--force]
+
+Writes <out>/index.html and <out>/trip-<id>/<section>.html for every trip in
+the data files, each a standalone page with its map (geometry inlined, see
+lib.static_assets) and tables. Scripts, styles, fonts and icons the maps load
+from CDNs are downloaded once into <out>/assets/ and referenced relatively;
+anything that cannot be fetched keeps its CDN URL (map tiles always do).
+
+Addresses are geocoded and GPX files parsed up front in this process, so the
+worker processes only read the shared caches (and the Nominatim rate limit
+holds). A page whose inputs (its data rows, track files and the rendering
+code) hash the same as in <out>/manifest.json is skipped.
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import html
+import importlib
+import importlib.util
+import json
+import os
+import re
+import textwrap
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple
+
+from lib.paths import ROOT
+
+if TYPE_CHECKING:
+    import folium
+    import pandas as pd
+
+EXPORT_VERSION = 1
+DEFAULT_OUT = ROOT / "build" / "site"
+MANIFEST = "manifest.json"
+
+# section -> (module with export_page(trip_id), file name, tables it reads)
+SECTIONS: Dict[str, Tuple[str, str, Tuple[str, ...]]] = {
+    "Info": ("app.overview_section", "info.html", ()),
+    "Camping": ("app.camping_section", "camping.html", ("camping", "bakery", "supermarket", "restaurant")),
+    "POIs": ("app.hikes_section", "pois.html", ("poi", "hike", "camping")),
+    "Restaurants": ("app.restaurants_section", "restaurants.html", ("restaurant", "camping")),
+}
+GEOCODED = ("restaurant", "poi", "bakery", "supermarket")
+_RENDER_CODE = (
+    "lib/site_export.py", "lib/map_utils.py", "lib/icons.py", "lib/simplify.py", "lib/hike_stats.py",
+    "lib/destination_score.py",
+)
+
+_ASSET_URL = re.compile(r"""https?://[^\s"'()<>{}]+?\.(?:js|css|png|jpe?g|gif|svg|woff2?|ttf|eot)(?=[\s"'?#)])""")
+_CSS_URL = re.compile(r"""url\(\s*['"]?([^'")]+?)['"]?\s*\)""")
+
+
+@dataclass
+class Table:
+    title: str
+    frame: "pd.DataFrame"
+    links: Dict[str, str] = field(default_factory=dict)    # column -> link text
+    formats: Dict[str, str] = field(default_factory=dict)  # column -> str.format spec
+
+
+@dataclass
+class Page:
+    """What a section shows, independent of Streamlit."""
+
+    title: str
+    map: Optional["folium.Map"] = None
+    tables: List[Table] = field(default_factory=list)
+    intro: str = ""  # markdown: paragraphs and **bold**
+    notes: List[str] = field(default_factory=list)
+
+
+# --- HTML ---------------------------------------------------------------------
+_CSS = """
+body{font-family:system-ui,-apple-system,"Segoe UI",sans-serif;margin:0 auto;max-width:1200px;padding:0 16px 32px;color:#222}
+nav{display:flex;flex-wrap:wrap;gap:12px;padding:12px 0;border-bottom:1px solid #ddd;margin-bottom:12px}
+nav a{color:#444;text-decoration:none}nav a.current{font-weight:600;color:#000}
+iframe.map{width:100%;height:520px;border:1px solid #ddd;border-radius:4px}
+table{border-collapse:collapse;width:100%;font-size:14px}th,td{border-bottom:1px solid #eee;padding:4px 8px;text-align:left}
+th{background:#f6f6f6}.notes{color:#8a6d3b;font-size:13px}
+"""
+
+
+def markdown_html(text: str) -> str:
+    """The small markdown subset used in section intros: paragraphs, hard breaks, **bold**."""
+    out = []
+    for para in re.split(r"\n\s*\n", textwrap.dedent(text).strip()):
+        lines = [html.escape(line.rstrip()) for line in para.splitlines()]
+        body = "<br>\n".join(lines) if any(line.endswith("  ") for line in para.splitlines()) else " ".join(lines)
+        out.append("<p>" + re.sub(r"\*\*(.+?)\*\*", r"<b>\1</b>", body) + "</p>")
+    return "\n".join(out)
+
+
+def table_html(table: Table) -> str:
+    df = table.frame.copy()
+    for col in df.columns:
+        if col in table.links:
+            text = html.escape(table.links[col])
+            df[col] = [f'<a href="{html.escape(str(v))}" target="_blank">{text}</a>' if v else "" for v in df[col]]
+        elif col in table.formats:
+            spec = table.formats[col]
+            df[col] = ["" if v is None or v != v else html.escape(spec.format(v)) for v in df[col]]
+        else:
+            df[col] = ["" if v is None or v != v else html.escape(str(v)) for v in df[col]]
+    return df.to_html(index=False, escape=False, border=0)
+
+
+def page_html(
+    trip_name: str, page: Page, nav: Sequence[Tuple[str, str]], current: str, map_doc: Optional[str] = None
+) -> str:
+    """Standalone page; the map document (default: page.map rendered) goes into an iframe."""
+    links = " ".join(
+        f'<a href="{href}"{" class=current" if label == current else ""}>{html.escape(label)}</a>'
+        for label, href in nav
+    )
+    parts = [
+        "<!DOCTYPE html><html lang=de><head><meta charset=utf-8>",
+        '<meta name=viewport content="width=device-width, initial-scale=1">',
+        f"<title>{html.escape(trip_name)}: {html.escape(page.title)}</title><style>{_CSS}</style></head><body>",
+        f"<nav>{links}</nav><h2>🗺️ {html.escape(trip_name)}</h2>",
+    ]
+    if page.intro:
+        parts.append(markdown_html(page.intro))
+    if map_doc is None and page.map is not None:
+        map_doc = page.map.get_root().render()
+    if map_doc is not None:
+        parts.append(f'<iframe class=map srcdoc="{html.escape(map_doc)}"></iframe>')
+    if page.notes:
+        parts.append("<ul class=notes>" + "".join(f"<li>{html.escape(n)}</li>" for n in page.notes) + "</ul>")
+    for t in page.tables:
+        parts.append(f"<h3>{html.escape(t.title)}</h3>{table_html(t)}")
+    parts.append("</body></html>")
+    return "\n".join(parts)
+
+
+def index_html(trips: Dict[int, str], out_dir: Path) -> str:
+    items = []
+    for trip_id, name in trips.items():
+        links = " · ".join(
+            f'<a href="trip-{trip_id}/{fname}">{html.escape(section)}</a>'
+            for section, (_, fname, _) in SECTIONS.items() if (out_dir / f"trip-{trip_id}" / fname).exists()
+        )
+        items.append(f"<li><b>{html.escape(name)}</b>: {links}</li>")
+    return (
+        "<!DOCTYPE html><html lang=de><head><meta charset=utf-8><title>Ausflüge</title>"
+        f"<style>{_CSS}</style></head><body><h2>🗺️ Ausflüge</h2><ul>{''.join(items)}</ul></body></html>"
+    )
+
+
+# --- Assets -------------------------------------------------------------------
+def _fetch(url: str, timeout: float = 20) -> bytes:
+    req = urllib.request.Request(url, headers={"User-Agent": "ausflug-export"})
+    with urllib.request.urlopen(req, timeout=timeout) as r:
+        return r.read()
+
+
+def _write_atomic(path: Path, blob: bytes) -> None:
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_bytes(blob)
+    os.replace(tmp, path)
+
+
+def vendor(url: str, assets: Path, failed: List[str]) -> Optional[str]:
+    """Local file name of `url` in `assets` (downloaded on first use), or None if unreachable.
+
+    Stylesheets are rewritten so the fonts and images they reference are
+    vendored next to them.
+    """
+    name = hashlib.sha1(url.encode()).hexdigest()[:12] + "-" + url.rsplit("/", 1)[-1].split("?")[0]
+    path = assets / name
+    if path.exists():
+        return name
+    try:
+        blob = _fetch(url)
+    except Exception:
+        failed.append(url)
+        return None
+    if name.endswith(".css"):
+        def local(m: "re.Match[str]") -> str:
+            ref = m.group(1)
+            if ref.startswith("data:"):
+                return m.group(0)
+            target = vendor(urllib.parse.urljoin(url, ref.split("#")[0]), assets, failed)
+            return f"url({target}{'#' + ref.split('#', 1)[1] if '#' in ref else ''})" if target else m.group(0)
+
+        blob = _CSS_URL.sub(local, blob.decode("utf-8", "replace")).encode("utf-8")
+    assets.mkdir(parents=True, exist_ok=True)
+    _write_atomic(path, blob)
+    return name
+
+
+def bundle(doc: str, assets: Path, prefix: str, failed: List[str]) -> str:
+    """Point CDN scripts, styles and icons in `doc` at vendored copies under `prefix`."""
+    names: Dict[str, Optional[str]] = {}
+
+    def local(m: "re.Match[str]") -> str:
+        url = m.group(0)
+        if url not in names:
+            names[url] = vendor(url, assets, failed)
+        return prefix + names[url] if names[url] else url
+
+    return _ASSET_URL.sub(local, doc)
+
+
+# --- Inputs -------------------------------------------------------------------
+def _code_digest(module: str) -> str:
+    h = hashlib.sha1(str(EXPORT_VERSION).encode())
+    for path in (importlib.util.find_spec(module).origin, *(ROOT / p for p in _RENDER_CODE)):
+        h.update(Path(path).read_bytes())
+    return h.hexdigest()
+
+
+def page_inputs(trip_id: int, section: str) -> str:
+    """Hash of everything the page is built from; unchanged hash -> unchanged page."""
+    from data import locations_home
+    from lib.map_cache import fingerprint
+    from lib.tracks import default_store
+    from lib.trip_store import trip_store
+
+    module, _, kinds = SECTIONS[section]
+    store = trip_store()
+    parts: List[Any] = [_code_digest(module), store.location(trip_id)]
+    parts += [store.records(kind, trip_id) for kind in kinds]
+    if section == "Info":  # start page map and the ranking of all trips
+        parts += [locations_home, store.locations()]
+    if "hike" in kinds:
+        digests = default_store().digest_many([h["file"] for h in store.records("hike", trip_id)])
+        parts += [None if isinstance(d, OSError) else d for d in digests.values()]
+    return fingerprint(*parts)
+
+
+def warm_caches(trip_ids: Sequence[int], sections: Sequence[str], workers: int) -> Tuple[int, int]:
+    """Geocode every address and parse every GPX file the pages need; (addresses, tracks)."""
+    from lib.geocode import geocode_many
+    from lib.tracks import load_tracks
+    from lib.trip_build import compiled_coords
+    from lib.trip_store import trip_store
+
+    store = trip_store()
+    kinds = {k for s in sections for k in SECTIONS[s][2]}
+    addresses = []
+    for trip_id in trip_ids:
+        for kind in kinds & set(GEOCODED):
+            known = compiled_coords(kind, trip_id)
+            addresses += [r.get("address", "") for r in store.records(kind, trip_id) if r.get("address", "") not in known]
+    geocode_many(addresses, max_workers=workers)
+
+    files = sorted({h["file"] for t in trip_ids for h in store.records("hike", t)} if "hike" in kinds else set())
+    load_tracks(files, max_workers=workers)  # failures are reported by the page that uses the file
+    return len(set(addresses)), len(files)
+
+
+# --- Export -------------------------------------------------------------------
+def _nav() -> List[Tuple[str, str]]:
+    return [("Übersicht", "../index.html")] + [(s, fname) for s, (_, fname, _) in SECTIONS.items()]
+
+
+def export_one(trip_id: int, trip_name: str, section: str, out_dir: Path) -> Tuple[str, List[str]]:
+    """Build one page in this (worker) process; returns (path relative to out_dir, unfetched asset URLs)."""
+    os.environ["AUSFLUG_INLINE_ASSETS"] = "1"  # one self-contained file; no static/ server
+    module, fname, _ = SECTIONS[section]
+    page = importlib.import_module(module).export_page(trip_id)
+    failed: List[str] = []
+    assets = out_dir / "assets"
+    map_doc = bundle(page.map.get_root().render(), assets, "../assets/", failed) if page.map is not None else None
+    doc = page_html(trip_name, page, _nav(), section, map_doc)
+    rel = f"trip-{trip_id}/{fname}"
+    (out_dir / rel).parent.mkdir(parents=True, exist_ok=True)
+    _write_atomic(out_dir / rel, doc.encode("utf-8"))
+    return rel, failed
+
+
+def export(
+    out_dir: Path = DEFAULT_OUT,
+    *,
+    trip_ids: Optional[Sequence[int]] = None,
+    sections: Optional[Sequence[str]] = None,
+    workers: int = os.cpu_count() or 2,
+    force: bool = False,
+) -> Dict[str, Any]:
+    from lib.trip_store import trip_store
+
+    trips = {t: name for t, (name, _) in trip_store().locations().items() if trip_ids is None or t in trip_ids}
+    sections = list(sections or SECTIONS)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = out_dir / MANIFEST
+    manifest = json.loads(manifest_path.read_text()) if manifest_path.exists() and not force else {}
+
+    addresses, tracks = warm_caches(list(trips), sections, workers)
+
+    todo, skipped = [], 0
+    for trip_id in trips:
+        for section in sections:
+            key = f"{trip_id}/{section}"
+            digest = page_inputs(trip_id, section)
+            entry = manifest.get(key)
+            if entry and entry["inputs"] == digest and (out_dir / entry["path"]).exists():
+                skipped += 1
+            else:
+                todo.append((key, digest, trip_id, section))
+
+    errors: Dict[str, str] = {}
+    unfetched: set = set()
+    with ProcessPoolExecutor(max_workers=max(1, min(workers, len(todo)))) as pool:
+        futures = {pool.submit(export_one, t, trips[t], s, out_dir): (key, digest) for key, digest, t, s in todo}
+        for fut in as_completed(futures):
+            key, digest = futures[fut]
+            try:
+                rel, failed = fut.result()
+            except Exception as e:
+                errors[key] = f"{type(e).__name__}: {e}"
+                manifest.pop(key, None)
+                continue
+            unfetched.update(failed)
+            manifest[key] = {"inputs": digest, "path": rel}
+            _write_atomic(manifest_path, json.dumps(manifest, indent=1, sort_keys=True).encode("utf-8"))
+
+    _write_atomic(out_dir / "index.html", index_html(trips, out_dir).encode("utf-8"))
+    return {"pages": len(todo) - len(errors), "skipped": skipped, "errors": errors,
+            "unbundled_assets": sorted(unfetched), "addresses": addresses, "tracks": tracks}
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Export every trip and section as standalone HTML pages.")
+    parser.add_argument("--out", type=Path, default=DEFAULT_OUT)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--trips", type=lambda s: [int(x) for x in s.split(",") if x], help="trip ids (default: all)")
+    parser.add_argument("--sections", type=lambda s: [x for x in s.split(",") if x], help=f"of {', '.join(SECTIONS)}")
+    parser.add_argument("--force", action="store_true", help="rebuild pages even if their inputs are unchanged")
+    args = parser.parse_args(argv)
+    unknown = set(args.sections or ()) - set(SECTIONS)
+    if unknown:
+        parser.error(f"unknown sections: {', '.join(sorted(unknown))}")
+
+    t0 = time.perf_counter()
+    stats = export(args.out, trip_ids=args.trips, sections=args.sections, workers=args.workers, force=args.force)
+    print(f"{stats['pages']} pages written, {stats['skipped']} unchanged, {len(stats['errors'])} failed "
+          f"({stats['addresses']} addresses, {stats['tracks']} tracks) in {time.perf_counter() - t0:.1f}s -> {args.out}")
+    for key, err in sorted(stats["errors"].items()):
+        print(f"  {key}: {err}")
+    if stats["unbundled_assets"]:
+        print(f"  {len(stats['unbundled_assets'])} assets could not be fetched and stay CDN links")
+    if stats["errors"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+# lib/spatial_index.py
+from __future__ import annotations
+
+import math
+import threading
+from collections import OrderedDict
+from typing import Iterable, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from lib.geo import haversine_m
+from lib.map_cache import fingerprint
+
+CELL_DEG = 0.05              # grid cell edge (~5.5 km north-south)
+_KM_PER_DEG_LAT = 111.2
+
+Hits = Tuple[np.ndarray, np.ndarray]  # (row indices, distances in km), nearest first
+
+
+def _cells(lat: np.ndarray, lon: np.ndarray, cell_deg: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Unwrapped (row, column) cell numbers; columns are taken modulo the grid width by callers."""
+    return np.floor(lat / cell_deg).astype(np.int64), np.floor((lon + 180.0) / cell_deg).astype(np.int64)
+
+
+class PlaceIndex:
+    """Uniform lat/lon grid over point rows, for radius and k-nearest queries.
+
+    Points are sorted by cell key, so every grid row of a query box is one
+    contiguous slice found with searchsorted; only those candidates get an
+    exact (vectorized) great-circle distance. Rows without coordinates are
+    kept out of the grid but keep their row index.
+    """
+
+    def __init__(
+        self,
+        lat: Sequence[Optional[float]],
+        lon: Sequence[Optional[float]],
+        kinds: Optional[Sequence[str]] = None,
+        *,
+        cell_deg: float = CELL_DEG,
+    ) -> None:
+        lat_a = np.asarray(lat, dtype=np.float64)
+        lon_a = np.asarray(lon, dtype=np.float64)
+        self.size = len(lat_a)
+        self.cell_deg = cell_deg
+        self._ncols = max(1, int(round(360.0 / cell_deg)))
+        self.kinds = np.asarray(kinds if kinds is not None else [""] * self.size, dtype=object)
+
+        ids = np.flatnonzero(np.isfinite(lat_a) & np.isfinite(lon_a))
+        ci, cj = _cells(lat_a[ids], lon_a[ids], cell_deg)
+        keys = ci * self._ncols + cj % self._ncols
+        order = np.argsort(keys, kind="stable")
+        self._keys = keys[order]
+        self._ids = ids[order]
+        self._coords = np.column_stack([lat_a[self._ids], lon_a[self._ids]])
+
+    @classmethod
+    def from_rows(cls, rows: Sequence[Mapping], *, kind_key: str = "kind", **kwargs) -> "PlaceIndex":
+        """Index rows with "lat"/"lon" (None when not geocoded); row i keeps index i."""
+        def num(v: object) -> float:
+            return math.nan if v is None else float(v)
+        return cls(
+            [num(r.get("lat")) for r in rows],
+            [num(r.get("lon")) for r in rows],
+            [r.get(kind_key, "") for r in rows],
+            **kwargs,
+        )
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def _candidates(self, lat: float, lon: float, radius_km: float) -> np.ndarray:
+        """Positions (into the sorted arrays) of points in the cells overlapping the query box."""
+        dlat = radius_km / _KM_PER_DEG_LAT
+        coslat = math.cos(math.radians(min(abs(lat) + dlat, 89.9)))
+        dlon = radius_km / (_KM_PER_DEG_LAT * coslat)
+        if dlon >= 180.0:
+            return np.arange(len(self._ids))
+        (i0, i1), (j0, j1) = _cells(np.array([lat - dlat, lat + dlat]), np.array([lon - dlon, lon + dlon]), self.cell_deg)
+        n = self._ncols
+        rows = np.arange(i0, i1 + 1) * n
+        # Boxes crossing the antimeridian wrap around into two column ranges.
+        if j1 - j0 + 1 >= n:
+            spans = [(0, n - 1)]
+        elif j0 % n > j1 % n:
+            spans = [(j0 % n, n - 1), (0, j1 % n)]
+        else:
+            spans = [(j0 % n, j1 % n)]
+        chunks = []
+        for lo_j, hi_j in spans:
+            lo = np.searchsorted(self._keys, rows + lo_j, side="left")
+            hi = np.searchsorted(self._keys, rows + hi_j, side="right")
+            chunks += [np.arange(a, b) for a, b in zip(lo, hi) if b > a]
+        return np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.int64)
+
+    def _filter_kinds(self, pos: np.ndarray, kinds: Optional[Iterable[str]]) -> np.ndarray:
+        if kinds is None:
+            return pos
+        return pos[np.isin(self.kinds[self._ids[pos]], list(kinds))]
+
+    def within(self, lat: float, lon: float, radius_km: float, *, kinds: Optional[Iterable[str]] = None) -> Hits:
+        """All rows within `radius_km` of (lat, lon), nearest first."""
+        pos = self._filter_kinds(self._candidates(lat, lon, radius_km), kinds)
+        dist = haversine_m(self._coords[pos], np.array([lat, lon])) / 1000
+        keep = dist <= radius_km
+        pos, dist = pos[keep], dist[keep]
+        order = np.argsort(dist, kind="stable")
+        return self._ids[pos[order]], dist[order]
+
+    def nearest(self, lat: float, lon: float, k: int, *, kinds: Optional[Iterable[str]] = None) -> Hits:
+        """The k rows closest to (lat, lon); grows the search radius until k are found."""
+        radius = self.cell_deg * _KM_PER_DEG_LAT
+        while True:
+            ids, dist = self.within(lat, lon, radius, kinds=kinds)
+            # Everything within `radius` is known, so the k closest of them are exact.
+            if len(ids) >= k or radius > math.pi * 6_371.0:
+                return ids[:k], dist[:k]
+            radius *= 2
+
+    def distances(self, lat: float, lon: float) -> np.ndarray:
+        """Distance in km from (lat, lon) for every row, NaN where a row has no coordinates."""
+        out = np.full(self.size, np.nan)
+        out[self._ids] = haversine_m(self._coords, np.array([lat, lon])) / 1000
+        return out
+
+
+def anchor_point(camps: Sequence[Mapping], fallback: Tuple[float, float]) -> Tuple[float, float]:
+    """Mean campsite position of a trip, else `fallback` (the trip center)."""
+    pts = [(float(c["lat"]), float(c["lon"])) for c in camps if c.get("lat") is not None and c.get("lon") is not None]
+    if not pts:
+        return float(fallback[0]), float(fallback[1])
+    return sum(p[0] for p in pts) / len(pts), sum(p[1] for p in pts) / len(pts)
+
+
+_cache: "OrderedDict[Tuple[int, str], PlaceIndex]" = OrderedDict()
+_cache_lock = threading.Lock()
+_CACHE_SIZE = 32
+
+
+def trip_index(trip_id: int, tables: Mapping[str, Sequence[Mapping]]) -> Tuple[PlaceIndex, List[Mapping]]:
+    """Index over all geocoded rows of a trip, {kind: rows} -> (index, rows in index order).
+
+    Cached per (trip, content), so reruns and other sections reuse it.
+    """
+    rows: List[Mapping] = [dict(r, kind=kind) for kind, table in tables.items() for r in table]
+    key = (trip_id, fingerprint([(r["kind"], r.get("name"), r.get("lat"), r.get("lon")) for r in rows]))
+    with _cache_lock:
+        hit = _cache.get(key)
+        if hit is not None:
+            _cache.move_to_end(key)
+            return hit, rows
+    index = PlaceIndex.from_rows(rows)
+    with _cache_lock:
+        _cache[key] = index
+        while len(_cache) > _CACHE_SIZE:
+            _cache.popitem(last=False)
+    return index, rows
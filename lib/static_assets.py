@@ -0,0 +1,131 @@
+# lib/static_assets.py
+"""Map geometry as content-addressed files under static/ (Streamlit static serving).
+
+A layer's GeoJSON is written once to static/geo/<sha1>.geojson and the map
+only carries its URL, so the st_folium HTML stays small and the browser's
+HTTP cache (ETag/Last-Modified) serves repeat visits and remounts. The same
+content always maps to the same name; changed data gets a new one, and files
+nothing has published for MAX_AGE_S are deleted when the app starts (trip
+exports under EXPORT_DIR too).
+
+Needs `server.enableStaticServing = true` (see .streamlit/config.toml);
+without it, or with AUSFLUG_INLINE_ASSETS=1, layers are inlined as before.
+The marker icon sprite (lib.icons) is published the same way.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Mapping, Optional
+from urllib.parse import quote
+
+from lib.paths import ROOT
+
+STATIC_DIR = ROOT / "static"       # Streamlit serves <main.py dir>/static at /app/static/
+ASSET_DIR = STATIC_DIR / "geo"
+EXPORT_DIR = STATIC_DIR / "exports"  # lib.trip_export, one subdirectory per content hash
+_URL_PATH = "app/static/geo"
+MAX_AGE_S = 30 * 24 * 3600  # assets not published for this long are deleted at startup
+
+_write_lock = threading.Lock()
+
+
+def static_serving() -> bool:
+    """True if layers should be published as files instead of inlined."""
+    if os.environ.get("AUSFLUG_INLINE_ASSETS", "").lower() in ("1", "true", "yes"):
+        return False
+    try:
+        import streamlit as st
+
+        return bool(st.get_option("server.enableStaticServing"))
+    except Exception:
+        return False
+
+
+def _base_path() -> str:
+    try:
+        import streamlit as st
+
+        base = (st.get_option("server.baseUrlPath") or "").strip("/")
+    except Exception:
+        base = ""
+    return f"/{base}" if base else ""
+
+
+def encode(payload: Mapping[str, Any]) -> bytes:
+    """Compact, deterministic JSON (same content -> same bytes -> same name)."""
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False, sort_keys=True).encode("utf-8")
+
+
+def publish(payload: Mapping[str, Any], suffix: str = ".geojson") -> str:
+    """Write `payload` under its content hash (once) and return its URL path."""
+    return publish_bytes(encode(payload), suffix)
+
+
+def publish_bytes(blob: bytes, suffix: str) -> str:
+    """Like publish(), for a file that is already encoded (e.g. the icon sprite)."""
+    name = hashlib.sha1(blob).hexdigest()[:20] + suffix
+    path = ASSET_DIR / name
+    with _write_lock:
+        if path.exists():
+            os.utime(path)  # mark as in use for prune()
+        else:
+            ASSET_DIR.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_bytes(blob)
+            os.replace(tmp, path)
+    return f"{_base_path()}/{_URL_PATH}/{name}"
+
+
+def static_url(path: Path) -> str:
+    """URL of any file below STATIC_DIR."""
+    return f"{_base_path()}/app/static/{quote(path.relative_to(STATIC_DIR).as_posix())}"
+
+
+def asset_url(payload: Mapping[str, Any]) -> Optional[str]:
+    """URL of the published payload, or None when it has to be inlined."""
+    return publish(payload) if static_serving() else None
+
+
+def prune(max_age_s: float = MAX_AGE_S, asset_dir: Path = ASSET_DIR) -> int:
+    """Delete files below `asset_dir` not used for `max_age_s`, then empty subdirectories;
+    returns how many files were removed."""
+    cutoff = time.time() - max_age_s
+    removed = 0
+    for f in asset_dir.rglob("*"):
+        if f.suffix == ".tmp" or not f.is_file():
+            continue
+        try:
+            if f.stat().st_mtime < cutoff:
+                f.unlink()
+                removed += 1
+        except FileNotFoundError:
+            pass  # another process pruned it first
+    for d in sorted((d for d in asset_dir.rglob("*") if d.is_dir()), key=lambda d: len(d.parts), reverse=True):
+        try:
+            d.rmdir()
+        except OSError:
+            pass  # not empty
+    return removed
+
+
+_pruned = False
+
+
+def prune_once() -> None:
+    """prune() on the first call in this process (app startup); later calls do nothing.
+
+    Layers cached in memory keep their URLs without publishing again, so this
+    only runs before any of them exist.
+    """
+    global _pruned
+    with _write_lock:
+        if _pruned:
+            return
+        _pruned = True
+        for d in (ASSET_DIR, EXPORT_DIR):
+            prune(asset_dir=d)
@@ -0,0 +1,182 @@
+# lib/timing.py
+"""Per-rerun timing spans.
+
+    with span("geocode", addresses=len(rows)) as s:
+        ...
+        s.set(misses=3)
+    count("geocode.hit")
+
+Spans are no-ops (one ContextVar lookup) unless a trace is running. main.py
+starts one per rerun when AUSFLUG_TIMING=1 is set or the page is opened with
+?timing=1; at the end of the run the trace is shown in a sidebar panel and
+appended as one JSON line to AUSFLUG_TIMING_LOG (default .cache/timing.jsonl).
+"""
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from lib.paths import CACHE_DIR
+
+ENABLED = os.environ.get("AUSFLUG_TIMING", "").lower() in ("1", "true", "yes")
+LOG_PATH = Path(os.environ.get("AUSFLUG_TIMING_LOG", CACHE_DIR / "timing.jsonl"))
+
+# counter prefix -> rate reported in the log, from "<prefix>.hit" / "<prefix>.miss"
+HIT_RATES = ("geocode", "map_cache", "tracks")
+
+
+@dataclass
+class SpanRecord:
+    name: str
+    start_ms: float
+    ms: float
+    depth: int
+    attrs: Dict[str, Any]
+
+
+@dataclass
+class Trace:
+    page: str
+    wall: float = field(default_factory=time.time)
+    started: float = field(default_factory=time.perf_counter)
+    spans: List[SpanRecord] = field(default_factory=list)
+    counters: Dict[str, int] = field(default_factory=dict)
+    total_ms: float = 0.0
+    _depth: int = 0
+
+    def hit_rates(self) -> Dict[str, float]:
+        out = {}
+        for prefix in HIT_RATES:
+            hits, misses = self.counters.get(f"{prefix}.hit", 0), self.counters.get(f"{prefix}.miss", 0)
+            if hits + misses:
+                out[prefix] = hits / (hits + misses)
+        return out
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "ts": self.wall,
+            "page": self.page,
+            "total_ms": round(self.total_ms, 3),
+            "spans": [
+                {"name": s.name, "start_ms": round(s.start_ms, 3), "ms": round(s.ms, 3), "depth": s.depth, **s.attrs}
+                for s in self.spans
+            ],
+            "counters": self.counters,
+            "hit_rates": self.hit_rates(),
+        }
+
+
+_current: ContextVar[Optional[Trace]] = ContextVar("ausflug_trace", default=None)
+_log_lock = threading.Lock()
+
+
+class _NoopSpan:
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        return None
+
+    def set(self, **attrs: Any) -> None:
+        return None
+
+
+_NOOP = _NoopSpan()
+
+
+class _Span:
+    __slots__ = ("trace", "record", "t0")
+
+    def __init__(self, trace: Trace, name: str, attrs: Dict[str, Any]) -> None:
+        self.trace = trace
+        self.record = SpanRecord(name, 0.0, 0.0, 0, attrs)
+
+    def __enter__(self) -> "_Span":
+        self.t0 = time.perf_counter()
+        self.record.start_ms = (self.t0 - self.trace.started) * 1e3
+        self.record.depth = self.trace._depth
+        self.trace.spans.append(self.record)  # in start order, so nesting reads top-down
+        self.trace._depth += 1
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.record.ms = (time.perf_counter() - self.t0) * 1e3
+        self.trace._depth -= 1
+
+    def set(self, **attrs: Any) -> None:
+        self.record.attrs.update(attrs)
+
+
+def span(name: str, **attrs: Any) -> Any:
+    """Time a block within the current rerun's trace (no-op when none is running)."""
+    trace = _current.get()
+    return _NOOP if trace is None else _Span(trace, name, attrs)
+
+
+def count(name: str, n: int = 1) -> None:
+    trace = _current.get()
+    if trace is not None:
+        trace.counters[name] = trace.counters.get(name, 0) + n
+
+
+def active() -> bool:
+    """True while a trace is running; guard costly measurements (e.g. payload sizes) with it."""
+    return _current.get() is not None
+
+
+def start_run(page: str, *, force: bool = False) -> Optional[Trace]:
+    """Begin a trace for this rerun if timing is enabled (globally or by `force`)."""
+    if not (ENABLED or force):
+        _current.set(None)
+        return None
+    trace = Trace(page)
+    _current.set(trace)
+    return trace
+
+
+def finish_run(log_path: Optional[Path] = LOG_PATH) -> Optional[Trace]:
+    """End the running trace and append it to the JSON-lines log."""
+    trace = _current.get()
+    if trace is None:
+        return None
+    _current.set(None)
+    trace.total_ms = (time.perf_counter() - trace.started) * 1e3
+    if log_path is not None:
+        line = json.dumps(trace.to_json(), ensure_ascii=False, default=str)
+        with _log_lock:
+            log_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(log_path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+    return trace
+
+
+def render_overlay(trace: Trace) -> None:
+    """Sidebar panel with this rerun's breakdown."""
+    import pandas as pd
+    import streamlit as st
+
+    with st.sidebar.expander(f"⏱️ Timing: {trace.total_ms:.0f} ms ({trace.page})", expanded=True):
+        rows = [
+            {"Phase": "\u00a0\u00a0" * s.depth + s.name, "ms": round(s.ms, 1),
+             "Anteil": 100 * s.ms / trace.total_ms if trace.total_ms else 0.0,
+             "Details": ", ".join(f"{k}={v}" for k, v in s.attrs.items())}
+            for s in trace.spans
+        ]
+        st.dataframe(
+            pd.DataFrame(rows),
+            hide_index=True,
+            use_container_width=True,
+            column_config={"Anteil": st.column_config.ProgressColumn("Anteil", min_value=0, max_value=100, format="%.0f%%")},
+        )
+        rates = trace.hit_rates()
+        if rates or trace.counters:
+            st.caption(" · ".join(
+                [f"{k}: {v:.0%} Cache-Treffer" for k, v in rates.items()]
+                + [f"{k}={v}" for k, v in sorted(trace.counters.items()) if not k.endswith((".hit", ".miss"))]
+            ))
@@ -0,0 +1,281 @@
+# lib/track_catalog.py
+"""Catalog of every GPX file under gpx/, whether or not a trip links it.
+
+One scan records each track's content hash, start point, bounding box,
+length and a thinned copy of its vertices (one every ~SAMPLE_M along the
+track) under the cache dir: the entries as JSON, the samples as one .npy.
+Later scans only look at files whose (mtime, size) changed; unchanged
+content, also under a new name, is never parsed again. The samples go into a
+lib.spatial_index.PlaceIndex, so "tracks within X km of here" is one grid
+lookup however many files there are.
+
+    python -m lib.track_catalog [--near LAT LON KM]
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+
+from lib.geo import haversine_m
+from lib.hike_stats import compute_stats
+from lib.paths import CACHE_DIR, ROOT
+from lib.spatial_index import PlaceIndex
+from lib.timing import count, span
+from lib.tracks import Track, TrackStore, default_store
+
+GPX_DIR = ROOT / "gpx"
+CATALOG_VERSION = 1
+SAMPLE_M = 200.0  # sample spacing; distances to a track are exact to about half of this
+
+
+@dataclass(frozen=True)
+class CatalogEntry:
+    file: str                          # relative to the repo root, e.g. "gpx/wasserfallsteig.gpx"
+    sha1: str
+    points: int
+    length_km: float
+    start: Optional[Tuple[float, float]]               # first vertex (lat, lon)
+    bbox: Optional[Tuple[float, float, float, float]]  # south, west, north, east
+    samples: np.ndarray = field(compare=False, repr=False)  # (n, 2) thinned vertices, for distance queries
+
+    @property
+    def name(self) -> str:
+        return Path(self.file).stem
+
+
+def _rel(path: Union[str, Path]) -> str:
+    """Catalog key of a file: relative to the repo root where possible, absolute otherwise."""
+    p = Path(ROOT / path)
+    p = p if p.is_absolute() and ".." not in p.parts else p.resolve()
+    try:
+        return p.relative_to(ROOT).as_posix()
+    except ValueError:
+        return p.as_posix()
+
+
+def _samples(coords: np.ndarray) -> np.ndarray:
+    """The first vertex of every SAMPLE_M stretch along the track, plus the last vertex."""
+    if len(coords) < 2:
+        return coords
+    along = np.concatenate([[0.0], np.cumsum(haversine_m(coords[:-1], coords[1:]))])
+    _, first = np.unique(np.floor(along / SAMPLE_M), return_index=True)
+    return coords[np.append(first, len(coords) - 1)]
+
+
+def _entry(file: str, sha1: str, track: Track, length_km: float) -> CatalogEntry:
+    coords = np.asarray(track.coords, dtype=np.float64)
+    if not len(coords):
+        return CatalogEntry(file, sha1, 0, 0.0, None, None, np.zeros((0, 2)))
+    (s, w), (n, e) = track.bounds
+    return CatalogEntry(
+        file, sha1, len(coords), round(length_km, 3),
+        (float(coords[0, 0]), float(coords[0, 1])), (s, w, n, e), _samples(coords),
+    )
+
+
+class TrackCatalog:
+    """Persisted {file: CatalogEntry} for a directory of GPX files, with a spatial index."""
+
+    def __init__(
+        self, directory: Union[str, Path] = GPX_DIR, path: Optional[Union[str, Path]] = None,
+        *, store: Optional[TrackStore] = None,
+    ) -> None:
+        self.directory = Path(directory).resolve()
+        if path is None:  # one catalog per directory
+            tag = "" if self.directory == GPX_DIR else "." + hashlib.sha1(str(self.directory).encode()).hexdigest()[:12]
+            path = CACHE_DIR / f"gpx_catalog{tag}.json"
+        self.path = Path(path)
+        self._samples_path = self.path.with_suffix(".samples.npy")
+        self.store = store or default_store()
+        self._lock = threading.Lock()
+        self._entries: Dict[str, CatalogEntry] = {}
+        self._dir_mtime: Optional[int] = None
+        self._scanned = False
+        self._index: Optional[Tuple[PlaceIndex, np.ndarray, List[CatalogEntry]]] = None
+        try:
+            self._entries = self._read()
+        except (OSError, ValueError, KeyError, TypeError):
+            pass  # missing or torn: the first scan rebuilds it from the track cache
+
+    def _read(self) -> Dict[str, CatalogEntry]:
+        data = json.loads(self.path.read_text())
+        if data.get("version") != CATALOG_VERSION:
+            return {}
+        rows = data["files"]
+        samples = np.load(self._samples_path)
+        counts = [r["samples"] for r in rows]
+        if sum(counts) != len(samples):
+            raise ValueError("catalog and samples do not match")
+        parts = np.split(samples, np.cumsum(counts)[:-1]) if rows else []
+        return {
+            r["file"]: CatalogEntry(
+                r["file"], r["sha1"], r["points"], r["length_km"],
+                tuple(r["start"]) if r["start"] else None, tuple(r["bbox"]) if r["bbox"] else None, part,
+            )
+            for r, part in zip(rows, parts)
+        }
+
+    def _write(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        entries = list(self._entries.values())
+        suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        tmp = self._samples_path.with_suffix(suffix)
+        with open(tmp, "wb") as f:
+            np.save(f, np.concatenate([e.samples for e in entries]) if entries else np.zeros((0, 2)))
+        os.replace(tmp, self._samples_path)
+        rows = [
+            {"file": e.file, "sha1": e.sha1, "points": e.points, "length_km": e.length_km,
+             "start": e.start, "bbox": e.bbox, "samples": len(e.samples)}
+            for e in entries
+        ]
+        tmp = self.path.with_suffix(suffix)
+        tmp.write_text(json.dumps({"version": CATALOG_VERSION, "files": rows}))
+        os.replace(tmp, self.path)  # atomic; a reader catching the two files out of step rescans
+
+    def scan(self) -> Dict[str, Union[int, Dict[str, Exception]]]:
+        """Bring the catalog up to date with the directory; only new or changed files are parsed.
+
+        Returns counts of added / updated / removed / unchanged files and
+        {file: error} for files that could not be read (left out of the catalog).
+        """
+        with self._lock, span("catalog.scan") as s:
+            try:
+                dir_mtime: Optional[int] = self.directory.stat().st_mtime_ns
+                files = sorted(_rel(p) for p in self.directory.rglob("*.gpx"))
+            except FileNotFoundError:
+                dir_mtime, files = None, []
+            errors: Dict[str, Exception] = {}
+            digests: Dict[str, str] = {}
+            for f, digest in self.store.digest_many(files).items():
+                if isinstance(digest, OSError):
+                    errors[f] = digest
+                else:
+                    digests[f] = digest
+            by_sha1 = {e.sha1: e for e in self._entries.values()}
+
+            entries: Dict[str, CatalogEntry] = {}
+            todo: List[str] = []
+            for f, sha1 in digests.items():
+                old = self._entries.get(f) or by_sha1.get(sha1)  # renamed files keep their entry
+                if old is not None and old.sha1 == sha1:
+                    entries[f] = old if old.file == f else replace(old, file=f)
+                else:
+                    todo.append(f)
+
+            loaded = self.store.load_many(todo)
+            tracks = {f: t for f, t in loaded.items() if isinstance(t, Track)}
+            errors.update({f: t for f, t in loaded.items() if isinstance(t, Exception)})
+            for (f, track), stats in zip(tracks.items(), compute_stats(list(tracks.values()))):
+                entries[f] = _entry(f, digests[f], track, stats.length_km)
+
+            result = {
+                "added": sum(f not in self._entries for f in tracks),
+                "updated": sum(f in self._entries for f in tracks),
+                "removed": len(set(self._entries) - set(entries)),
+                "unchanged": len(entries) - len(tracks),
+                "errors": errors,
+            }
+            changed = bool(tracks) or entries.keys() != self._entries.keys()
+            self._entries = dict(sorted(entries.items()))
+            self._dir_mtime, self._scanned = dir_mtime, True
+            if changed:
+                self._index = None
+                self._write()
+            count("catalog.parsed", len(tracks))
+            s.set(files=len(files), parsed=len(tracks))
+            return result
+
+    def refresh(self) -> None:
+        """Scan on first use and whenever files were added, removed or renamed since.
+
+        In-place edits of a file do not touch the directory; the next scan()
+        (e.g. from the command line) picks those up.
+        """
+        try:
+            mtime = self.directory.stat().st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if not self._scanned or mtime != self._dir_mtime:
+            self.scan()
+
+    def entries(self) -> List[CatalogEntry]:
+        return list(self._entries.values())
+
+    def get(self, file: Union[str, Path]) -> Optional[CatalogEntry]:
+        return self._entries.get(_rel(file))
+
+    def _spatial(self) -> Tuple[PlaceIndex, np.ndarray, List[CatalogEntry]]:
+        """(index over all samples, owning entry number per sample, entries); built once per catalog state."""
+        with self._lock:
+            if self._index is None:
+                entries = [e for e in self._entries.values() if len(e.samples)]
+                pts = np.concatenate([e.samples for e in entries]) if entries else np.zeros((0, 2))
+                owner = np.repeat(np.arange(len(entries)), [len(e.samples) for e in entries])
+                self._index = (PlaceIndex(pts[:, 0], pts[:, 1]), owner, entries)
+            return self._index
+
+    def near(
+        self, lat: float, lon: float, radius_km: float, *, exclude: Iterable[Union[str, Path]] = ()
+    ) -> List[Tuple[CatalogEntry, float]]:
+        """Tracks passing within `radius_km` of (lat, lon), with their distance in km, nearest first."""
+        index, owner, entries = self._spatial()
+        ids, dist = index.within(lat, lon, radius_km)
+        # Hits are nearest first, so a track's first hit is its distance.
+        tracks, first = np.unique(owner[ids], return_index=True)
+        skip = {_rel(f) for f in exclude}
+        hits = [(entries[t], float(dist[i])) for t, i in zip(tracks, first)]
+        return sorted((h for h in hits if h[0].file not in skip), key=lambda h: h[1])
+
+
+_default: Optional[TrackCatalog] = None
+_default_lock = threading.Lock()
+
+
+def default_catalog() -> TrackCatalog:
+    """The catalog of gpx/, refreshed when its file list changed."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = TrackCatalog()
+    _default.refresh()
+    return _default
+
+
+def tracks_near(
+    lat: float, lon: float, radius_km: float, *, exclude: Iterable[Union[str, Path]] = ()
+) -> List[Tuple[CatalogEntry, float]]:
+    """TrackCatalog.near on the gpx/ catalog."""
+    return default_catalog().near(lat, lon, radius_km, exclude=exclude)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Index every GPX file under gpx/ for nearby-track lookups.")
+    parser.add_argument("--dir", type=Path, default=GPX_DIR)
+    parser.add_argument("--near", type=float, nargs=3, metavar=("LAT", "LON", "KM"), help="list tracks near a point")
+    args = parser.parse_args(argv)
+    catalog = TrackCatalog(args.dir)
+    t0 = time.perf_counter()
+    r = catalog.scan()
+    print(
+        f"{catalog.path}: {len(catalog.entries())} tracks ({r['added']} added, {r['updated']} updated, "
+        f"{r['removed']} removed, {r['unchanged']} unchanged) in {time.perf_counter() - t0:.2f}s"
+    )
+    for f, e in r["errors"].items():  # type: ignore[union-attr]
+        print(f"  skipped {f}: {e}")
+    if args.near:
+        lat, lon, km = args.near
+        for e, d in catalog.near(lat, lon, km):
+            print(f"  {d:6.1f} km  {e.length_km:6.1f} km long  {e.file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,355 @@
+# lib/tracks.py
+from __future__ import annotations
+
+import hashlib
+import json
+import math
+import multiprocessing
+import os
+import threading
+import xml.etree.ElementTree as ET
+from array import array
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterable, List, Mapping, Optional, Tuple, Union
+
+import numpy as np
+
+from lib.paths import CACHE_DIR, ROOT
+from lib.timing import count, span
+
+if TYPE_CHECKING:  # the geo stack is only needed for extract_track_coords
+    from shapely.geometry.base import BaseGeometry
+
+_ARRAYS = ("coords", "ele", "time", "offsets")
+FORMAT_VERSION = 2  # part of the cached array names; bump when parse_gpx's output changes
+PARSE_WORKERS = min(4, os.cpu_count() or 1)
+POOL_MIN_BYTES = 4 << 20  # below this, parsing in-process beats starting worker processes
+
+
+def extract_track_coords(geoms: Iterable[BaseGeometry]) -> Tuple[np.ndarray, np.ndarray]:
+    """All (Multi)LineString vertices as one (N, 2) [lat, lon] array plus part offsets.
+
+    Part k is coords[offsets[k]:offsets[k + 1]]. Segments of a MultiLineString
+    stay separate parts, so gaps between them are never bridged.
+    """
+    import shapely
+
+    parts = shapely.get_parts(np.asarray(list(geoms), dtype=object))
+    parts = parts[shapely.get_type_id(parts) == shapely.GeometryType.LINESTRING]
+    xy, idx = shapely.get_coordinates(parts, return_index=True)
+    counts = np.bincount(idx, minlength=len(parts))
+    offsets = np.concatenate([[0], np.cumsum(counts[counts > 0])]).astype(np.int64)
+    return np.ascontiguousarray(xy[:, ::-1], dtype=np.float64), offsets
+
+
+def coords_bounds(coords: np.ndarray) -> List[List[float]]:
+    """(N, 2) [lat, lon] -> [[south, west], [north, east]] in one pass per axis."""
+    lo, hi = coords.min(axis=0), coords.max(axis=0)
+    return [[float(lo[0]), float(lo[1])], [float(hi[0]), float(hi[1])]]
+
+
+@dataclass(frozen=True)
+class Track:
+    """One GPX file's vertices; arrays may be read-only memory maps."""
+
+    coords: np.ndarray   # (N, 2) lat, lon
+    ele: np.ndarray      # (N,) meters, NaN where missing
+    time: np.ndarray     # (N,) seconds since epoch, NaN where missing
+    offsets: np.ndarray  # (parts + 1,) start of each track segment in coords
+
+    def __len__(self) -> int:
+        return len(self.coords)
+
+    @property
+    def bounds(self) -> List[List[float]]:
+        """[[south, west], [north, east]]"""
+        return coords_bounds(self.coords)
+
+    def parts(self) -> List[np.ndarray]:
+        """One (n, 2) view per segment."""
+        return [self.coords[a:b] for a, b in zip(self.offsets[:-1], self.offsets[1:])]
+
+
+def _float(text: Optional[str]) -> float:
+    try:
+        return float(text)  # type: ignore[arg-type]
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def _seconds(text: Optional[str]) -> float:
+    """ISO 8601 timestamp -> seconds since epoch (UTC if no offset), NaN if unparsable."""
+    try:
+        t = datetime.fromisoformat(text.strip())  # type: ignore[union-attr]
+    except (AttributeError, ValueError):
+        return math.nan
+    if t.tzinfo is None:
+        t = t.replace(tzinfo=timezone.utc)
+    return t.timestamp()
+
+
+def parse_gpx(path: Union[str, Path]) -> Track:
+    """Stream a GPX file's <trkpt>s into a Track with an incremental XML parser.
+
+    Every element is dropped from the tree as soon as it has been read, so
+    memory is bounded by the output arrays (32 bytes per point), not by the
+    file: a multi-day 100 MB track costs what its vertices do. Each <trkseg>
+    is one part, like the segments of GDAL's "tracks" layer.
+    """
+    lat, lon, ele, times = array("d"), array("d"), array("d"), array("d")
+    offsets = [0]
+    events = ET.iterparse(path, events=("start", "end"))
+    _, root = next(events)
+    ns = root.tag[: root.tag.index("}") + 1] if root.tag.startswith("{") else ""  # GPX 1.0 or 1.1
+    trkpt, trkseg, ele_tag, time_tag = ns + "trkpt", ns + "trkseg", ns + "ele", ns + "time"
+    stack = [root]
+    for event, elem in events:
+        if event == "start":
+            stack.append(elem)
+            continue
+        stack.pop()
+        tag = elem.tag
+        if tag == trkpt:
+            y, x = _float(elem.get("lat")), _float(elem.get("lon"))
+            if y == y and x == x:  # skip points without a position
+                e = t = math.nan
+                for child in elem:
+                    if child.tag == ele_tag:
+                        e = _float(child.text)
+                    elif child.tag == time_tag:
+                        t = _seconds(child.text)
+                lat.append(y)
+                lon.append(x)
+                ele.append(e)
+                times.append(t)
+        elif tag == trkseg:
+            if len(lat) > offsets[-1]:
+                offsets.append(len(lat))
+        elif stack and stack[-1].tag == trkpt:
+            continue  # a point's children are read with the point
+        if stack:
+            stack[-1].remove(elem)  # always the only child left, so this is O(1)
+    if len(lat) > offsets[-1]:  # points after the last </trkseg>, e.g. a <trkpt> directly in <trk>
+        offsets.append(len(lat))
+
+    coords = np.empty((len(lat), 2), dtype=np.float64)
+    coords[:, 0] = np.frombuffer(lat, dtype=np.float64)
+    coords[:, 1] = np.frombuffer(lon, dtype=np.float64)
+    return Track(coords, np.array(ele, dtype=np.float64), np.array(times, dtype=np.float64),
+                 np.array(offsets, dtype=np.int64))
+
+
+def _sha1(path: Path) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class TrackStore:
+    """Parse each GPX once; keep its arrays as .npy files and memory-map them.
+
+    A file is looked up by (path, mtime, size) first. If that changed, the
+    content hash decides whether the cached arrays can be reused, so touching
+    or re-checking out a file does not force a re-parse. Reruns within a
+    process return the same mapped Track without touching the disk again.
+    The arrays' names carry FORMAT_VERSION, so a parser change re-parses
+    everything instead of serving arrays in the old layout.
+    """
+
+    def __init__(self, cache_dir: Union[str, Path] = CACHE_DIR / "tracks") -> None:
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._index_path = self.cache_dir / "index.json"
+        self._lock = threading.Lock()
+        self._loaded: Dict[str, Track] = {}  # sha1 -> mapped track
+        try:
+            self._index: Dict[str, dict] = json.loads(self._index_path.read_text())
+        except (FileNotFoundError, ValueError):
+            self._index = {}
+
+    def _files(self, digest: str) -> Dict[str, Path]:
+        return {name: self.cache_dir / f"{digest}.v{FORMAT_VERSION}.{name}.npy" for name in _ARRAYS}
+
+    def drop_stale(self) -> int:
+        """Delete arrays cached by another FORMAT_VERSION; returns how many files were removed."""
+        removed = 0
+        for p in self.cache_dir.glob("*.npy"):
+            if p.name.split(".")[1] != f"v{FORMAT_VERSION}":
+                p.unlink(missing_ok=True)
+                removed += 1
+        return removed
+
+    def _save(self, digest: str, track: Track) -> None:
+        for name, path in self._files(digest).items():
+            tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            with open(tmp, "wb") as f:
+                np.save(f, getattr(track, name))
+            os.replace(tmp, path)  # atomic for concurrent readers
+
+    def _map(self, digest: str) -> Optional[Track]:
+        arrays = {}
+        for name, path in self._files(digest).items():
+            try:
+                arrays[name] = np.load(path, mmap_mode="r")
+            except FileNotFoundError:
+                return None
+            except ValueError:  # zero-length arrays cannot be mapped
+                arrays[name] = np.load(path)
+        return Track(**arrays)
+
+    def _write_index(self) -> None:
+        tmp = self._index_path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_text(json.dumps(self._index))
+        os.replace(tmp, self._index_path)
+
+    def digest(self, path: Union[str, Path]) -> Tuple[str, bool]:
+        """Content hash of `path` and whether the index had to be updated."""
+        p = Path(ROOT / path).resolve()
+        st = p.stat()
+        key = str(p)
+        entry = self._index.get(key)
+        if entry and entry["mtime_ns"] == st.st_mtime_ns and entry["size"] == st.st_size:
+            return entry["sha1"], False
+        sha1 = _sha1(p)
+        self._index[key] = {"mtime_ns": st.st_mtime_ns, "size": st.st_size, "sha1": sha1}
+        return sha1, True
+
+    def digest_many(self, paths: Iterable[Union[str, Path]]) -> Dict[str, Union[str, OSError]]:
+        """{path: content hash, or the OSError reading it raised}; the index is saved once."""
+        out: Dict[str, Union[str, OSError]] = {}
+        with self._lock:
+            changed = False
+            for path in paths:
+                try:
+                    out[str(path)], c = self.digest(path)
+                except OSError as e:
+                    out[str(path)] = e
+                    continue
+                changed |= c
+            if changed:
+                self._write_index()
+        return out
+
+    def load(self, path: Union[str, Path]) -> Track:
+        with self._lock:
+            digest, changed = self.digest(path)
+            if changed:
+                self._write_index()
+            track = self._loaded.get(digest)
+        if track is not None:
+            count("tracks.hit")
+            return track
+        # Parse outside the lock so different files load concurrently.
+        track = self._map(digest)
+        if track is None:
+            count("tracks.miss")
+            with span("gpx.parse", file=str(path)):
+                self._save(digest, parse_gpx(ROOT / path))
+            track = self._map(digest)
+        else:
+            count("tracks.hit")
+        with self._lock:
+            return self._loaded.setdefault(digest, track)
+
+    def load_many(
+        self, paths: Iterable[Union[str, Path]], *, max_workers: int = PARSE_WORKERS
+    ) -> Dict[str, Union[Track, Exception]]:
+        """{path: its Track, or the exception loading it raised}; one bad file only fails its own entry.
+
+        Cached files are mapped right away. The others are parsed in worker
+        processes (parsing is CPU-bound Python) when there are several and
+        they are big enough to pay for starting the pool, else in-process.
+        """
+        out: Dict[str, Union[Track, Exception]] = {}
+        todo: Dict[str, List[str]] = {}  # digest -> paths with that content
+        for path, digest in self.digest_many(paths).items():
+            if isinstance(digest, OSError):
+                out[path] = digest
+            else:
+                todo.setdefault(digest, []).append(path)
+        with self._lock:
+            loaded = {d: self._loaded[d] for d in todo if d in self._loaded}
+
+        mapped = {d: loaded[d] if d in loaded else self._map(d) for d in todo}
+        misses = {d: ROOT / todo[d][0] for d, t in mapped.items() if t is None}
+        count("tracks.hit", len(todo) - len(misses))
+        count("tracks.miss", len(misses))
+        errors = self._parse_many(misses, max_workers) if misses else {}
+
+        for digest, keys in todo.items():
+            track = mapped[digest]
+            if track is None and digest not in errors:
+                track = self._map(digest)
+            if track is None:
+                out.update(dict.fromkeys(keys, errors.get(digest) or FileNotFoundError(keys[0])))
+                continue
+            with self._lock:
+                track = self._loaded.setdefault(digest, track)
+            out.update(dict.fromkeys(keys, track))
+        return out
+
+    def _parse_many(self, files: Mapping[str, Path], max_workers: int) -> Dict[str, Exception]:
+        """Parse {digest: path} into the cache; returns {digest: error} for the files that failed."""
+        errors: Dict[str, Exception] = {}
+        size = sum(p.stat().st_size for p in files.values())
+        with span("gpx.parse", files=len(files), bytes=size):
+            if max_workers > 1 and len(files) > 1 and size >= POOL_MIN_BYTES:
+                # spawn: forking the threaded app server could copy a held lock into the child
+                ctx = multiprocessing.get_context("spawn")
+                with ProcessPoolExecutor(min(max_workers, len(files)), mp_context=ctx) as pool:
+                    futures = {pool.submit(_parse_into, str(self.cache_dir), d, str(p)): d for d, p in files.items()}
+                    for fut in as_completed(futures):
+                        try:
+                            fut.result()
+                        except Exception as e:
+                            errors[futures[fut]] = e
+            else:
+                for digest, path in files.items():
+                    try:
+                        self._save(digest, parse_gpx(path))
+                    except Exception as e:
+                        errors[digest] = e
+        return errors
+
+    def clear(self) -> None:
+        """Drop every cached track (the next load re-parses)."""
+        with self._lock:
+            for p in self.cache_dir.glob("*.npy"):
+                p.unlink()
+            self._index.clear()
+            self._loaded.clear()
+            self._write_index()
+
+
+_default: Optional[TrackStore] = None
+_default_lock = threading.Lock()
+
+
+def default_store() -> TrackStore:
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = TrackStore()
+            _default.drop_stale()
+        return _default
+
+
+def load_track(path: Union[str, Path]) -> Track:
+    return default_store().load(path)
+
+
+def load_tracks(paths: Iterable[Union[str, Path]], *, max_workers: int = PARSE_WORKERS) -> Dict[str, Union[Track, Exception]]:
+    """TrackStore.load_many on the default store."""
+    return default_store().load_many(paths, max_workers=max_workers)
+
+
+def _parse_into(cache_dir: str, digest: str, path: str) -> int:
+    """Worker process: parse one file into the cache dir; returns its number of points."""
+    track = parse_gpx(path)
+    TrackStore(cache_dir)._save(digest, track)
+    return len(track)
@@ -0,0 +1,237 @@
+# lib/trip_build.py
+"""Compile trip data ahead of time.
+
+    python -m lib.trip_build [--out PATH] [--full] [--workers N]
+
+Reads the place tables and HIKES from data.py, geocodes every address and
+parses every referenced GPX file, and writes one versioned Parquet artifact.
+Sections read coordinates and track geometry from it, so a page load against
+a fresh artifact makes no network calls and parses no XML.
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from lib.geocode_cache import normalize_address
+from lib.paths import ROOT
+from lib.tracks import Track, default_store, load_tracks
+
+Coords = Tuple[float, float]
+
+ARTIFACT_VERSION = 3  # 3: track offsets close the last segment (lib.tracks.FORMAT_VERSION 2)
+DEFAULT_ARTIFACT = ROOT / "build" / f"trip_data.v{ARTIFACT_VERSION}.parquet"
+_META_KEY = b"ausflug_artifact_version"
+_TRACK_COLUMNS = ("track_lat", "track_lon", "track_ele", "track_time", "track_offsets")
+
+# kind -> name of the list in data.py
+PLACE_TABLES = {
+    "restaurant": "restaurants",
+    "poi": "POIs",
+    "bakery": "bakery",
+    "supermarket": "supermarkt",
+}
+
+
+def file_hash(path: Union[str, Path]) -> str:
+    h = hashlib.sha1()
+    with open(ROOT / path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _read_previous(path: Path) -> Optional[pd.DataFrame]:
+    if not path.exists():
+        return None
+    table = pq.read_table(path)
+    meta = table.schema.metadata or {}
+    if meta.get(_META_KEY) != str(ARTIFACT_VERSION).encode():
+        return None
+    return table.to_pandas()
+
+
+# --- Build --------------------------------------------------------------------
+def _place_rows(prev: Optional[pd.DataFrame], workers: int) -> Tuple[List[dict], int]:
+    import data
+    from lib.geocode import geocode_many
+
+    rows: List[dict] = []
+    for kind, table in PLACE_TABLES.items():
+        for r in getattr(data, table, []):
+            address = r.get("address", "")
+            rows.append({
+                "kind": kind, "trip_id": r.get("trip_id"), "name": r.get("name", ""),
+                "address": address, "address_key": normalize_address(address),
+                "description": r.get("description", ""), "gmap_url": r.get("gmap_url", ""),
+            })
+
+    # Incremental: an address whose normalized key was resolved before is reused.
+    known: Dict[str, Coords] = {}
+    if prev is not None:
+        old = prev[prev["kind"] != "hike"]
+        known = {
+            k: (lat, lon)
+            for k, lat, lon in zip(old["address_key"], old["lat"], old["lon"])
+            if not (pd.isna(lat) or pd.isna(lon))  # failed lookups get another try
+        }
+    todo = [r["address"] for r in rows if r["address_key"] not in known]
+    resolved = geocode_many(todo, max_workers=workers)
+
+    for r in rows:
+        coords = known[r["address_key"]] if r["address_key"] in known else resolved.get(r["address"])
+        r["lat"], r["lon"] = coords if coords else (math.nan, math.nan)
+    return rows, sum(c is not None for c in resolved.values())  # newly resolved, not just looked up
+
+
+def _hike_rows(prev: Optional[pd.DataFrame], workers: int) -> Tuple[List[dict], int]:
+    import data
+
+    known: Dict[str, dict] = {}
+    if prev is not None:
+        old = prev[prev["kind"] == "hike"]
+        known = {row["file_hash"]: row for row in old.to_dict("records")}
+
+    hikes = list(data.HIKES)
+    hashes = [file_hash(h["file"]) for h in hikes]
+    todo = sorted({(h["file"], fh) for h, fh in zip(hikes, hashes) if fh not in known})
+
+    loaded = load_tracks([ROOT / f for f, _ in todo], max_workers=workers)
+    parsed: Dict[str, dict] = {}
+    for f, fh in todo:
+        track = loaded[str(ROOT / f)]
+        if isinstance(track, Exception):
+            raise track
+        parsed[fh] = {
+            "track_lat": track.coords[:, 0], "track_lon": track.coords[:, 1],
+            "track_ele": track.ele, "track_time": track.time, "track_offsets": track.offsets,
+        }
+
+    rows: List[dict] = []
+    for h, fh in zip(hikes, hashes):
+        arrays = parsed[fh] if fh in parsed else {k: v for k, v in known[fh].items() if k in _TRACK_COLUMNS}
+        lat, lon = arrays["track_lat"], arrays["track_lon"]
+        rows.append({
+            "kind": "hike", "trip_id": h.get("trip_id"), "name": h.get("name", ""),
+            "file": h["file"], "file_hash": fh,
+            "duration": h.get("duration", ""), "link": h.get("link", ""),
+            "lat": float(lat[0]) if len(lat) else math.nan,
+            "lon": float(lon[0]) if len(lon) else math.nan,
+            **{k: np.asarray(v).tolist() for k, v in arrays.items()},
+        })
+    return rows, len(todo)
+
+
+def build(out: Path = DEFAULT_ARTIFACT, *, full: bool = False, workers: int = 4) -> Dict[str, int]:
+    """Write the artifact; returns counts of places/hikes and how many were (re)resolved."""
+    prev = None if full else _read_previous(out)
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        places_job = pool.submit(_place_rows, prev, workers)
+        hikes_job = pool.submit(_hike_rows, prev, workers)
+        places, geocoded = places_job.result()
+        hikes, parsed = hikes_job.result()
+
+    df = pd.DataFrame(places + hikes)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    meta = dict(table.schema.metadata or {})
+    meta[_META_KEY] = str(ARTIFACT_VERSION).encode()
+    meta[b"ausflug_built_at"] = time.strftime("%Y-%m-%dT%H:%M:%S").encode()
+    out.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out.with_suffix(".tmp")
+    pq.write_table(table.replace_schema_metadata(meta), tmp)
+    tmp.replace(out)  # atomic: running servers never see a half-written file
+    return {"places": len(places), "geocoded": geocoded, "hikes": len(hikes), "parsed": parsed}
+
+
+# --- Load ---------------------------------------------------------------------
+class CompiledTrips:
+    """Lookup tables over a loaded artifact."""
+
+    def __init__(self, df: pd.DataFrame) -> None:
+        self.df = df
+        places = df[df["kind"] != "hike"]
+        self._coords: Dict[Tuple[str, int], Dict[str, Optional[Coords]]] = {}
+        for kind, trip_id, address, lat, lon in zip(
+            places["kind"], places["trip_id"], places["address"], places["lat"], places["lon"]
+        ):
+            coords = None if pd.isna(lat) or pd.isna(lon) else (float(lat), float(lon))
+            self._coords.setdefault((kind, int(trip_id)), {})[address] = coords
+        hikes = df[df["kind"] == "hike"]
+        self._tracks: Dict[str, Tuple[str, Track]] = {}
+        for row in hikes[["file", "file_hash", *_TRACK_COLUMNS]].itertuples(index=False):
+            coords = np.column_stack([row.track_lat, row.track_lon]).astype(np.float64).reshape(-1, 2)
+            self._tracks[row.file] = (row.file_hash, Track(
+                coords=coords,
+                ele=np.asarray(row.track_ele, dtype=np.float64),
+                time=np.asarray(row.track_time, dtype=np.float64),
+                offsets=np.asarray(row.track_offsets, dtype=np.int64),
+            ))
+
+    def coords(self, kind: str, trip_id: int) -> Dict[str, Optional[Coords]]:
+        """address -> coords (None = failed at build time) for one table and trip."""
+        return self._coords.get((kind, trip_id), {})
+
+    def track(self, file: str) -> Optional[Track]:
+        """Compiled track, or None when missing or the GPX changed since the build."""
+        hit = self._tracks.get(file)
+        if hit is None:
+            return None
+        # Same SHA-1 as file_hash(), but looked up by (mtime, size): no read unless the file changed.
+        digest = default_store().digest_many([file])[file]
+        if isinstance(digest, OSError) or hit[0] != digest:
+            return None
+        return hit[1]
+
+
+@lru_cache(maxsize=2)
+def _load(path: str, mtime_ns: int) -> Optional[CompiledTrips]:
+    df = _read_previous(Path(path))
+    return CompiledTrips(df) if df is not None else None
+
+
+def load_compiled(path: Path = DEFAULT_ARTIFACT) -> Optional[CompiledTrips]:
+    """The current artifact (reloaded when the file changes), or None."""
+    try:
+        mtime = path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+    return _load(str(path), mtime)
+
+
+def compiled_coords(kind: str, trip_id: int) -> Dict[str, Optional[Coords]]:
+    compiled = load_compiled()
+    return compiled.coords(kind, trip_id) if compiled else {}
+
+
+def compiled_track(file: str) -> Optional[Track]:
+    compiled = load_compiled()
+    return compiled.track(file) if compiled else None
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Compile trip coordinates and tracks into one artifact.")
+    parser.add_argument("--out", type=Path, default=DEFAULT_ARTIFACT)
+    parser.add_argument("--full", action="store_true", help="ignore the previous artifact and resolve everything")
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args(argv)
+    t0 = time.perf_counter()
+    stats = build(args.out, full=args.full, workers=args.workers)
+    print(
+        f"{args.out}: {stats['places']} places ({stats['geocoded']} geocoded), "
+        f"{stats['hikes']} hikes ({stats['parsed']} parsed) in {time.perf_counter() - t0:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+# lib/trip_export.py
+"""Trip downloads as GeoJSON, Parquet and GPX, built only when someone asks.
+
+A trip's places (camping, POIs, restaurants, bakeries, supermarkets) and
+hikes with their tracks are written to
+
+- GeoJSON: a Point per place, a MultiLineString per hike
+- Parquet: a row per place or hike, tracks as list columns (like lib.trip_build)
+- GPX: a <wpt> per place, a <trk> per hike
+- zip: all three
+
+Files go to static/exports/<content hash>/, keyed by everything they are
+built from, so repeated clicks, other sessions and other processes reuse the
+file until the data changes. Writers emit features, row groups and points
+in chunks straight to disk and the zip copies from disk, so nothing holds a
+whole export in memory. The app builds the zip only when asked to; with
+static serving the browser then fetches it from Streamlit's static handler,
+which streams it, otherwise the bytes go through st.download_button. Exports
+unused for lib.static_assets.MAX_AGE_S are pruned at app startup.
+"""
+from __future__ import annotations
+
+import math
+import os
+import re
+import threading
+import unicodedata
+import zipfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import IO, Any, Callable, Dict, Iterator, List, Optional, Tuple
+from xml.sax.saxutils import escape, quoteattr
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from lib.geocode_cache import MISS, default_cache
+from lib.map_cache import fingerprint
+from lib.static_assets import EXPORT_DIR, encode, static_serving, static_url
+from lib.timing import count, span
+from lib.tracks import Track, default_store, load_tracks
+
+Coords = Tuple[float, float]
+
+EXPORT_VERSION = 1
+CHUNK_ROWS = 1024  # places per Parquet row group, track points per GPX write
+
+PLACE_KINDS = ("camping", "poi", "restaurant", "bakery", "supermarket")
+GEOCODED = ("poi", "restaurant", "bakery", "supermarket")
+FORMATS: Dict[str, Tuple[str, str]] = {  # format -> (suffix, mime type)
+    "geojson": (".geojson", "application/geo+json"),
+    "parquet": (".parquet", "application/vnd.apache.parquet"),
+    "gpx": (".gpx", "application/gpx+xml"),
+    "zip": (".zip", "application/zip"),
+}
+
+_SCHEMA = pa.schema([
+    ("kind", pa.string()), ("name", pa.string()), ("description", pa.string()), ("address", pa.string()),
+    ("url", pa.string()), ("duration", pa.string()), ("lat", pa.float64()), ("lon", pa.float64()),
+    ("track_lat", pa.list_(pa.float64())), ("track_lon", pa.list_(pa.float64())),
+    ("track_ele", pa.list_(pa.float64())), ("track_time", pa.list_(pa.float64())),
+    ("track_offsets", pa.list_(pa.int64())),
+])
+
+
+# --- Data -----------------------------------------------------------------------
+@dataclass(frozen=True)
+class TripExport:
+    trip_id: int
+    name: str
+    center: Coords
+    places: List[Dict[str, Any]]                  # kind, name, ..., lat/lon (None when unknown)
+    hikes: List[Tuple[Dict[str, Any], Optional[Track]]]
+    digest: str                                   # content hash of all of the above
+
+    @property
+    def slug(self) -> str:
+        return _slug(self.name, self.trip_id)
+
+
+def _slug(name: str, trip_id: int) -> str:
+    """File name stem, e.g. "ausflug-tubingen"."""
+    ascii_name = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode()
+    return "ausflug-" + (re.sub(r"[^a-z0-9]+", "-", ascii_name.lower()).strip("-") or str(trip_id))
+
+
+def _place(kind: str, r: Dict[str, Any], coords: Optional[Coords]) -> Dict[str, Any]:
+    return {
+        "kind": kind, "name": r.get("name", ""), "description": r.get("description", ""),
+        "address": r.get("address", ""), "url": r.get("gmap_url", ""),
+        "lat": coords[0] if coords else None, "lon": coords[1] if coords else None,
+    }
+
+
+def collect(trip_id: int, *, resolve: bool = False) -> TripExport:
+    """Everything a trip's export holds. Without `resolve` only cached coordinates are
+    used (never blocks); with it, uncached addresses are geocoded first."""
+    from lib.geocode import geocode_many
+    from lib.trip_build import compiled_coords, compiled_track
+    from lib.trip_store import trip_store
+
+    store = trip_store()
+    name, center = store.location(trip_id)
+    places: List[Dict[str, Any]] = []
+    for kind in PLACE_KINDS:
+        rows = store.records(kind, trip_id)
+        if kind not in GEOCODED:
+            places += [_place(kind, r, (r["lat"], r["lon"]) if r.get("lat") is not None else None) for r in rows]
+            continue
+        known: Dict[str, Optional[Coords]] = dict(compiled_coords(kind, trip_id))
+        todo = [r.get("address", "") for r in rows if r.get("address", "") not in known]
+        if resolve:
+            known.update(geocode_many(todo))
+        else:
+            cache = default_cache()
+            for a in todo:
+                c = cache.get(a) if a else None
+                known[a] = None if c is MISS else c
+        places += [_place(kind, r, known.get(r.get("address", ""))) for r in rows]
+
+    hike_rows = store.records("hike", trip_id)
+    tracks: Dict[str, Any] = {h["file"]: compiled_track(h["file"]) for h in hike_rows}
+    tracks.update(load_tracks([f for f, t in tracks.items() if t is None]))
+    hikes = [(h, t if isinstance(t, Track) else None) for h, t in ((h, tracks[h["file"]]) for h in hike_rows)]
+    keys = default_store().digest_many([h["file"] for h, t in hikes if t is not None])
+    digest = fingerprint(EXPORT_VERSION, name, center, places, [(h, keys.get(h["file"])) for h, _ in hikes])
+    return TripExport(trip_id, name, center, places, hikes, digest)
+
+
+# --- Writers --------------------------------------------------------------------
+def _num(x: float) -> Optional[float]:
+    return None if math.isnan(x) else float(x)
+
+
+def _hike_props(h: Dict[str, Any]) -> Dict[str, Any]:
+    return {"kind": "hike", "name": h.get("name", ""), "duration": h.get("duration", ""), "url": h.get("link", "")}
+
+
+def _lonlat_chunks(track: Track, a: int, b: int) -> Iterator[bytes]:
+    """JSON for coords[a:b] as [[lon, lat], ...], CHUNK_ROWS points at a time."""
+    yield b"["
+    for lo in range(a, b, CHUNK_ROWS):
+        hi = min(lo + CHUNK_ROWS, b)
+        xy = np.round(np.column_stack([track.coords[lo:hi, 1], track.coords[lo:hi, 0]]), 6)
+        yield (b"," if lo > a else b"") + encode(xy.tolist())[1:-1]
+    yield b"]"
+
+
+def write_geojson(exp: TripExport, f: IO[bytes]) -> None:
+    """A FeatureCollection: a Point per place, a MultiLineString per hike, tracks written in chunks."""
+    f.write(b'{"type":"FeatureCollection","features":[')
+    first = True
+    for p in exp.places:
+        geometry = {"type": "Point", "coordinates": [p["lon"], p["lat"]]} if p["lat"] is not None else None
+        props = {k: v for k, v in p.items() if k not in ("lat", "lon")}
+        f.write((b"" if first else b",") + encode({"type": "Feature", "geometry": geometry, "properties": props}))
+        first = False
+    for h, track in exp.hikes:
+        f.write((b"" if first else b",") + b'{"type":"Feature","properties":' + encode(_hike_props(h)))
+        first = False
+        if track is None or not len(track):
+            f.write(b',"geometry":null}')
+            continue
+        f.write(b',"geometry":{"type":"MultiLineString","coordinates":[')
+        for i, (a, b) in enumerate(zip(track.offsets[:-1].tolist(), track.offsets[1:].tolist())):
+            if i:
+                f.write(b",")
+            for chunk in _lonlat_chunks(track, a, b):
+                f.write(chunk)
+        f.write(b"]}}")
+    f.write(b"]}")
+
+
+def _iso_times(seconds: np.ndarray) -> List[str]:
+    out = np.full(len(seconds), "", dtype=object)
+    ok = ~np.isnan(seconds)
+    out[ok] = np.char.add(np.datetime_as_string(seconds[ok].astype("datetime64[s]")), "Z")
+    return out.tolist()
+
+
+def _trkpts(track: Track, a: int, b: int) -> str:
+    lat, lon = track.coords[a:b, 0], track.coords[a:b, 1]
+    ele, times = np.asarray(track.ele[a:b]), _iso_times(np.asarray(track.time[a:b], dtype=np.float64))
+    return "".join(
+        f'<trkpt lat="{y:.7f}" lon="{x:.7f}">'
+        + ("" if math.isnan(e) else f"<ele>{e:.1f}</ele>")
+        + (f"<time>{t}</time>" if t else "")
+        + "</trkpt>"
+        for y, x, e, t in zip(lat.tolist(), lon.tolist(), ele.tolist(), times)
+    )
+
+
+def write_gpx(exp: TripExport, f: IO[bytes]) -> None:
+    """GPX 1.1: waypoints for the places with coordinates, a track per hike."""
+    f.write(b'<?xml version="1.0" encoding="UTF-8"?>\n'
+            b'<gpx version="1.1" creator="ausflug" xmlns="http://www.topografix.com/GPX/1/1">')
+    f.write(f"<metadata><name>{escape(exp.name)}</name></metadata>".encode())
+    for p in exp.places:
+        if p["lat"] is None:
+            continue
+        link = f"<link href={quoteattr(p['url'])}/>" if p["url"] else ""
+        f.write((f'<wpt lat="{p["lat"]:.7f}" lon="{p["lon"]:.7f}"><name>{escape(p["name"])}</name>'
+                 f"<desc>{escape(p['description'])}</desc>{link}<type>{p['kind']}</type></wpt>").encode())
+    for h, track in exp.hikes:
+        link = f"<link href={quoteattr(h['link'])}/>" if h.get("link") else ""
+        f.write(f"<trk><name>{escape(h.get('name', ''))}</name>{link}<type>hike</type>".encode())
+        if track is not None:
+            for a, b in zip(track.offsets[:-1].tolist(), track.offsets[1:].tolist()):
+                f.write(b"<trkseg>")
+                for lo in range(a, b, CHUNK_ROWS):
+                    f.write(_trkpts(track, lo, min(lo + CHUNK_ROWS, b)).encode())
+                f.write(b"</trkseg>")
+        f.write(b"</trk>")
+    f.write(b"</gpx>\n")
+
+
+def _list_value(values: np.ndarray, type_: pa.DataType) -> pa.Array:
+    """One list<type_> cell from a numpy array, without a Python object per element."""
+    flat = pa.array(np.ascontiguousarray(values), type=type_)
+    return pa.ListArray.from_arrays(pa.array([0, len(flat)], pa.int32()), flat)
+
+
+def _hike_table(h: Dict[str, Any], track: Optional[Track]) -> pa.Table:
+    row: Dict[str, Any] = {**_hike_props(h), "description": "", "address": "", "lat": None, "lon": None}
+    if track is not None and len(track):
+        row.update(lat=_num(track.coords[0, 0]), lon=_num(track.coords[0, 1]))
+    columns = {k: pa.array([row[k]], _SCHEMA.field(k).type) for k in _SCHEMA.names[:8]}
+    arrays = {"track_lat": lambda t: t.coords[:, 0], "track_lon": lambda t: t.coords[:, 1],
+              "track_ele": lambda t: t.ele, "track_time": lambda t: t.time, "track_offsets": lambda t: t.offsets}
+    for k, get in arrays.items():
+        type_ = _SCHEMA.field(k).type
+        columns[k] = _list_value(get(track), type_.value_type) if track is not None else pa.nulls(1, type_)
+    return pa.table(columns, schema=_SCHEMA)
+
+
+def write_parquet(exp: TripExport, f: IO[bytes]) -> None:
+    """Places in row groups of CHUNK_ROWS, then one row group per hike."""
+    # Dictionary encoding on the track columns would hash every vertex (8x the memory of the track).
+    with pq.ParquetWriter(f, _SCHEMA, compression="zstd", use_dictionary=["kind"]) as w:
+        for lo in range(0, len(exp.places), CHUNK_ROWS):
+            w.write_table(pa.Table.from_pylist(exp.places[lo:lo + CHUNK_ROWS], schema=_SCHEMA))
+        for h, track in exp.hikes:
+            w.write_table(_hike_table(h, track))
+
+
+_WRITERS: Dict[str, Callable[[TripExport, IO[bytes]], None]] = {
+    "geojson": write_geojson, "parquet": write_parquet, "gpx": write_gpx,
+}
+
+
+# --- Files ----------------------------------------------------------------------
+_locks: Dict[Path, threading.Lock] = {}
+_locks_lock = threading.Lock()
+
+
+def _path(exp: TripExport, fmt: str) -> Path:
+    return EXPORT_DIR / exp.digest[:20] / f"{exp.slug}{FORMATS[fmt][0]}"
+
+
+def _write_file(path: Path, write: Callable[[IO[bytes]], None]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with open(tmp, "wb") as f:
+            write(f)
+        os.replace(tmp, path)  # atomic: a reader never sees a half-written export
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+def build(exp: TripExport, fmt: str) -> Path:
+    """The export file for `exp` in `fmt`, written on first use."""
+    path = _path(exp, fmt)
+    with _locks_lock:
+        lock = _locks.setdefault(path, threading.Lock())
+    with lock:  # concurrent clicks on the same export build it once
+        if path.exists():
+            count("export.hit")
+            os.utime(path)
+            return path
+        count("export.miss")
+        with span("export", format=fmt, trip=exp.trip_id):
+            if fmt == "zip":
+                parts = {f: build(exp, f) for f in _WRITERS}
+
+                def write(f: IO[bytes]) -> None:
+                    with zipfile.ZipFile(f, "w", zipfile.ZIP_DEFLATED) as z:
+                        for part_fmt, part in parts.items():
+                            # Parquet is compressed already; zip copies from disk in chunks either way.
+                            z.write(part, part.name, zipfile.ZIP_STORED if part_fmt == "parquet" else None)
+            else:
+                def write(f: IO[bytes]) -> None:
+                    _WRITERS[fmt](exp, f)
+            _write_file(path, write)
+    return path
+
+
+def export_file(trip_id: int, fmt: str = "zip") -> Path:
+    """Resolve the trip's data and return its export in `fmt` (cached by content)."""
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown export format {fmt!r}; expected one of {sorted(FORMATS)}")
+    return build(collect(trip_id, resolve=True), fmt)
+
+
+# --- Streamlit ------------------------------------------------------------------
+def download_bundle(trip_id: int, *, key: str = "trip_export") -> None:
+    """A button that builds the trip's GeoJSON + Parquet + GPX zip, then a download for it.
+
+    Reruns only draw the button; the data is collected and fingerprinted on click.
+    """
+    import streamlit as st
+
+    state = f"{key}_{trip_id}_path"
+    path: Optional[Path] = None
+    if st.button("Ausflug exportieren (GeoJSON, Parquet, GPX)", key=f"{key}_{trip_id}"):
+        with st.spinner("Export wird erstellt …"):
+            path = export_file(trip_id, "zip")
+        st.session_state[state] = str(path)
+    if static_serving():
+        # the link survives reruns; the static handler streams the file
+        path = Path(st.session_state[state]) if state in st.session_state else None
+        if path is not None and path.exists():
+            st.link_button(f"⬇️ {path.name} herunterladen", static_url(path))
+    elif path is not None:  # only right after the click: the bytes are held in memory
+        st.download_button(f"⬇️ {path.name} herunterladen", path.read_bytes(), file_name=path.name,
+                           mime=FORMATS["zip"][1], key=f"{key}_{trip_id}_download")
@@ -0,0 +1,183 @@
+# lib/trip_loader.py
+"""Trip tables kept as data files instead of Python literals.
+
+Each table ("trip", "camping", "restaurant", "poi", "bakery", "supermarket",
+"hike", "airbnb") is looked up in DATA_DIR, first match wins:
+
+    <kind>/trip_id=<N>/*.{parquet,geojson,csv}   one directory per trip
+    <kind>.parquet                               row groups skipped by trip_id statistics
+    <kind>.geojson                               filtered inside GDAL; points become lat/lon
+    <kind>.csv                                   read in chunks of CHUNK_ROWS
+
+Only the partition of the trip that is asked for is read, and it is cached
+until the underlying file changes (mtime/size), so edits show up on the next
+rerun without restarting the server.
+"""
+from __future__ import annotations
+
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from lib.paths import ROOT
+from lib.trip_store import frame_records
+
+DATA_DIR = Path(os.environ.get("AUSFLUG_DATA_DIR", ROOT / "trips"))
+CHUNK_ROWS = 50_000
+PARTITIONS_PER_TABLE = 64
+_FORMATS = (".parquet", ".geojson", ".csv")
+
+Signature = Tuple[Tuple[str, int, int], ...]
+
+
+def _signature(files: Sequence[Path]) -> Signature:
+    out = []
+    for f in files:
+        try:
+            st = f.stat()
+        except FileNotFoundError:
+            continue
+        out.append((str(f), st.st_mtime_ns, st.st_size))
+    return tuple(out)
+
+
+def _with_trip_id(df: pd.DataFrame) -> pd.DataFrame:
+    if "trip_id" not in df:
+        df["trip_id"] = pd.Series(dtype="int64")
+    return df
+
+
+def _read_csv(path: Path, trip_id: Optional[int], columns: Optional[List[str]]) -> pd.DataFrame:
+    usecols = None if columns is None else lambda c: c in columns
+    chunks = []
+    for chunk in pd.read_csv(path, chunksize=CHUNK_ROWS, usecols=usecols):
+        chunks.append(chunk if trip_id is None else chunk[chunk["trip_id"] == trip_id])
+    return pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=columns)
+
+
+def _read_parquet(path: Path, trip_id: Optional[int], columns: Optional[List[str]]) -> pd.DataFrame:
+    import pyarrow.dataset as ds
+
+    dataset = ds.dataset(path, format="parquet")
+    names = set(dataset.schema.names)
+    flt = ds.field("trip_id") == trip_id if trip_id is not None else None
+    cols = None if columns is None else [c for c in columns if c in names]
+    return dataset.to_table(columns=cols, filter=flt, batch_size=CHUNK_ROWS).to_pandas()
+
+
+def _read_geojson(path: Path, trip_id: Optional[int], columns: Optional[List[str]]) -> pd.DataFrame:
+    import geopandas as gpd
+
+    where = None if trip_id is None else f"trip_id = {int(trip_id)}"
+    want_geometry = columns is None or "lat" in columns or "lon" in columns
+    gdf = gpd.read_file(path, where=where, read_geometry=want_geometry,
+                        columns=None if columns is None else [c for c in columns if c not in ("lat", "lon")])
+    if not want_geometry:
+        return pd.DataFrame(gdf)
+    df = pd.DataFrame(gdf.drop(columns=gdf.geometry.name))
+    points = gdf.geometry.geom_type == "Point"
+    df["lat"] = gdf.geometry.y.where(points) if len(gdf) else pd.Series(dtype="float64")
+    df["lon"] = gdf.geometry.x.where(points) if len(gdf) else pd.Series(dtype="float64")
+    return df
+
+
+_READERS = {".parquet": _read_parquet, ".geojson": _read_geojson, ".csv": _read_csv}
+
+
+def _read(path: Path, trip_id: Optional[int] = None, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    return _with_trip_id(_READERS[path.suffix](path, trip_id, columns))
+
+
+class ExternalTable:
+    """One table on disk, read lazily per trip; the tables of lib.trip_store.TripStore."""
+
+    def __init__(self, kind: str, data_dir: Union[str, Path] = DATA_DIR) -> None:
+        self.kind = kind
+        self.data_dir = Path(data_dir)
+        self._lock = threading.Lock()
+        self._parts: "OrderedDict[Optional[int], Tuple[Signature, pd.DataFrame]]" = OrderedDict()
+        self._ids: Optional[Tuple[Signature, np.ndarray]] = None
+
+    # --- Locating the data ---------------------------------------------------
+    def _partition_dir(self) -> Optional[Path]:
+        d = self.data_dir / self.kind
+        return d if d.is_dir() else None
+
+    def _file(self) -> Optional[Path]:
+        for suffix in _FORMATS:
+            f = self.data_dir / f"{self.kind}{suffix}"
+            if f.is_file():
+                return f
+        return None
+
+    def _partition_files(self, trip_id: int) -> List[Path]:
+        d = self.data_dir / self.kind / f"trip_id={int(trip_id)}"
+        return sorted(f for f in d.glob("*") if f.suffix in _FORMATS) if d.is_dir() else []
+
+    def _sources(self, trip_id: Optional[int]) -> List[Path]:
+        """Files that hold `trip_id` (or the whole table when None)."""
+        pdir = self._partition_dir()
+        if pdir is None:
+            f = self._file()
+            return [f] if f else []
+        if trip_id is not None:
+            return self._partition_files(trip_id)
+        return sorted(f for f in pdir.glob("trip_id=*/*") if f.suffix in _FORMATS)
+
+    # --- Reading ---------------------------------------------------------------
+    def _load(self, trip_id: Optional[int], files: List[Path]) -> pd.DataFrame:
+        frames = []
+        for f in files:
+            partitioned = f.parent.name.startswith("trip_id=")
+            df = _read(f, None if partitioned else trip_id)
+            if partitioned:
+                df["trip_id"] = int(f.parent.name.split("=", 1)[1])
+            frames.append(df)
+        df = pd.concat(frames, ignore_index=True) if frames else _with_trip_id(pd.DataFrame())
+        return df.sort_values("trip_id", kind="stable").reset_index(drop=True)
+
+    def frame(self, trip_id: Optional[int] = None, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """Rows of one trip (all rows when trip_id is None); cached until the files change."""
+        files = self._sources(trip_id)
+        sig = _signature(files)
+        with self._lock:
+            hit = self._parts.get(trip_id)
+            if hit is not None and hit[0] == sig:
+                self._parts.move_to_end(trip_id)
+                df = hit[1]
+                return df if columns is None else df[[c for c in columns if c in df.columns]]
+        df = self._load(trip_id, files)
+        with self._lock:
+            self._parts[trip_id] = (sig, df)
+            while len(self._parts) > PARTITIONS_PER_TABLE:
+                self._parts.popitem(last=False)
+        return df if columns is None else df[[c for c in columns if c in df.columns]]
+
+    def count(self, trip_id: int) -> int:
+        return len(self.frame(trip_id))
+
+    def trip_ids(self) -> np.ndarray:
+        """Distinct trip ids, reading only the trip_id column (or directory names)."""
+        pdir = self._partition_dir()
+        if pdir is not None:
+            return np.array(sorted(int(d.name.split("=", 1)[1]) for d in pdir.glob("trip_id=*") if d.is_dir()))
+        files = self._sources(None)
+        sig = _signature(files)
+        with self._lock:
+            if self._ids is not None and self._ids[0] == sig:
+                return self._ids[1]
+        ids = np.unique(_read(files[0], columns=["trip_id"])["trip_id"].to_numpy()) if files else np.zeros(0, int)
+        with self._lock:
+            self._ids = (sig, ids)
+        return ids
+
+    def records(self, trip_id: int, **equals: Any) -> List[Dict[str, Any]]:
+        return frame_records(self.frame(trip_id), **equals)
+
+    def __len__(self) -> int:
+        return len(self.frame())
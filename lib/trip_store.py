@@ -0,0 +1,92 @@
+# lib/trip_store.py
+from __future__ import annotations
+
+import math
+import threading
+from typing import TYPE_CHECKING, Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import pandas as pd
+
+if TYPE_CHECKING:
+    from lib.trip_loader import ExternalTable
+
+# kind -> name of the list in data.py (the place kinds match lib.trip_build.PLACE_TABLES)
+TABLES = {
+    "camping": "camping",
+    "restaurant": "restaurants",
+    "poi": "POIs",
+    "bakery": "bakery",
+    "supermarket": "supermarkt",
+    "hike": "HIKES",
+    "airbnb": "airbnb",
+}
+TRIPS = "trip"  # trip_id, name, lat, lon; data.locations_trip
+
+
+def _is_missing(v: Any) -> bool:
+    return v is None or (isinstance(v, float) and math.isnan(v))
+
+
+def frame_records(df: pd.DataFrame, **equals: Any) -> List[Dict[str, Any]]:
+    """Fresh dicts for the rows of `df` (like the data.py entries), optionally filtered by column values.
+
+    Missing values are left out, so `row.get(...)` behaves as it did on the
+    original lists.
+    """
+    for col, value in equals.items():
+        df = df[df[col] == value] if col in df.columns else df.iloc[:0]
+    return [{k: v for k, v in r.items() if not _is_missing(v)} for r in df.to_dict("records")]
+
+
+class TripStore:
+    """All trip tables by kind (lib.trip_loader.ExternalTable, or anything with its
+    frame/records/count/trip_ids API)."""
+
+    def __init__(self, tables: Mapping[str, "ExternalTable"]) -> None:
+        self._tables = dict(tables)
+
+    def table(self, kind: str) -> "ExternalTable":
+        try:
+            return self._tables[kind]
+        except KeyError:
+            raise KeyError(f"unknown table {kind!r}; expected one of {sorted(self._tables)}") from None
+
+    def kinds(self) -> List[str]:
+        return list(self._tables)
+
+    def frame(self, kind: str, trip_id: Optional[int] = None, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        return self.table(kind).frame(trip_id, columns)
+
+    def records(self, kind: str, trip_id: int, **equals: Any) -> List[Dict[str, Any]]:
+        return self.table(kind).records(trip_id, **equals)
+
+    def count(self, kind: str, trip_id: int) -> int:
+        return self.table(kind).count(trip_id)
+
+    def location(self, trip_id: int) -> Tuple[str, Tuple[float, float]]:
+        """(name, (lat, lon)) of a trip, like data.locations_trip[trip_id]."""
+        rows = self.records(TRIPS, trip_id)
+        if not rows:
+            raise KeyError(trip_id)
+        return rows[0]["name"], (float(rows[0]["lat"]), float(rows[0]["lon"]))
+
+    def locations(self) -> Dict[int, Tuple[str, Tuple[float, float]]]:
+        """Every trip as {trip_id: (name, (lat, lon))}."""
+        return {
+            int(r["trip_id"]): (r["name"], (float(r["lat"]), float(r["lon"])))
+            for r in frame_records(self.frame(TRIPS))
+        }
+
+
+_default: Optional[TripStore] = None
+_default_lock = threading.Lock()
+
+
+def trip_store() -> TripStore:
+    """The process-wide store over the data files (see lib.trip_loader)."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            from lib.trip_loader import ExternalTable
+            _default = TripStore({kind: ExternalTable(kind) for kind in (TRIPS, *TABLES)})
+        return _default
@@ -1,29 +1,43 @@
 # app_overview.py
 from __future__ import annotations
 
+import importlib
+
 import streamlit as st
 
-from app.camping_section import render_camping
-from app.hikes_section import render_poi_hikes
-from app.overview_section import render_startpage
-from app.restaurants_section import render_restaurants
 from data import locations_trip, winner_id
+from lib import timing
+from lib.session import page_layout
+from lib.static_assets import prune_once
+
+# Sections are imported on first use, so a tab only pays for its own dependencies.
+SECTIONS = {
+    "Info": ("app.overview_section", "render_startpage"),
+    "Camping": ("app.camping_section", "render_camping"),
+    "POIs": ("app.hikes_section", "render_poi_hikes"),
+    "Restaurants": ("app.restaurants_section", "render_restaurants"),
+}
 
 trip_name, trip_center = locations_trip[winner_id]
 
 
 st.set_page_config(page_title="IFM Trip", page_icon="🗺️", layout="wide")
+prune_once()  # drop static/ assets nothing has published for a month
 st.markdown(f"""
     ### 🗺️ Es geht nach: {trip_name}
     """
 )
-options = ["Info", "Camping", "POIs", "Restaurants"]
+options = list(SECTIONS)
 choice = st.segmented_control(label="Menu", options=options, key="section", default="Info")
-if choice == "Info":
-    render_startpage()
-elif choice == "Camping":
-    render_camping()
-elif choice == "POIs":
-    render_poi_hikes()
-else:
-    render_restaurants()
+module_name, render_name = SECTIONS.get(choice, SECTIONS["Restaurants"])
+
+# Timing breakdown per rerun: AUSFLUG_TIMING=1 for everyone, ?timing=1 for this session.
+trace = timing.start_run(str(choice), force=st.query_params.get("timing") == "1")
+with timing.span("import", module=module_name):
+    section = importlib.import_module(module_name)
+# Every section gets the same head / map / body layout, so the map stays mounted across tabs.
+with timing.span("render"), page_layout():
+    getattr(section, render_name)()
+if trace is not None:
+    timing.finish_run()
+    timing.render_overlay(trace)